@@ -0,0 +1,40 @@
+"""
+Similar-Books Index Build
+-------------------------
+Computes every catalog book's similar books ahead of time and saves the
+memory-mapped index to BOOK_SIMILARITY_DIR, so API processes only load it
+at startup and catch up from the catalog change log.
+
+Usage:
+    BOOK_SIMILARITY_DIR=./data/book_similarity python -m core.build_similarity
+"""
+
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+async def _main(argv) -> int:
+    from services.product_recommendation import recommendation_engine
+
+    if not recommendation_engine.similarity.directory:
+        print("BOOK_SIMILARITY_DIR is not set - nothing to save the index to")
+        return 1
+
+    await recommendation_engine.catalog_store.connect()
+    try:
+        await recommendation_engine.build_similarity()
+        similarity = recommendation_engine.similarity
+        if similarity.catalog_version is None:
+            return 1
+        print(f"Saved similar books for {len(similarity)} books (catalog version {similarity.catalog_version})")
+    finally:
+        await recommendation_engine.catalog_store.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -8,12 +8,24 @@ including:
 3. Complete Transcripts
 """
 
+import asyncio
+import functools
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from core.call_summary_generator import summary_is_current
+
 logger = logging.getLogger(__name__)
 
+# Summary generation is CPU-bound; run it off the event loop on a small
+# dedicated pool so a burst of ending calls queues here instead of blocking
+# API workers
+SUMMARY_WORKERS = int(os.getenv("CALL_SUMMARY_WORKERS", "4"))
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="call-summary")
+
 
 class CallEndReport:
     """Complete call report generated at call end"""
@@ -24,13 +36,15 @@ class CallEndReport:
         call_summary: Dict[str, Any],
         sentiment_analysis: Dict[str, Any],
         transcripts: list,
-        order_data: Optional[Dict[str, Any]] = None
+        order_data: Optional[Dict[str, Any]] = None,
+        summary_cached: bool = False
     ):
         self.room_id = room_id
         self.call_summary = call_summary
         self.sentiment_analysis = sentiment_analysis
         self.transcripts = transcripts
         self.order_data = order_data
+        self.summary_cached = summary_cached
         self.generated_at = datetime.utcnow()
     
     def to_dict(self) -> Dict[str, Any]:
@@ -41,19 +55,92 @@ class CallEndReport:
             "call_summary": self.call_summary,
             "sentiment_analysis": self.sentiment_analysis,
             "transcripts": self.transcripts,
-            "order_data": self.order_data
+            "order_data": self.order_data,
+            "summary_cached": self.summary_cached
+        }
+
+
+def aggregate_sentiment(sentiment_data_list: list) -> Dict[str, Any]:
+    """Aggregate per-message sentiment records into the report's sentiment section"""
+    if not sentiment_data_list:
+        return {
+            "overall_sentiment": "neutral",
+            "average_confidence": 0.5,
+            "sentiment_journey": [],
+            "final_sentiment": "neutral",
+            "sentiment_shifts": 0,
+            "engagement_metrics": {
+                "average_engagement": 0.5,
+                "average_satisfaction": 0.5,
+                "purchase_intent": 0.3
+            }
         }
+    
+    confidences = [s.get("confidence", 0.5) for s in sentiment_data_list]
+    engagements = [s.get("engagement", 0.5) for s in sentiment_data_list]
+    satisfactions = [s.get("satisfaction", 0.5) for s in sentiment_data_list]
+    purchase_intents = [s.get("purchase_intent", 0.3) for s in sentiment_data_list]
+    
+    return {
+        "overall_sentiment": sentiment_data_list[-1].get("overall_sentiment", "neutral"),
+        "average_confidence": round(sum(confidences) / len(confidences), 2),
+        "sentiment_journey": [
+            {
+                "sequence": i + 1,
+                "sentiment": s.get("overall_sentiment", "neutral"),
+                "confidence": s.get("confidence", 0.5),
+                "timestamp": s.get("timestamp")
+            } for i, s in enumerate(sentiment_data_list)
+        ],
+        "final_sentiment": sentiment_data_list[-1].get("overall_sentiment", "neutral"),
+        "sentiment_shifts": len([i for i in range(1, len(sentiment_data_list))
+                                if sentiment_data_list[i].get("overall_sentiment") != sentiment_data_list[i-1].get("overall_sentiment")]),
+        "engagement_metrics": {
+            "average_engagement": round(sum(engagements) / len(engagements), 2),
+            "average_satisfaction": round(sum(satisfactions) / len(satisfactions), 2),
+            "average_purchase_intent": round(sum(purchase_intents) / len(purchase_intents), 2),
+        },
+        "emotions_summary": sentiment_data_list[-1].get("emotions", {})
+    }
+
+
+def order_view(order_doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Order fields included in the report"""
+    if not order_doc:
+        return None
+    return {
+        "order_id": order_doc.get("order_id"),
+        "customer_id": order_doc.get("customer_id"),
+        "customer_name": order_doc.get("customer_name"),
+        "book_title": order_doc.get("book_title"),
+        "author": order_doc.get("author"),
+        "genre": order_doc.get("genre"),
+        "quantity": order_doc.get("quantity"),
+        "unit_price": order_doc.get("unit_price"),
+        "total_amount": order_doc.get("total_amount"),
+        "payment_method": order_doc.get("payment_method"),
+        "delivery_option": order_doc.get("delivery_option"),
+        "delivery_address": order_doc.get("delivery_address"),
+        "order_status": order_doc.get("order_status", "pending"),
+        "order_date": order_doc.get("order_date"),
+        "special_requests": order_doc.get("special_requests"),
+    }
 
 
 async def generate_call_end_report(
     room_id: str,
     db_service,
     summary_generator,
-    manual_notes: Optional[str] = None
+    manual_notes: Optional[str] = None,
+    force: bool = False
 ) -> CallEndReport:
     """
     Generate complete call report when call ends
     
+    The stored call summary is reused when the room's content (transcripts,
+    order, sentiment records) has not changed since it was generated, unless
+    force is set.
+    
     Returns:
     - Call Summary with insights
     - Sentiment Analysis aggregated data
@@ -64,8 +151,14 @@ async def generate_call_end_report(
     try:
         logger.info(f"Generating call end report for room {room_id}")
         
-        # 1. Get Transcripts
-        transcripts_raw = await db_service.get_transcripts(room_id)
+        # 1-3. Transcripts, sentiment data, order and stored summary are independent reads
+        transcripts_raw, sentiment_data_list, order_doc, stored_summary = await asyncio.gather(
+            db_service.get_transcripts(room_id),
+            db_service.get_sentiment_data(room_id),
+            db_service.get_order(room_id),
+            db_service.get_call_summary(room_id)
+        )
+        
         transcripts = [
             {
                 "id": t.get("id"),
@@ -75,87 +168,38 @@ async def generate_call_end_report(
                 "created_at": t.get("created_at")
             } for t in transcripts_raw
         ]
+        sentiment_analysis = aggregate_sentiment(sentiment_data_list)
+        order_data = order_view(order_doc)
         
-        # 2. Get Sentiment Analysis Data
-        sentiment_data_list = await db_service.get_sentiment_data(room_id)
-        
-        # Aggregate sentiment analysis
-        sentiment_analysis = {
-            "overall_sentiment": "neutral",
-            "average_confidence": 0.5,
-            "sentiment_journey": [],
-            "final_sentiment": "neutral",
-            "sentiment_shifts": 0,
-            "engagement_metrics": {
-                "average_engagement": 0.5,
-                "average_satisfaction": 0.5,
-                "purchase_intent": 0.3
-            }
-        }
-        
-        if sentiment_data_list:
-            # Calculate averages
-            confidences = [s.get("confidence", 0.5) for s in sentiment_data_list]
-            engagements = [s.get("engagement", 0.5) for s in sentiment_data_list]
-            satisfactions = [s.get("satisfaction", 0.5) for s in sentiment_data_list]
-            purchase_intents = [s.get("purchase_intent", 0.3) for s in sentiment_data_list]
-            
-            sentiment_analysis = {
-                "overall_sentiment": sentiment_data_list[-1].get("overall_sentiment", "neutral") if sentiment_data_list else "neutral",
-                "average_confidence": round(sum(confidences) / len(confidences), 2) if confidences else 0.5,
-                "sentiment_journey": [
-                    {
-                        "sequence": i + 1,
-                        "sentiment": s.get("overall_sentiment", "neutral"),
-                        "confidence": s.get("confidence", 0.5),
-                        "timestamp": s.get("timestamp")
-                    } for i, s in enumerate(sentiment_data_list)
-                ],
-                "final_sentiment": sentiment_data_list[-1].get("overall_sentiment", "neutral") if sentiment_data_list else "neutral",
-                "sentiment_shifts": len([i for i in range(1, len(sentiment_data_list)) 
-                                        if sentiment_data_list[i].get("overall_sentiment") != sentiment_data_list[i-1].get("overall_sentiment")]),
-                "engagement_metrics": {
-                    "average_engagement": round(sum(engagements) / len(engagements), 2) if engagements else 0.5,
-                    "average_satisfaction": round(sum(satisfactions) / len(satisfactions), 2) if satisfactions else 0.5,
-                    "average_purchase_intent": round(sum(purchase_intents) / len(purchase_intents), 2) if purchase_intents else 0.3,
-                },
-                "emotions_summary": sentiment_data_list[-1].get("emotions", {}) if sentiment_data_list else {}
-            }
-        
-        # 3. Get Order Data
-        order_doc = await db_service.get_order(room_id)
-        order_data = None
-        if order_doc:
-            order_data = {
-                "order_id": order_doc.get("order_id"),
-                "customer_id": order_doc.get("customer_id"),
-                "customer_name": order_doc.get("customer_name"),
-                "book_title": order_doc.get("book_title"),
-                "author": order_doc.get("author"),
-                "genre": order_doc.get("genre"),
-                "quantity": order_doc.get("quantity"),
-                "unit_price": order_doc.get("unit_price"),
-                "total_amount": order_doc.get("total_amount"),
-                "payment_method": order_doc.get("payment_method"),
-                "delivery_option": order_doc.get("delivery_option"),
-                "delivery_address": order_doc.get("delivery_address"),
-                "order_status": order_doc.get("order_status", "pending"),
-                "order_date": order_doc.get("order_date"),
-                "special_requests": order_doc.get("special_requests"),
-            }
-        
-        # 4. Generate Call Summary
-        summary = await summary_generator.generate_summary(
-            room_id=room_id,
-            transcripts=transcripts,
-            order_data=order_data,
-            sentiment_data=sentiment_data_list,
-            manual_notes=manual_notes
+        content_version = db_service.room_content_version(
+            len(transcripts_raw),
+            transcripts_raw[-1].get("timestamp") if transcripts_raw else None,
+            order_doc,
+            len(sentiment_data_list)
         )
         
-        # Store summary in database
-        summary_dict = summary.to_dict()
-        await db_service.store_call_summary(room_id, summary_dict)
+        # 4. Generate Call Summary (or reuse the one built from the same content)
+        summary_cached = not force and summary_is_current(stored_summary, content_version, manual_notes)
+        if summary_cached:
+            summary_dict = {k: v for k, v in stored_summary.items() if k != "_id"}
+        else:
+            loop = asyncio.get_running_loop()
+            summary = await loop.run_in_executor(
+                _summary_executor,
+                functools.partial(
+                    summary_generator.build_summary,
+                    room_id=room_id,
+                    transcripts=transcripts,
+                    order_data=order_data,
+                    sentiment_data=sentiment_data_list,
+                    manual_notes=manual_notes
+                )
+            )
+            
+            # Store summary in database
+            summary_dict = summary.to_dict()
+            summary_dict["content_version"] = content_version
+            await db_service.store_call_summary(room_id, summary_dict)
         
         # 5. Create Complete Report
         report = CallEndReport(
@@ -163,7 +207,8 @@ async def generate_call_end_report(
             call_summary=summary_dict,
             sentiment_analysis=sentiment_analysis,
             transcripts=transcripts,
-            order_data=order_data
+            order_data=order_data,
+            summary_cached=summary_cached
         )
         
         logger.info(f"Call end report generated successfully for room {room_id}")
@@ -12,12 +12,15 @@ Features:
 - Provides actionable recommendations for improvement
 """
 
+import asyncio
 import logging
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from collections import Counter
 import re
 
+from core.transcript_analyzer import TranscriptAnalyzer, TranscriptAnalysis
+
 logger = logging.getLogger(__name__)
 
 
@@ -166,11 +169,12 @@ class CallSummaryGenerator:
     """Generates comprehensive call summaries with insights"""
     
     def __init__(self):
+        # Whole words/phrases; a trailing * matches a word prefix
         self.objection_keywords = [
-            "expensive", "cost", "price", "afford", "budget",
+            "expensive", "cost", "costs", "price", "afford", "budget",
             "not sure", "don't know", "maybe", "think about",
             "later", "busy", "no time", "already have",
-            "don't need", "not interested", "concern", "worried"
+            "don't need", "not interested", "concern*", "worried"
         ]
         
         self.positive_keywords = [
@@ -185,6 +189,26 @@ class CallSummaryGenerator:
             "self-help", "business", "children", "young adult", "horror",
             "poetry", "drama", "adventure", "crime"
         ]
+        
+        self.analyzer = TranscriptAnalyzer(self.objection_keywords, self.book_genres, self._categorize_objection)
+    
+    def set_book_resolver(self, book_resolver):
+        """Resolve (misspelled) book titles in transcripts against the catalog"""
+        self.analyzer.book_resolver = book_resolver
+    
+    def resolve_book_mentions(self, summary: Dict[str, Any], transcripts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Redo books_discussed (and the follow-ups that depend on it) of a summary
+        dict built without the book resolver, e.g. in a process without the catalog"""
+        if self.analyzer.book_resolver is None:
+            return summary
+        summary["books_discussed"] = self.analyzer.collect_books(transcripts)
+        summary["follow_up_actions"] = self._generate_follow_up_actions(
+            summary.get("call_outcome"),
+            summary.get("unresolved_concerns"),
+            summary.get("customer_name"),
+            summary["books_discussed"]
+        )
+        return summary
     
     async def generate_summary(
         self,
@@ -194,7 +218,22 @@ class CallSummaryGenerator:
         sentiment_data: Optional[List[Dict[str, Any]]] = None,
         manual_notes: Optional[str] = None
     ) -> CallSummary:
-        """Generate comprehensive call summary from transcripts and related data"""
+        """Generate comprehensive call summary from transcripts and related data
+        
+        build_summary runs on a worker thread: resolving book mentions can
+        read the catalog store with a blocking query.
+        """
+        return await asyncio.to_thread(self.build_summary, room_id, transcripts, order_data, sentiment_data, manual_notes)
+    
+    def build_summary(
+        self,
+        room_id: str,
+        transcripts: List[Dict[str, Any]],
+        order_data: Optional[Dict[str, Any]] = None,
+        sentiment_data: Optional[List[Dict[str, Any]]] = None,
+        manual_notes: Optional[str] = None
+    ) -> CallSummary:
+        """Synchronous (CPU-bound) summary generation, safe to run on an executor"""
         
         try:
             import uuid
@@ -202,10 +241,11 @@ class CallSummaryGenerator:
             # Generate summary ID
             summary_id = f"CS-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
             
-            # Calculate basic metrics
-            total_messages = len(transcripts)
-            customer_messages = [t for t in transcripts if t.get("role") == "user"]
-            agent_messages = [t for t in transcripts if t.get("role") == "assistant"]
+            # One pass over the transcripts feeds every metric below
+            analysis = self.analyzer.analyze(transcripts)
+            total_messages = analysis.total_messages
+            customer_messages = analysis.customer_messages
+            agent_messages = analysis.agent_messages
             
             # Calculate call duration
             call_duration = 0
@@ -231,20 +271,20 @@ class CallSummaryGenerator:
                 call_outcome = "partial_success"
             
             # Generate all analysis components
-            conversation_summary = self._generate_conversation_summary(transcripts)
-            key_topics = self._extract_key_topics(transcripts)
-            books_discussed = self._extract_books_discussed(transcripts)
-            genres_interested = self._extract_genres(transcripts)
-            authors_mentioned = self._extract_authors(transcripts)
-            objections_raised = self._extract_objections(customer_messages)
-            concerns_addressed = self._identify_addressed_concerns(transcripts, objections_raised)
+            conversation_summary = self._generate_conversation_summary(analysis)
+            key_topics = analysis.key_topics
+            books_discussed = analysis.books
+            genres_interested = analysis.genres
+            authors_mentioned = analysis.authors
+            objections_raised = analysis.objections
+            concerns_addressed = analysis.addressed_concerns
             unresolved_concerns = self._identify_unresolved_concerns(objections_raised, concerns_addressed)
             overall_sentiment = self._calculate_overall_sentiment(sentiment_data)
             sentiment_journey = self._create_sentiment_journey(sentiment_data)
-            engagement_level = self._calculate_engagement_level(transcripts, sentiment_data)
+            engagement_level = self._calculate_engagement_level(analysis, sentiment_data)
             customer_satisfaction = self._estimate_satisfaction(sentiment_data, call_outcome)
-            agent_response_quality = self._evaluate_agent_responses(agent_messages, objections_raised)
-            recommendations_made = self._count_recommendations(agent_messages)
+            agent_response_quality = self._evaluate_agent_responses(analysis)
+            recommendations_made = analysis.recommendations_made
             objection_handling_score = self._score_objection_handling(objections_raised, concerns_addressed)
             closing_effectiveness = self._evaluate_closing(transcripts, call_outcome)
             strengths = self._identify_strengths(agent_messages, recommendations_made, objection_handling_score, overall_sentiment, call_outcome)
@@ -301,103 +341,19 @@ class CallSummaryGenerator:
             logger.error(f"Error generating call summary: {e}")
             raise
     
-    def _generate_conversation_summary(self, transcripts: List[Dict[str, Any]]) -> str:
+    def _generate_conversation_summary(self, analysis: TranscriptAnalysis) -> str:
         """Generate a brief summary of the conversation"""
-        if not transcripts:
+        if not analysis.total_messages:
             return "No conversation data available."
         
-        questions_asked = sum(1 for t in transcripts if "?" in t.get("message", ""))
-        recommendations = sum(1 for t in transcripts if t.get("role") == "assistant" and 
-                            any(word in t.get("message", "").lower() for word in ["recommend", "suggest", "might like"]))
-        
-        summary = f"The call consisted of {len(transcripts)} message exchanges. "
-        summary += f"The agent asked {questions_asked} questions and made {recommendations} book recommendations."
+        summary = f"The call consisted of {analysis.total_messages} message exchanges. "
+        summary += f"The agent asked {analysis.questions_asked} questions and made {analysis.recommendations_made} book recommendations."
         
         return summary
     
-    def _extract_key_topics(self, transcripts: List[Dict[str, Any]]) -> List[str]:
-        """Extract key topics discussed"""
-        topics = []
-        all_text = " ".join([t.get("message", "").lower() for t in transcripts])
-        
-        if any(word in all_text for word in ["price", "cost", "payment"]):
-            topics.append("Pricing and Payment")
-        if any(word in all_text for word in ["delivery", "shipping"]):
-            topics.append("Delivery Options")
-        if any(word in all_text for word in ["recommend", "suggest"]):
-            topics.append("Book Recommendations")
-        if any(word in all_text for word in ["genre", "type of book"]):
-            topics.append("Genre Preferences")
-        if any(word in all_text for word in ["author", "written by"]):
-            topics.append("Author Preferences")
-        if any(word in all_text for word in ["order", "buy", "purchase"]):
-            topics.append("Order Placement")
-        
-        return topics if topics else ["General Inquiry"]
-    
-    def _extract_books_discussed(self, transcripts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        """Extract books discussed"""
-        books = []
-        for transcript in transcripts:
-            message = transcript.get("message", "")
-            quoted_titles = re.findall(r'["""\']([\w\s:,\-\']+)["""\']', message)
-            for title in quoted_titles:
-                if len(title) > 3:
-                    books.append({
-                        "title": title.strip(),
-                        "mentioned_by": transcript.get("role", "unknown"),
-                        "context": "mentioned in conversation"
-                    })
-        
-        seen = set()
-        unique_books = []
-        for book in books:
-            if book["title"].lower() not in seen:
-                seen.add(book["title"].lower())
-                unique_books.append(book)
-        
-        return unique_books[:10]
-    
-    def _extract_genres(self, transcripts: List[Dict[str, Any]]) -> List[str]:
-        """Extract genres mentioned"""
-        genres_found = []
-        all_text = " ".join([t.get("message", "").lower() for t in transcripts])
-        
-        for genre in self.book_genres:
-            if genre in all_text:
-                genres_found.append(genre.title())
-        
-        return list(set(genres_found))
-    
-    def _extract_authors(self, transcripts: List[Dict[str, Any]]) -> List[str]:
-        """Extract authors mentioned"""
-        authors = []
-        for transcript in transcripts:
-            message = transcript.get("message", "")
-            author_matches = re.findall(r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})', message)
-            authors.extend(author_matches)
-        
-        return list(set(authors))[:10]
-    
-    def _extract_objections(self, customer_messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        """Extract customer objections"""
-        objections = []
-        for msg in customer_messages:
-            message = msg.get("message", "").lower()
-            for keyword in self.objection_keywords:
-                if keyword in message:
-                    objections.append({
-                        "type": self._categorize_objection(keyword),
-                        "keyword": keyword,
-                        "message": msg.get("message", "")[:200],
-                        "timestamp": msg.get("timestamp")
-                    })
-                    break
-        return objections
-    
     def _categorize_objection(self, keyword: str) -> str:
         """Categorize objection type"""
-        if keyword in ["expensive", "cost", "price", "afford", "budget"]:
+        if keyword in ["expensive", "cost", "costs", "price", "afford", "budget"]:
             return "price"
         elif keyword in ["not sure", "don't know", "maybe", "think about"]:
             return "uncertainty"
@@ -407,24 +363,6 @@ class CallSummaryGenerator:
             return "need"
         return "general_concern"
     
-    def _identify_addressed_concerns(self, all_transcripts, objections) -> List[Dict[str, str]]:
-        """Identify addressed objections"""
-        addressed = []
-        for objection in objections:
-            objection_idx = next((i for i, t in enumerate(all_transcripts) 
-                                if t.get("message") == objection.get("message")), -1)
-            
-            if objection_idx >= 0 and objection_idx + 1 < len(all_transcripts):
-                agent_response = all_transcripts[objection_idx + 1]
-                if agent_response.get("role") == "assistant":
-                    addressed.append({
-                        "objection_type": objection.get("type"),
-                        "objection": objection.get("message")[:100],
-                        "response": agent_response.get("message", "")[:200],
-                        "addressed": True
-                    })
-        return addressed
-    
     def _identify_unresolved_concerns(self, objections, addressed) -> List[str]:
         """Identify unresolved concerns"""
         addressed_types = {a.get("objection_type") for a in addressed}
@@ -450,12 +388,12 @@ class CallSummaryGenerator:
         return [{"sequence": i+1, "sentiment": s.get("overall_sentiment", "neutral"),
                  "confidence": s.get("confidence", 0)} for i, s in enumerate(sentiment_data)]
     
-    def _calculate_engagement_level(self, transcripts, sentiment_data) -> str:
+    def _calculate_engagement_level(self, analysis: TranscriptAnalysis, sentiment_data) -> str:
         """Calculate engagement level"""
-        customer_msgs = [t for t in transcripts if t.get("role") == "user"]
-        if len(customer_msgs) > 8:
+        customer_count = len(analysis.customer_messages)
+        if customer_count > 8:
             return "high"
-        elif len(customer_msgs) > 4:
+        elif customer_count > 4:
             return "medium"
         return "low"
     
@@ -467,20 +405,13 @@ class CallSummaryGenerator:
             return 0.6
         return 0.5
     
-    def _evaluate_agent_responses(self, agent_messages, objections) -> str:
+    def _evaluate_agent_responses(self, analysis: TranscriptAnalysis) -> str:
         """Evaluate agent response quality"""
-        if not agent_messages:
+        if not analysis.agent_messages:
             return "needs_improvement"
-        helpful_keywords = ["recommend", "suggest", "help", "understand"]
-        helpful = sum(1 for m in agent_messages if any(k in m.get("message", "").lower() for k in helpful_keywords))
-        ratio = helpful / len(agent_messages) if agent_messages else 0
+        ratio = analysis.helpful_agent_messages / len(analysis.agent_messages)
         return "excellent" if ratio > 0.7 else ("good" if ratio > 0.5 else "needs_improvement")
     
-    def _count_recommendations(self, agent_messages) -> int:
-        """Count recommendations"""
-        keywords = ["recommend", "suggest", "might like"]
-        return sum(1 for m in agent_messages if any(k in m.get("message", "").lower() for k in keywords))
-    
     def _score_objection_handling(self, objections, addressed) -> float:
         """Score objection handling"""
         if not objections:
@@ -540,5 +471,12 @@ class CallSummaryGenerator:
         return points if points else ["Continue current performance"]
 
 
+def summary_is_current(stored: Optional[Dict[str, Any]], content_version: Dict[str, Any], manual_notes: Optional[str] = None) -> bool:
+    """Whether a stored summary was generated from the room's current content"""
+    if not stored or stored.get("content_version") != content_version:
+        return False
+    return manual_notes is None or manual_notes == stored.get("manual_notes")
+
+
 # Create singleton instance
 summary_generator = CallSummaryGenerator()
@@ -0,0 +1,224 @@
+"""
+Call Summary Analytics Rollups
+------------------------------
+Materialized counters behind the call-summary analytics endpoint. Every
+summary write contributes a set of counters (calls, outcome counts, score
+sums, objection/improvement/performance counts) to an all-time bucket and
+to the bucket of the day it was generated. Replacing or deleting a summary
+applies the difference against the previous version, so the rollups always
+reflect the stored summaries and analytics are read from a single document.
+
+Objection types, improvement areas and performance levels come from small
+fixed vocabularies in CallSummaryGenerator, so exact counters double as the
+top-k sketch.
+
+Backfill / repair:
+    python -m core.call_summary_rollups rebuild
+
+The API also backfills once at startup (ensure_rollups): summaries stored
+before rollups existed are counted the first time it starts, and a marker
+document records that it was done.
+"""
+
+import asyncio
+import logging
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ALL_TIME_BUCKET = "all"
+PERFORMANCE_LEVELS = ("excellent", "good", "needs_improvement")
+
+# Job checkpoint marking that the rollups were rebuilt from every stored summary
+BACKFILL_MARKER = "call_summary_rollups_backfill"
+
+# Counter paths are stored as nested MongoDB fields, so map keys must not
+# contain '.' or start with '$'
+_KEY_ESCAPES = {".": "．", "$": "＄"}
+
+
+def escape_key(key: Any) -> str:
+    """Make a category value safe to use as a MongoDB field name"""
+    key = str(key)
+    for char, replacement in _KEY_ESCAPES.items():
+        key = key.replace(char, replacement)
+    return key
+
+
+def unescape_key(key: str) -> str:
+    """Reverse escape_key"""
+    for char, replacement in _KEY_ESCAPES.items():
+        key = key.replace(replacement, char)
+    return key
+
+
+def day_bucket(summary: dict) -> Optional[str]:
+    """Bucket id for the day a summary was generated"""
+    generated_at = summary.get("generated_at")
+    if isinstance(generated_at, datetime):
+        return f"day:{generated_at.date().isoformat()}"
+    if isinstance(generated_at, str) and len(generated_at) >= 10:
+        return f"day:{generated_at[:10]}"
+    return None
+
+
+def summary_contribution(summary: Optional[dict]) -> Dict[str, float]:
+    """Flat counter increments one summary contributes to a bucket"""
+    if not summary:
+        return {}
+
+    counters: Dict[str, float] = defaultdict(int)
+    counters["calls"] += 1
+
+    outcome = summary.get("call_outcome", "unknown")
+    counters[f"outcomes.{escape_key(outcome)}"] += 1
+    if outcome == "success":
+        counters["successful_calls"] += 1
+
+    satisfaction = summary.get("customer_satisfaction")
+    if satisfaction:
+        counters["satisfaction_sum"] += satisfaction
+        counters["satisfaction_count"] += 1
+
+    objection_score = summary.get("objection_handling_score")
+    if objection_score is not None:
+        counters["objection_score_sum"] += objection_score
+        counters["objection_score_count"] += 1
+
+    counters["recommendations_sum"] += summary.get("recommendations_made", 0) or 0
+
+    for objection in summary.get("objections_raised", []) or []:
+        if isinstance(objection, dict):
+            # A null type counts as unknown, like $ifNull in the analytics aggregation
+            objection_type = objection.get("type")
+            counters[f"objections.{escape_key('unknown' if objection_type is None else objection_type)}"] += 1
+
+    for area in summary.get("improvement_areas", []) or []:
+        counters[f"improvements.{escape_key(area)}"] += 1
+
+    quality = summary.get("agent_response_quality", "")
+    if quality in PERFORMANCE_LEVELS:
+        counters[f"performance.{quality}"] += 1
+
+    return dict(counters)
+
+
+def rollup_delta(old: Optional[dict], new: Optional[dict]) -> Dict[str, Dict[str, float]]:
+    """Per-bucket increments that turn the rollups for `old` into the rollups for `new`
+
+    Either side may be None (insert / delete). Returns {bucket_id: {path: amount}}
+    with zero entries dropped.
+    """
+    delta: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+    for summary, sign in ((old, -1), (new, 1)):
+        contribution = summary_contribution(summary)
+        if not contribution:
+            continue
+        for bucket in (ALL_TIME_BUCKET, day_bucket(summary)):
+            if bucket is None:
+                continue
+            for path, amount in contribution.items():
+                delta[bucket][path] += sign * amount
+
+    return {
+        bucket: {path: amount for path, amount in counters.items() if amount}
+        for bucket, counters in delta.items()
+        if any(counters.values())
+    }
+
+
+def merge_rollups(docs) -> Dict[str, Any]:
+    """Sum several rollup documents (e.g. a range of days) into one"""
+    merged: Dict[str, Any] = {}
+    for doc in docs:
+        for field, value in doc.items():
+            if isinstance(value, dict):
+                target = merged.setdefault(field, {})
+                for key, amount in value.items():
+                    target[key] = target.get(key, 0) + amount
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[field] = merged.get(field, 0) + value
+    return merged
+
+
+def analytics_from_rollup(rollup: Optional[dict], top_k: int = 5) -> Dict[str, Any]:
+    """Shape a rollup document like the /api/call-summaries/analytics response"""
+    rollup = rollup or {}
+    total_calls = int(rollup.get("calls", 0))
+    if total_calls <= 0:
+        return {
+            "total_calls": 0,
+            "message": "No call summaries available for analysis"
+        }
+
+    def average(total_field: str, count_field: Optional[str] = None) -> float:
+        count = rollup.get(count_field, 0) if count_field else total_calls
+        return round(rollup.get(total_field, 0) / count, 2) if count else 0
+
+    def counts(field: str) -> Dict[str, int]:
+        return {unescape_key(k): int(v) for k, v in (rollup.get(field) or {}).items() if v > 0}
+
+    def top(field: str) -> list:
+        return sorted(counts(field).items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+    performance = counts("performance")
+    return {
+        "total_calls": total_calls,
+        "success_rate": round(rollup.get("successful_calls", 0) / total_calls * 100, 2),
+        "average_satisfaction": average("satisfaction_sum", "satisfaction_count"),
+        "average_objection_handling_score": average("objection_score_sum", "objection_score_count"),
+        "average_recommendations_made": average("recommendations_sum"),
+        "outcomes_distribution": counts("outcomes"),
+        "top_objections": [{"type": t, "count": c} for t, c in top("objections")],
+        "top_improvement_areas": [{"area": a, "count": c} for a, c in top("improvements")],
+        "agent_performance_distribution": {level: performance.get(level, 0) for level in PERFORMANCE_LEVELS},
+        "analysis_date": datetime.utcnow().isoformat()
+    }
+
+
+async def rebuild_rollups(db_service) -> int:
+    """Recompute all rollups from the stored call summaries"""
+    count = await db_service.rebuild_call_summary_rollups()
+    await db_service.save_job_checkpoint(BACKFILL_MARKER, {
+        "status": "completed",
+        "summaries": count,
+        "finished_at": datetime.utcnow()
+    })
+    logger.info(f"Rebuilt call summary rollups from {count} summaries")
+    return count
+
+
+async def ensure_rollups(db_service) -> Optional[int]:
+    """Backfill the rollups from existing summaries unless that was already done
+
+    Returns the number of summaries counted, or None when the marker shows the
+    rollups already cover them.
+    """
+    marker = await db_service.get_job_checkpoint(BACKFILL_MARKER)
+    if marker is not None and marker.get("status") == "completed":
+        return None
+    return await rebuild_rollups(db_service)
+
+
+async def _main(argv) -> int:
+    from db.database import db_service
+
+    if len(argv) < 2 or argv[1] != "rebuild":
+        print("Usage: python -m core.call_summary_rollups rebuild")
+        return 2
+
+    await db_service.connect()
+    try:
+        count = await rebuild_rollups(db_service)
+        print(f"Rebuilt call summary rollups from {count} summaries")
+    finally:
+        await db_service.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -0,0 +1,193 @@
+"""
+Co-Purchase Model Refresh
+-------------------------
+Offline job that learns "customers also bought" from stored orders and
+writes the top-k table to the catalog store, where recommendations read
+it with a single lookup during calls.
+
+1. Orders are streamed least recently written first from MongoDB a batch
+   at a time; each confirmed order counts as (customer, book), with the
+   ordered title resolved against the catalog once per distinct title.
+2. The first run (or --restart) counts every order and replaces the whole
+   table. Later runs only re-read orders written (`updated_at`) since
+   REFRESH_LOOKBACK before the last write seen, so confirmations,
+   rejections and cancellations of orders of any age are picked up,
+   apply them to the saved model and write just the rows that changed.
+3. Progress is checkpointed under JOB_NAME; with CO_PURCHASE_DIR set the
+   counted orders are saved there so a new process can refresh
+   incrementally too.
+
+Usage:
+    python -m core.co_purchase_job [--restart] [--batch-size N]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from services.co_purchase import CoPurchaseModel
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "co_purchase_model"
+
+# Order statuses that count as a purchase
+COUNTED_STATUSES = {"confirmed"}
+
+# How far before the newest order write already seen an incremental refresh
+# re-reads: covers writes still in flight and clock skew between API processes
+REFRESH_LOOKBACK = timedelta(minutes=5)
+
+ORDER_FIELDS = ["room_id", "customer_id", "customer_name", "book_title", "order_status", "updated_at"]
+
+
+class CoPurchaseJob:
+    """Full or incremental refresh of the co-purchase table
+
+    `resolve_book` maps an ordered title to a catalog book (or None); it may
+    block, so it runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        db_service,
+        catalog_store,
+        resolve_book: Callable[[str], Any],
+        directory: Optional[str] = None,
+        batch_size: int = 1000
+    ):
+        self.db_service = db_service
+        self.catalog_store = catalog_store
+        self.resolve_book = resolve_book
+        self.directory = directory
+        self.batch_size = batch_size
+        self.model: Optional[CoPurchaseModel] = None
+        self._book_of_title: Dict[str, Optional[str]] = {}
+        self.progress: Dict[str, Any] = {"status": "idle"}
+
+    async def run(self, restart: bool = False) -> Dict[str, Any]:
+        """Refresh the table and return the job's final progress"""
+        checkpoint = await self.db_service.get_job_checkpoint(JOB_NAME)
+        since = None
+        if not restart and checkpoint and checkpoint.get("status") == "completed" and checkpoint.get("last_updated_at"):
+            if self.model is None and self.directory:
+                model = CoPurchaseModel()
+                if model.load(self.directory):
+                    self.model = model
+            if self.model is not None:
+                since = checkpoint["last_updated_at"] - REFRESH_LOOKBACK
+        full = since is None
+        if full:
+            self.model = CoPurchaseModel()
+
+        self.progress = {
+            "status": "running",
+            "mode": "full" if full else "incremental",
+            "since": since,
+            "last_updated_at": None if full else checkpoint["last_updated_at"],
+            "scanned": 0,
+            "unresolved": 0,
+            "started_at": datetime.utcnow()
+        }
+        await self.db_service.save_job_checkpoint(JOB_NAME, self.progress)
+
+        started = time.perf_counter()
+        async for orders in self.db_service.iter_order_batches(since=since, batch_size=self.batch_size, fields=ORDER_FIELDS):
+            for order in orders:
+                await self._apply(order)
+            self.progress["scanned"] += len(orders)
+
+        loop = asyncio.get_running_loop()
+        changed = await loop.run_in_executor(None, self.model.refresh)
+        if full:
+            rows = await loop.run_in_executor(None, self.model.table)
+            await self.catalog_store.upsert_co_purchases(rows, replace=True)
+        else:
+            rows = changed
+            await self.catalog_store.upsert_co_purchases(rows)
+        if self.directory:
+            await loop.run_in_executor(None, self.model.save, self.directory)
+
+        if self.progress["last_updated_at"] is None:
+            # No order carries updated_at yet: later writes are all stamped after this run started
+            self.progress["last_updated_at"] = self.progress["started_at"]
+        self.progress.update({
+            "status": "completed",
+            "orders": len(self.model),
+            "customers": self.model.customers,
+            "books": self.model.books,
+            "rows_written": len(rows),
+            "finished_at": datetime.utcnow()
+        })
+        await self.db_service.save_job_checkpoint(JOB_NAME, self.progress)
+        logger.info(
+            f"Co-purchase {self.progress['mode']} refresh: scanned {self.progress['scanned']} orders, "
+            f"wrote {len(rows)} rows in {time.perf_counter() - started:.1f}s"
+        )
+        return self.progress
+
+    async def _apply(self, order: dict):
+        room_id = order.get("room_id")
+        if not room_id:
+            return
+        updated_at = order.get("updated_at")
+        if isinstance(updated_at, datetime) and (self.progress["last_updated_at"] is None or updated_at > self.progress["last_updated_at"]):
+            self.progress["last_updated_at"] = updated_at
+
+        customer = order.get("customer_id") or order.get("customer_name")
+        title = (order.get("book_title") or "").strip()
+        if order.get("order_status") not in COUNTED_STATUSES or not customer or not title:
+            self.model.remove_order(room_id)
+            return
+        book_id = await self._book_id(title)
+        if book_id is None:
+            self.progress["unresolved"] += 1
+            self.model.remove_order(room_id)
+            return
+        self.model.add_order(room_id, customer, book_id)
+
+    async def _book_id(self, title: str) -> Optional[str]:
+        key = title.lower()
+        if key not in self._book_of_title:
+            book = await asyncio.to_thread(self.resolve_book, title)
+            self._book_of_title[key] = book.book_id if book is not None else None
+        return self._book_of_title[key]
+
+
+async def _main(argv) -> int:
+    from db.database import db_service
+    from services.product_recommendation import recommendation_engine
+
+    parser = argparse.ArgumentParser(prog="python -m core.co_purchase_job", description="Refresh the co-purchase table")
+    parser.add_argument("--restart", action="store_true", help="recount every order instead of refreshing incrementally")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv[1:])
+
+    await db_service.connect()
+    await recommendation_engine.connect_catalog()
+    try:
+        progress = await CoPurchaseJob(
+            db_service,
+            recommendation_engine.catalog_store,
+            recommendation_engine.resolve_book,
+            directory=os.getenv("CO_PURCHASE_DIR") or None,
+            batch_size=args.batch_size
+        ).run(restart=args.restart)
+        print(
+            f"Co-purchase {progress['mode']} refresh: scanned {progress['scanned']} orders "
+            f"({progress['unresolved']} unresolved titles), wrote {progress['rows_written']} rows"
+        )
+    finally:
+        await recommendation_engine.close_catalog()
+        await db_service.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
@@ -0,0 +1,126 @@
+"""
+Notification Outbox Worker
+--------------------------
+Drains the persistent notification outbox written by the order and admin
+endpoints. Messages are claimed in batches, delivered through a pluggable
+sender and marked sent/failed by idempotency key, so a restart or an SMTP
+outage delays notifications instead of dropping them.
+"""
+
+import asyncio
+import logging
+import socket
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sender contract: takes a batch of outbox messages and returns
+# {idempotency_key: error_message_or_None}; None means delivered.
+OutboxSender = Callable[[List[dict]], Dict[str, Optional[str]]]
+
+
+class OutboxWorker:
+    """Background worker that delivers queued notifications in batches"""
+
+    def __init__(
+        self,
+        db_service,
+        sender: OutboxSender,
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        retry_base_seconds: int = 30,
+        retry_max_seconds: int = 3600,
+        lease_seconds: int = 120
+    ):
+        self.db_service = db_service
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{id(self):x}"
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        """Exponential backoff for a message that has failed `attempts` times"""
+        return timedelta(seconds=min(self.retry_base_seconds * (2 ** attempts), self.retry_max_seconds))
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch, returning the number of messages processed"""
+        batch = await self.db_service.claim_outbox_batch(
+            self.worker_id, limit=self.batch_size, lease_seconds=self.lease_seconds
+        )
+        if not batch:
+            return 0
+
+        try:
+            # SMTP is blocking - keep it off the event loop
+            delivery = await asyncio.to_thread(self.sender, batch)
+        except Exception as e:
+            logger.error(f"Outbox sender failed for batch of {len(batch)}: {e}")
+            delivery = {message["idempotency_key"]: str(e) for message in batch}
+
+        now = datetime.utcnow()
+        results = {}
+        for message in batch:
+            key = message["idempotency_key"]
+            error = delivery.get(key, "No delivery result returned")
+            if error is None:
+                results[key] = {"status": "sent", "sent_at": now, "last_error": None}
+                continue
+
+            attempts = message.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on notification {key} after {attempts} attempts: {error}")
+                results[key] = {"status": "failed", "last_error": error}
+            else:
+                results[key] = {
+                    "status": "pending",
+                    "next_attempt_at": now + self._retry_delay(attempts),
+                    "last_error": error
+                }
+
+        # Every message in a batch carries the same claim token
+        recorded = await self.db_service.record_outbox_results(results, batch[0]["claimed_by"])
+        if recorded < len(results):
+            # The lease ran out mid-delivery and another worker re-claimed these;
+            # its results stand (a message may have been delivered twice)
+            logger.warning(f"Outbox lease lost for {len(results) - recorded}/{len(batch)} messages; results not recorded")
+        sent = sum(1 for r in results.values() if r["status"] == "sent")
+        logger.info(f"Outbox batch processed: {sent}/{len(batch)} delivered")
+        return len(batch)
+
+    async def run_forever(self):
+        """Drain the outbox until stopped, sleeping only when it is empty"""
+        logger.info(f"Outbox worker {self.worker_id} started")
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}")
+                processed = 0
+
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"Outbox worker {self.worker_id} stopped")
+
+    def start(self):
+        """Start the worker as a background task on the running loop"""
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        """Stop the worker after the in-flight batch completes"""
+        self._stopping.set()
+        if self._task:
+            await self._task
+            self._task = None
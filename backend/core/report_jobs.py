@@ -0,0 +1,152 @@
+"""
+Call End Report Jobs
+--------------------
+In-process registry for call-end reports generated in the background. The
+call-end endpoint submits a job and returns its handle immediately; clients
+poll or long-poll the job until the report is ready.
+
+A semaphore bounds how many report pipelines run at once, so when many calls
+end together the extra jobs wait in "pending" instead of competing for the
+database and the summary executor. A room with an unfinished job reuses it
+rather than starting a duplicate pipeline. Finished jobs are kept for
+`retention_seconds` and then dropped.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class ReportJob:
+    """One background report generation"""
+
+    def __init__(self, room_id: str):
+        self.job_id = f"RJ-{uuid.uuid4().hex[:12].upper()}"
+        self.room_id = room_id
+        self.status = PENDING
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Job handle / status for API responses"""
+        data = {
+            "job_id": self.job_id,
+            "room_id": self.room_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if self.status == COMPLETED:
+            data["report"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class ReportJobRegistry:
+    """Runs report jobs as bounded background tasks and tracks their results"""
+
+    def __init__(self, max_concurrent: int = 4, retention_seconds: int = 3600):
+        self.max_concurrent = max_concurrent
+        self.retention = timedelta(seconds=retention_seconds)
+        self._jobs: Dict[str, ReportJob] = {}
+        self._active_by_room: Dict[str, str] = {}
+        self._tasks = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, room_id: str, pipeline: Callable[[], Awaitable[Dict[str, Any]]]) -> ReportJob:
+        """Start `pipeline` in the background, or return the room's unfinished job"""
+        self._prune()
+        active_id = self._active_by_room.get(room_id)
+        if active_id and active_id in self._jobs and not self._jobs[active_id].finished:
+            return self._jobs[active_id]
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job = ReportJob(room_id)
+        self._jobs[job.job_id] = job
+        self._active_by_room[room_id] = job.job_id
+        task = asyncio.create_task(self._run(job, pipeline))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: ReportJob, pipeline: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            async with self._semaphore:
+                job.status = RUNNING
+                job.started_at = datetime.utcnow()
+                job.result = await pipeline()
+                job.status = COMPLETED
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Report job {job.job_id} for room {job.room_id} failed: {e}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            if self._active_by_room.get(job.room_id) == job.job_id:
+                del self._active_by_room[job.room_id]
+            job.done.set()
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[ReportJob]:
+        """Return the job once finished, or after `timeout` seconds, whichever is first"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts = {PENDING: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def shutdown(self):
+        """Cancel unfinished jobs"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+report_jobs = ReportJobRegistry(
+    max_concurrent=int(os.getenv("CALL_REPORT_MAX_CONCURRENT", "4")),
+    retention_seconds=int(os.getenv("CALL_REPORT_JOB_RETENTION", "3600"))
+)
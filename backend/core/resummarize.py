@@ -0,0 +1,237 @@
+"""
+Batch Call Summary Re-generation
+--------------------------------
+Recomputes stored call summaries after CallSummaryGenerator changes without
+one HTTP call per room:
+
+1. Room ids are streamed from MongoDB in ascending order, a chunk at a time.
+2. Transcripts, orders, sentiment records and manual notes for a chunk are
+   loaded with one query per collection (the next chunk is prefetched while
+   the current one is summarized).
+3. Summaries are built across a process pool. Workers do not load the book
+   catalog; book mentions are resolved in this process afterwards, using
+   the resolver already set on summary_generator (the API's recommendation
+   engine, or the catalog the CLI loads once).
+4. Each chunk is written with one unordered bulk_write, then the last room id
+   is checkpointed so an interrupted run resumes where it stopped.
+
+Rollups are rebuilt once at the end instead of per summary.
+
+Usage:
+    python -m core.resummarize [--source summaries|transcripts] [--chunk-size N] [--workers N] [--restart]
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.call_end_handler import order_view
+from core.call_summary_generator import summary_generator
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "resummarize_call_summaries"
+
+
+def _summarize_rooms(rooms: List[Tuple[str, list, Optional[dict], list, Optional[str]]]) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """Process pool entry point: build summaries for a slice of rooms
+
+    Workers have no book resolver (the catalog is never loaded in them), so
+    books_discussed holds only quoted titles; the parent resolves them.
+    Returns (room_id, summary dict or None, error or None) per room.
+    """
+    results = []
+    for room_id, transcripts, order_data, sentiment_data, manual_notes in rooms:
+        try:
+            summary = summary_generator.build_summary(
+                room_id=room_id,
+                transcripts=transcripts,
+                order_data=order_data,
+                sentiment_data=sentiment_data,
+                manual_notes=manual_notes
+            )
+            results.append((room_id, summary.to_dict(), None))
+        except Exception as e:
+            results.append((room_id, None, str(e)))
+    return results
+
+
+class ResummarizeJob:
+    """Resumable re-generation of call summaries for every room in `source`"""
+
+    def __init__(
+        self,
+        db_service,
+        source: str = "summaries",
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+        restart: bool = False
+    ):
+        self.db_service = db_service
+        self.source = source
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.restart = restart
+        self.progress: Dict[str, Any] = {"status": "idle"}
+
+    async def run(self) -> Dict[str, Any]:
+        """Run (or resume) the job to completion and return its final progress"""
+        checkpoint = await self.db_service.get_job_checkpoint(JOB_NAME)
+        resume = (
+            not self.restart and checkpoint is not None
+            and checkpoint.get("status") == "running" and checkpoint.get("source") == self.source
+        )
+        if resume:
+            self.progress = {k: v for k, v in checkpoint.items() if k not in ("_id", "updated_at")}
+            logger.info(f"Resuming re-summarization after room {self.progress.get('last_room_id')}")
+        else:
+            self.progress = {
+                "status": "running",
+                "source": self.source,
+                "last_room_id": None,
+                "processed": 0,
+                "skipped": 0,
+                "failed": 0,
+                "started_at": datetime.utcnow()
+            }
+            await self.db_service.save_job_checkpoint(JOB_NAME, self.progress)
+
+        started = time.perf_counter()
+        done_at_start = self.progress["processed"]
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            batches = self.db_service.iter_room_id_batches(
+                source=self.source, after=self.progress["last_room_id"], batch_size=self.chunk_size
+            )
+            room_ids = await anext(batches, None)
+            fetch = asyncio.create_task(self.db_service.get_rooms_for_summary(room_ids)) if room_ids else None
+
+            while fetch is not None:
+                rooms = await fetch
+                chunk_last_room_id = room_ids[-1]
+                room_ids = await anext(batches, None)
+                fetch = asyncio.create_task(self.db_service.get_rooms_for_summary(room_ids)) if room_ids else None
+
+                await self._process_chunk(pool, rooms)
+                self.progress["last_room_id"] = chunk_last_room_id
+                await self.db_service.save_job_checkpoint(JOB_NAME, self.progress)
+
+                elapsed = time.perf_counter() - started
+                rate = (self.progress["processed"] - done_at_start) / elapsed * 60 if elapsed else 0
+                logger.info(
+                    f"Re-summarized {self.progress['processed']} rooms "
+                    f"(skipped {self.progress['skipped']}, failed {self.progress['failed']}, {rate:,.0f} rooms/min)"
+                )
+
+        rebuilt = await self.db_service.rebuild_call_summary_rollups()
+        self.progress["status"] = "completed"
+        self.progress["finished_at"] = datetime.utcnow()
+        await self.db_service.save_job_checkpoint(JOB_NAME, self.progress)
+        logger.info(f"Re-summarization complete; rebuilt rollups from {rebuilt} summaries")
+        return self.progress
+
+    async def _process_chunk(self, pool: ProcessPoolExecutor, rooms: Dict[str, dict]):
+        payload = []
+        content_versions = {}
+        stored = {}
+        for room_id, room in rooms.items():
+            transcripts_raw = room["transcripts"]
+            if not transcripts_raw:
+                self.progress["skipped"] += 1
+                continue
+            transcripts = [
+                {
+                    "id": t.get("id"),
+                    "role": t.get("role"),
+                    "message": t.get("message"),
+                    "timestamp": t.get("timestamp")
+                } for t in transcripts_raw
+            ]
+            content_versions[room_id] = self.db_service.room_content_version(
+                len(transcripts_raw),
+                transcripts_raw[-1].get("timestamp"),
+                room["order"],
+                len(room["sentiment"])
+            )
+            # Keeps the summary's identity and day bucket; only its content is regenerated
+            stored[room_id] = {field: room[field] for field in ("summary_id", "generated_at") if room.get(field)}
+            payload.append((room_id, transcripts, order_view(room["order"]), room["sentiment"], room["manual_notes"]))
+
+        if not payload:
+            return
+
+        loop = asyncio.get_running_loop()
+        slice_size = -(-len(payload) // self.workers)
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _summarize_rooms, payload[i:i + slice_size])
+            for i in range(0, len(payload), slice_size)
+        ))
+
+        summaries = []
+        transcripts_by_room = {room_id: transcripts for room_id, transcripts, *_ in payload}
+        for room_id, summary, error in (item for result in results for item in result):
+            if summary is None:
+                logger.error(f"Failed to re-summarize room {room_id}: {error}")
+                self.progress["failed"] += 1
+                continue
+            summary["room_id"] = room_id
+            summary["content_version"] = content_versions[room_id]
+            summary.update(stored[room_id])
+            summaries.append(summary)
+
+        if summary_generator.analyzer.book_resolver is not None:
+            await asyncio.to_thread(self._resolve_book_mentions, summaries, transcripts_by_room)
+
+        await self.db_service.bulk_store_call_summaries(summaries)
+        self.progress["processed"] += len(summaries)
+
+
+    @staticmethod
+    def _resolve_book_mentions(summaries: List[dict], transcripts_by_room: Dict[str, list]):
+        for summary in summaries:
+            summary_generator.resolve_book_mentions(summary, transcripts_by_room[summary["room_id"]])
+
+
+async def _main(argv) -> int:
+    from db.database import db_service
+
+    parser = argparse.ArgumentParser(prog="python -m core.resummarize", description="Re-generate stored call summaries")
+    parser.add_argument("--source", choices=["summaries", "transcripts"], default="summaries",
+                        help="rooms with a stored summary (default) or every room with transcripts")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args(argv[1:])
+
+    await db_service.connect()
+    try:
+        # Loaded once here for resolving book titles; the workers never load it
+        try:
+            from services.product_recommendation import recommendation_engine
+            await recommendation_engine.load_catalog()
+            summary_generator.set_book_resolver(recommendation_engine)
+        except Exception as e:
+            logger.warning(f"Book titles will not be canonicalized: {e}")
+        progress = await ResummarizeJob(
+            db_service,
+            source=args.source,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            restart=args.restart
+        ).run()
+        print(f"Re-summarized {progress['processed']} rooms (skipped {progress['skipped']}, failed {progress['failed']})")
+    finally:
+        await db_service.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
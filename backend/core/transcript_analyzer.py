@@ -0,0 +1,178 @@
+"""
+Single-Pass Transcript Analyzer
+-------------------------------
+Collects every transcript-derived signal CallSummaryGenerator needs in one
+pass: each message is lowercased once and run through a single keyword
+automaton covering all keyword families (topics, genres, objections,
+recommendations, helpful phrases). Conversation-level signals are the union
+of the per-message hits. Keywords match whole words; a trailing ``*`` marks a
+word prefix (see utils.keyword_matcher).
+
+With a book resolver (the recommendation engine), quoted titles are
+canonicalized to catalog titles and unquoted, misspelled title mentions
+("the silent pacient") are recognised too.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from utils.keyword_matcher import KeywordMatcher
+
+# Conversation topics, in report order
+TOPIC_KEYWORDS = {
+    "Pricing and Payment": ["price*", "cost*", "payment*"],
+    "Delivery Options": ["deliver*", "shipping"],
+    "Book Recommendations": ["recommend*", "suggest*"],
+    "Genre Preferences": ["genre*", "type of book*"],
+    "Author Preferences": ["author*", "written by"],
+    "Order Placement": ["order*", "buy*", "purchas*"],
+}
+
+RECOMMENDATION_KEYWORDS = ["recommend*", "suggest*", "might like"]
+HELPFUL_KEYWORDS = ["recommend*", "suggest*", "help*", "understand*"]
+
+QUOTED_TITLE_PATTERN = re.compile(r'["""\']([\w\s:,\-\']+)["""\']')
+AUTHOR_PATTERN = re.compile(r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})')
+
+
+@dataclass
+class TranscriptAnalysis:
+    """Transcript signals shared by every summary metric"""
+    total_messages: int = 0
+    customer_messages: List[Dict[str, Any]] = field(default_factory=list)
+    agent_messages: List[Dict[str, Any]] = field(default_factory=list)
+    questions_asked: int = 0
+    recommendations_made: int = 0
+    helpful_agent_messages: int = 0
+    key_topics: List[str] = field(default_factory=list)
+    genres: List[str] = field(default_factory=list)
+    books: List[Dict[str, str]] = field(default_factory=list)
+    authors: List[str] = field(default_factory=list)
+    objections: List[Dict[str, Any]] = field(default_factory=list)
+    addressed_concerns: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class TranscriptAnalyzer:
+    """Builds a TranscriptAnalysis from transcripts in a single pass"""
+
+    def __init__(self, objection_keywords: List[str], book_genres: List[str], categorize_objection, book_resolver=None):
+        self.objection_keywords = objection_keywords
+        # Optional: object with resolve_book(span) and find_books_in_text(text)
+        self.book_resolver = book_resolver
+        self.book_genres = book_genres
+        self.categorize_objection = categorize_objection
+        # The first objection keyword in list order wins for a message
+        self._objection_priority = {k.lower(): i for i, k in enumerate(objection_keywords)}
+
+        families = {f"topic:{topic}": keywords for topic, keywords in TOPIC_KEYWORDS.items()}
+        families.update({f"genre:{genre}": [f"{genre}*"] for genre in book_genres})
+        families["objection"] = objection_keywords
+        families["recommendation"] = RECOMMENDATION_KEYWORDS
+        families["helpful"] = HELPFUL_KEYWORDS
+        self.matcher = KeywordMatcher(families)
+
+    def analyze(self, transcripts: List[Dict[str, Any]]) -> TranscriptAnalysis:
+        """Analyze transcripts (oldest first)"""
+        analysis = TranscriptAnalysis(total_messages=len(transcripts))
+        conversation_families: Set[str] = set()
+        first_index: Dict[Any, int] = {}
+        seen_titles: Set[str] = set()
+        authors: Set[str] = set()
+
+        for index, transcript in enumerate(transcripts):
+            message = transcript.get("message", "")
+            role = transcript.get("role")
+            first_index.setdefault(transcript.get("message"), index)
+
+            message_families: Set[str] = set()
+            objection_keyword: Optional[str] = None
+            for match in self.matcher.finditer(message.lower()):
+                message_families.update(match.families)
+                if "objection" in match.families and (
+                    objection_keyword is None
+                    or self._objection_priority[match.keyword] < self._objection_priority[objection_keyword]
+                ):
+                    objection_keyword = match.keyword
+
+            conversation_families |= message_families
+            if "?" in message:
+                analysis.questions_asked += 1
+
+            if role == "user":
+                analysis.customer_messages.append(transcript)
+                if objection_keyword is not None:
+                    analysis.objections.append({
+                        "type": self.categorize_objection(objection_keyword),
+                        "keyword": objection_keyword,
+                        "message": message[:200],
+                        "timestamp": transcript.get("timestamp")
+                    })
+            elif role == "assistant":
+                analysis.agent_messages.append(transcript)
+                if "recommendation" in message_families:
+                    analysis.recommendations_made += 1
+                if "helpful" in message_families:
+                    analysis.helpful_agent_messages += 1
+
+            if len(analysis.books) < 10:
+                self._collect_books(message, transcript.get("role", "unknown"), analysis.books, seen_titles)
+
+            authors.update(AUTHOR_PATTERN.findall(message))
+
+        analysis.key_topics = [topic for topic in TOPIC_KEYWORDS if f"topic:{topic}" in conversation_families] or ["General Inquiry"]
+        analysis.genres = list({genre.title() for genre in self.book_genres if f"genre:{genre}" in conversation_families})
+        analysis.authors = list(authors)[:10]
+
+        # An objection counts as addressed when the agent replies right after it
+        for objection in analysis.objections:
+            objection_index = first_index.get(objection["message"], -1)
+            if 0 <= objection_index < len(transcripts) - 1:
+                agent_response = transcripts[objection_index + 1]
+                if agent_response.get("role") == "assistant":
+                    analysis.addressed_concerns.append({
+                        "objection_type": objection.get("type"),
+                        "objection": objection.get("message")[:100],
+                        "response": agent_response.get("message", "")[:200],
+                        "addressed": True
+                    })
+
+        return analysis
+
+    def collect_books(self, transcripts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Book titles mentioned in transcripts (the `books` of analyze), without the rest of the analysis"""
+        books: List[Dict[str, str]] = []
+        seen_titles: Set[str] = set()
+        for transcript in transcripts:
+            if len(books) >= 10:
+                break
+            self._collect_books(transcript.get("message", ""), transcript.get("role", "unknown"), books, seen_titles)
+        return books
+
+    def _collect_books(self, message: str, role: str, books: List[Dict[str, str]], seen_titles: Set[str]):
+        """Add quoted (and, with a resolver, recognised) book titles in `message`"""
+        mentioned = []
+        for title in QUOTED_TITLE_PATTERN.findall(message):
+            title = title.strip()
+            if len(title) <= 3:
+                continue
+            book = self.book_resolver.resolve_book(title) if self.book_resolver else None
+            mentioned.append(book if book is not None else title)
+        if self.book_resolver:
+            mentioned.extend(self.book_resolver.find_books_in_text(message))
+
+        for item in mentioned:
+            title = item if isinstance(item, str) else item.title
+            title_key = title.lower()
+            if title_key in seen_titles or len(books) >= 10:
+                continue
+            seen_titles.add(title_key)
+            entry = {
+                "title": title,
+                "mentioned_by": role,
+                "context": "mentioned in conversation"
+            }
+            if not isinstance(item, str):
+                entry["book_id"] = item.book_id
+                entry["author"] = item.author
+            books.append(entry)
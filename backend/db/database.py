@@ -1,13 +1,23 @@
 import os
+import asyncio
+import base64
+import json
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
 import logging
-from typing import Dict, List
-from collections import defaultdict
-from datetime import datetime
+import uuid
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from pymongo import UpdateOne, ReplaceOne
+from core.call_summary_rollups import rollup_delta, summary_contribution, merge_rollups, escape_key, ALL_TIME_BUCKET, PERFORMANCE_LEVELS
 
 logger = logging.getLogger(__name__)
 
+# Delivered notifications are kept this long (so a repeated idempotency key is
+# still recognised), then dropped from the outbox
+OUTBOX_SENT_RETENTION = timedelta(days=float(os.getenv("OUTBOX_SENT_RETENTION_DAYS", "7")))
+
 class MongoDBService:
     def __init__(self):
         self.client = None
@@ -18,7 +28,11 @@ class MongoDBService:
         self.admins_collection = None
         self.sentiment_collection = None
         self.call_summaries_collection = None
+        self.call_summary_rollups_collection = None
+        self.outbox_collection = None
+        self.job_checkpoints_collection = None
         self.use_memory = False
+        self.supports_transactions = False
         # In-memory fallback storage
         self._memory_transcripts: Dict[str, List[dict]] = defaultdict(list)
         self._memory_orders: Dict[str, dict] = {}
@@ -26,6 +40,10 @@ class MongoDBService:
         self._memory_admins: List[dict] = []
         self._memory_sentiment: Dict[str, List[dict]] = defaultdict(list)
         self._memory_call_summaries: Dict[str, dict] = {}
+        self._memory_call_summary_rollups: Dict[str, dict] = {}
+        self._memory_outbox: Dict[str, dict] = {}
+        self._memory_outbox_sent: deque = deque()  # (sent_at, idempotency_key), oldest first
+        self._memory_job_checkpoints: Dict[str, dict] = {}
     
     async def connect(self):
         """Connect to MongoDB"""
@@ -48,23 +66,48 @@ class MongoDBService:
             self.admins_collection = self.db.admins
             self.sentiment_collection = self.db.sentiment
             self.call_summaries_collection = self.db.call_summaries
+            self.call_summary_rollups_collection = self.db.call_summary_rollups
+            self.outbox_collection = self.db.notification_outbox
+            self.job_checkpoints_collection = self.db.job_checkpoints
             
             # Test connection
             await self.client.admin.command('ping')
             logger.info(f"✅ Successfully connected to MongoDB: {db_name}")
             
+            # Multi-document transactions need a replica set or sharded cluster
+            hello = await self.client.admin.command('hello')
+            self.supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+            if not self.supports_transactions:
+                logger.warning("MongoDB is standalone - outbox writes will not be transactional")
+            
             # Create indexes
             logger.info("Creating database indexes...")
             await self.transcripts_collection.create_index("room_id")
             await self.transcripts_collection.create_index("timestamp")
+            await self.transcripts_collection.create_index([("room_id", 1), ("timestamp", -1)])
+            await self.sentiment_collection.create_index([("room_id", 1), ("created_at", 1)])
             await self.orders_collection.create_index("room_id")
             await self.orders_collection.create_index("customer_id")
+            # Keyset pagination for order listings: (order_date desc, room_id desc)
+            await self.orders_collection.create_index([("order_date", -1), ("room_id", -1)])
+            await self.orders_collection.create_index([("order_status", 1), ("order_date", -1), ("room_id", -1)])
+            await self.orders_collection.create_index([("customer_id", 1), ("order_date", -1), ("room_id", -1)])
+            await self.orders_collection.create_index([("updated_at", 1), ("room_id", 1)])
             await self.feedback_collection.create_index("room_id")
             await self.feedback_collection.create_index("customer_id")
             await self.feedback_collection.create_index("feedback_date")
             await self.call_summaries_collection.create_index("room_id", unique=True)
             await self.call_summaries_collection.create_index("generated_at")
             await self.call_summaries_collection.create_index("call_outcome")
+            await self.call_summaries_collection.create_index([("call_outcome", 1), ("generated_at", -1)])
+            await self.call_summary_rollups_collection.create_index("day")
+            await self.outbox_collection.create_index("idempotency_key", unique=True)
+            await self.outbox_collection.create_index([("status", 1), ("next_attempt_at", 1)])
+            await self.outbox_collection.create_index("claimed_by")
+            # TTL: sent_at is only set on delivery, so pending and failed messages never expire
+            await self.outbox_collection.create_index(
+                "sent_at", expireAfterSeconds=int(OUTBOX_SENT_RETENTION.total_seconds())
+            )
             
             # Clean up existing admin records with null employee_id to fix duplicate key issues
             try:
@@ -147,21 +190,51 @@ class MongoDBService:
             logger.error(f"Failed to get transcripts: {e}")
             raise
     
-    async def store_order(self, room_id: str, order_data: dict):
-        """Store or update order data for a room"""
+    async def _run_in_transaction(self, operation):
+        """Run operation(session) inside a transaction when the deployment supports it"""
+        if self.supports_transactions:
+            async with await self.client.start_session() as session:
+                async with session.start_transaction():
+                    return await operation(session)
+        return await operation(None)
+    
+    async def store_order(self, room_id: str, order_data: dict, outbox_messages: Optional[List[dict]] = None):
+        """Store (replace) the order for a room, queueing any notifications with it
+
+        The stored document becomes exactly `order_data` stamped with
+        `updated_at`; only its `version` carries over, incremented.
+        """
         try:
+            # The version is never taken from the caller - it only moves forward
+            fields = {k: v for k, v in order_data.items() if k not in ("_id", "version")}
+            fields["room_id"] = room_id
+            fields["updated_at"] = datetime.utcnow()
+            
             if self.use_memory:
-                order_data["room_id"] = room_id
-                self._memory_orders[room_id] = order_data
+                previous = self._memory_orders.get(room_id) or {}
+                self._memory_orders[room_id] = {**fields, "version": previous.get("version", 0) + 1}
+                if outbox_messages:
+                    await self._insert_outbox_messages(outbox_messages)
                 logger.info(f"Stored order in memory for room {room_id}")
                 return 1
             else:
-                order_data["room_id"] = room_id
-                result = await self.orders_collection.replace_one(
-                    {"room_id": room_id}, 
-                    order_data, 
-                    upsert=True
-                )
+                async def write(session):
+                    # Pipeline update: replace the document but keep its _id and bump its version.
+                    # $literal keeps values such as "$5 off" from being read as field paths
+                    result = await self.orders_collection.update_one(
+                        {"room_id": room_id},
+                        [{"$replaceWith": {"$mergeObjects": [
+                            {"$literal": fields},
+                            {"_id": "$_id", "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}}
+                        ]}}],
+                        upsert=True,
+                        session=session
+                    )
+                    if outbox_messages:
+                        await self._insert_outbox_messages(outbox_messages, session=session)
+                    return result
+                
+                result = await self._run_in_transaction(write)
                 logger.info(f"Stored order for room {room_id}")
                 return result.upserted_id or result.matched_count
         except Exception as e:
@@ -179,7 +252,239 @@ class MongoDBService:
         except Exception as e:
             logger.error(f"Failed to get order: {e}")
             raise
-    
+
+    async def update_order_fields(
+        self,
+        room_id: str,
+        set_fields: Optional[dict] = None,
+        inc_fields: Optional[dict] = None,
+        order_id: Optional[str] = None,
+        expected_version: Optional[int] = None
+    ):
+        """Apply a field-level update to an order without reading it first
+
+        Bumps the order's `version` and stamps `updated_at`. When `expected_version` is given the update
+        only applies if the stored version still matches (orders written before
+        versioning count as version 0). Returns the updated order, or None if no
+        order matched (missing, different order_id, or version conflict).
+        """
+        try:
+            set_fields = {k: v for k, v in (set_fields or {}).items() if k not in ("_id", "room_id", "version")}
+            set_fields["updated_at"] = datetime.utcnow()
+            inc_fields = {k: v for k, v in (inc_fields or {}).items() if k != "version"}
+            
+            if self.use_memory:
+                order = self._memory_orders.get(room_id)
+                if not order or (order_id is not None and order.get("order_id") != order_id):
+                    return None
+                if expected_version is not None and order.get("version", 0) != expected_version:
+                    return None
+                order.update(set_fields)
+                for field, amount in inc_fields.items():
+                    order[field] = order.get(field, 0) + amount
+                order["version"] = order.get("version", 0) + 1
+                return order
+            
+            query = {"room_id": room_id}
+            if order_id is not None:
+                query["order_id"] = order_id
+            if expected_version is not None:
+                # A missing field matches None, so unversioned orders count as version 0
+                query["version"] = {"$in": [0, None]} if expected_version == 0 else expected_version
+            
+            update = {"$inc": {**inc_fields, "version": 1}, "$set": set_fields}
+            return await self.orders_collection.find_one_and_update(query, update, return_document=True)
+        except Exception as e:
+            logger.error(f"Failed to update order fields: {e}")
+            raise
+
+    @staticmethod
+    def encode_order_cursor(order: dict) -> str:
+        """Encode the sort key of the last order on a page as an opaque cursor"""
+        order_date = order.get("order_date")
+        key = {"d": order_date.isoformat() if isinstance(order_date, datetime) else order_date, "r": order["room_id"]}
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @staticmethod
+    def decode_order_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+        """Decode a cursor produced by encode_order_cursor (raises ValueError if malformed)"""
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            order_date = datetime.fromisoformat(key["d"]) if key["d"] else None
+            return order_date, key["r"]
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def _build_order_query(filters: dict) -> dict:
+        """Translate listing filters into a MongoDB query"""
+        clauses = []
+        if filters.get("status"):
+            clauses.append({"order_status": filters["status"]})
+        else:
+            clauses.append({"order_status": {"$ne": "draft"}})
+        if filters.get("customer"):
+            clauses.append({"$or": [{"customer_id": filters["customer"]}, {"customer_name": filters["customer"]}]})
+        if filters.get("payment_method"):
+            clauses.append({"payment_method": filters["payment_method"]})
+        date_range = {}
+        if filters.get("date_from"):
+            date_range["$gte"] = filters["date_from"]
+        if filters.get("date_to"):
+            date_range["$lt"] = filters["date_to"]
+        if date_range:
+            clauses.append({"order_date": date_range})
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @staticmethod
+    def _order_matches(order: dict, filters: dict) -> bool:
+        """In-memory equivalent of _build_order_query"""
+        if filters.get("status"):
+            if order.get("order_status") != filters["status"]:
+                return False
+        elif order.get("order_status") == "draft":
+            return False
+        if filters.get("customer") and filters["customer"] not in (order.get("customer_id"), order.get("customer_name")):
+            return False
+        if filters.get("payment_method") and order.get("payment_method") != filters["payment_method"]:
+            return False
+        order_date = order.get("order_date")
+        if filters.get("date_from") and (not isinstance(order_date, datetime) or order_date < filters["date_from"]):
+            return False
+        if filters.get("date_to") and (not isinstance(order_date, datetime) or order_date >= filters["date_to"]):
+            return False
+        return True
+
+    async def list_orders(
+        self,
+        filters: Optional[dict] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """List orders newest first with keyset pagination
+
+        filters: status, customer (customer_id or name), payment_method,
+        date_from (inclusive), date_to (exclusive). Draft orders are excluded
+        unless status='draft'. Returns (orders, next_cursor); next_cursor is
+        None on the last page. `fields` limits the returned fields.
+        """
+        try:
+            filters = filters or {}
+            after = self.decode_order_cursor(cursor) if cursor else None
+            projection = None
+            if fields:
+                projection = {f: 1 for f in set(fields) | {"room_id", "order_date"}}
+                projection["_id"] = 0
+
+            if self.use_memory:
+                orders = [o for o in self._memory_orders.values() if self._order_matches(o, filters)]
+                # Newest first, undated orders last (matches MongoDB's descending sort)
+                orders.sort(key=lambda o: (isinstance(o.get("order_date"), datetime), o.get("order_date") or datetime.min, o.get("room_id", "")), reverse=True)
+                if after:
+                    after_date, after_room = after
+                    def is_after(o):
+                        order_date = o.get("order_date") if isinstance(o.get("order_date"), datetime) else None
+                        if after_date is None:
+                            return order_date is None and o.get("room_id", "") < after_room
+                        return order_date is None or order_date < after_date or (order_date == after_date and o.get("room_id", "") < after_room)
+                    orders = [o for o in orders if is_after(o)]
+                page = orders[:limit] if limit else orders
+                if projection:
+                    page = [{f: o.get(f) for f in projection if f != "_id"} for o in page]
+                has_more = bool(limit) and len(orders) > limit
+            else:
+                query = self._build_order_query(filters)
+                if after:
+                    after_date, after_room = after
+                    if after_date is None:
+                        keyset = {"order_date": None, "room_id": {"$lt": after_room}}
+                    else:
+                        keyset = {"$or": [
+                            {"order_date": {"$lt": after_date}},
+                            {"order_date": after_date, "room_id": {"$lt": after_room}},
+                            {"order_date": None}
+                        ]}
+                    query = {"$and": [query, keyset]}
+                find_cursor = self.orders_collection.find(query, projection).sort([("order_date", -1), ("room_id", -1)])
+                if limit:
+                    # Fetch one extra to know whether another page exists
+                    find_cursor = find_cursor.limit(limit + 1)
+                page = await find_cursor.to_list(length=None)
+                has_more = bool(limit) and len(page) > limit
+                page = page[:limit] if limit else page
+
+            next_cursor = self.encode_order_cursor(page[-1]) if has_more and page else None
+            return page, next_cursor
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to list orders: {e}")
+            raise
+
+    async def count_orders(self, filters: Optional[dict] = None) -> int:
+        """Count orders matching listing filters"""
+        try:
+            filters = filters or {}
+            if self.use_memory:
+                return sum(1 for o in self._memory_orders.values() if self._order_matches(o, filters))
+            return await self.orders_collection.count_documents(self._build_order_query(filters))
+        except Exception as e:
+            logger.error(f"Failed to count orders: {e}")
+            raise
+
+    async def bulk_update_order_status(self, updates: List[dict], projection: Optional[List[str]] = None):
+        """Apply many order status changes with one bulk write
+
+        Each update is {room_id, order_id, status}. Returns {room_id: order} for
+        every order that now matches its requested status, limited to `projection`
+        fields, so callers can report per-item results without re-reading orders.
+        """
+        try:
+            now = datetime.utcnow()
+            fields = ["room_id", "order_id", "order_status"] + [f for f in (projection or []) if f not in ("room_id", "order_id", "order_status")]
+
+            if self.use_memory:
+                updated = {}
+                for update in updates:
+                    order = self._memory_orders.get(update["room_id"])
+                    if order and order.get("order_id") == update["order_id"]:
+                        order["order_status"] = update["status"]
+                        order["updated_at"] = now
+                        order["version"] = order.get("version", 0) + 1
+                        updated[update["room_id"]] = {f: order.get(f) for f in fields}
+                logger.info(f"Bulk updated {len(updated)}/{len(updates)} orders in memory")
+                return updated
+
+            if not updates:
+                return {}
+            result = await self.orders_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"room_id": u["room_id"], "order_id": u["order_id"]},
+                        {"$set": {"order_status": u["status"], "updated_at": now}, "$inc": {"version": 1}}
+                    )
+                    for u in updates
+                ],
+                ordered=False
+            )
+
+            requested = {u["room_id"]: u for u in updates}
+            cursor = self.orders_collection.find(
+                {"room_id": {"$in": list(requested)}},
+                {**{f: 1 for f in fields}, "_id": 0}
+            )
+            updated = {}
+            async for order in cursor:
+                update = requested[order["room_id"]]
+                if order.get("order_id") == update["order_id"] and order.get("order_status") == update["status"]:
+                    updated[order["room_id"]] = order
+            logger.info(f"Bulk updated orders: matched {result.matched_count}, modified {result.modified_count}")
+            return updated
+        except Exception as e:
+            logger.error(f"Failed to bulk update order status: {e}")
+            raise
+
     async def store_feedback(self, feedback_data: dict):
         """Store feedback data"""
         try:
@@ -235,8 +540,8 @@ class MongoDBService:
             raise
 
     # Admin Management Methods
-    async def create_admin(self, admin_data: dict):
-        """Create a new admin account"""
+    async def create_admin(self, admin_data: dict, outbox_messages: Optional[List[dict]] = None):
+        """Create a new admin account, queueing any notifications with it"""
         try:
             if self.use_memory:
                 # Check if email already exists (employee_id is None during registration)
@@ -249,6 +554,8 @@ class MongoDBService:
                 
                 admin_data["admin_id"] = str(len(self._memory_admins) + 1)
                 self._memory_admins.append(admin_data)
+                if outbox_messages:
+                    await self._insert_outbox_messages(outbox_messages)
                 logger.info(f"Created admin in memory: {admin_data.get('employee_id')}")
                 return admin_data["admin_id"]
             else:
@@ -258,7 +565,13 @@ class MongoDBService:
                     if existing_employee:
                         raise Exception("Employee ID already exists")
                 
-                result = await self.admins_collection.insert_one(admin_data)
+                async def write(session):
+                    result = await self.admins_collection.insert_one(admin_data, session=session)
+                    if outbox_messages:
+                        await self._insert_outbox_messages(outbox_messages, session=session)
+                    return result
+                
+                result = await self._run_in_transaction(write)
                 logger.info(f"Created admin {result.inserted_id}")
                 return str(result.inserted_id)
         except Exception as e:
@@ -340,8 +653,9 @@ class MongoDBService:
             logger.error(f"Failed to get all orders: {e}")
             raise
 
-    async def update_admin_verification(self, verification_token: str, email_verified: bool = True, status: str = "active", employee_id: str = None):
-        """Update admin verification status using verification token"""
+    async def update_admin_verification(self, verification_token: str, email_verified: bool = True, status: str = "active", employee_id: str = None,
+                                        outbox_messages: Optional[List[dict]] = None):
+        """Update admin verification status using verification token, queueing any notifications with it"""
         try:
             if self.use_memory:
                 for admin in self._memory_admins:
@@ -353,6 +667,8 @@ class MongoDBService:
                         admin["updated_at"] = datetime.now().isoformat()
                         if employee_id:
                             admin["employee_id"] = employee_id
+                        if outbox_messages:
+                            await self._insert_outbox_messages(outbox_messages)
                         return admin
                 return None
             else:
@@ -366,12 +682,19 @@ class MongoDBService:
                 if employee_id:
                     update_data["employee_id"] = employee_id
                 
-                result = await self.admins_collection.find_one_and_update(
-                    {"email_verification_token": verification_token},
-                    {"$set": update_data},
-                    return_document=True
-                )
-                return result
+                async def write(session):
+                    admin = await self.admins_collection.find_one_and_update(
+                        {"email_verification_token": verification_token},
+                        {"$set": update_data},
+                        return_document=True,
+                        session=session
+                    )
+                    # Only notify when this call actually consumed the token
+                    if admin and outbox_messages:
+                        await self._insert_outbox_messages(outbox_messages, session=session)
+                    return admin
+                
+                return await self._run_in_transaction(write)
         except Exception as e:
             logger.error(f"Failed to update admin verification: {e}")
             raise
@@ -494,28 +817,79 @@ class MongoDBService:
 
     # Call Summary Methods
     async def store_call_summary(self, room_id: str, summary_data: dict):
-        """Store call summary data"""
+        """Store call summary data and update the analytics rollups"""
         try:
             summary_data["room_id"] = room_id
             
             if self.use_memory:
+                previous = self._memory_call_summaries.get(room_id)
                 self._memory_call_summaries[room_id] = summary_data
+                await self._apply_call_summary_rollup_delta(rollup_delta(previous, summary_data))
                 logger.info(f"Stored call summary in memory for room {room_id}")
                 return room_id
             else:
-                # Replace existing summary for this room (one summary per call)
-                result = await self.call_summaries_collection.replace_one(
-                    {"room_id": room_id},
-                    summary_data,
-                    upsert=True
-                )
+                async def write(session):
+                    # Replace existing summary for this room (one summary per call);
+                    # the pre-image lets the rollups apply only the difference
+                    previous = await self.call_summaries_collection.find_one_and_replace(
+                        {"room_id": room_id},
+                        summary_data,
+                        upsert=True,
+                        session=session
+                    )
+                    await self._apply_call_summary_rollup_delta(rollup_delta(previous, summary_data), session=session)
+                    return previous
+                
+                await self._run_in_transaction(write)
                 logger.info(f"Stored call summary for room {room_id}")
-                return result.upserted_id or result.matched_count
+                return room_id
                 
         except Exception as e:
             logger.error(f"Failed to store call summary: {e}")
             raise
     
+    @staticmethod
+    def room_content_version(transcript_count: int, last_transcript_at, order: Optional[dict], sentiment_count: int) -> dict:
+        """Fingerprint of everything a call summary is derived from"""
+        return {
+            "transcripts": transcript_count,
+            "last_transcript_at": last_transcript_at,
+            "order_status": order.get("order_status") if order else None,
+            "order_version": order.get("version") if order else None,
+            "sentiment_records": sentiment_count,
+        }
+    
+    async def get_room_content_version(self, room_id: str) -> dict:
+        """Current content version of a room, without loading its transcripts"""
+        try:
+            if self.use_memory:
+                transcripts = self._memory_transcripts.get(room_id, [])
+                last_transcript = max(transcripts, key=lambda t: t.get("timestamp", 0), default=None)
+                return self.room_content_version(
+                    len(transcripts),
+                    last_transcript.get("timestamp") if last_transcript else None,
+                    self._memory_orders.get(room_id),
+                    len(self._memory_sentiment.get(room_id, []))
+                )
+            else:
+                transcript_count, last_transcript, order, sentiment_count = await asyncio.gather(
+                    self.transcripts_collection.count_documents({"room_id": room_id}),
+                    self.transcripts_collection.find_one(
+                        {"room_id": room_id}, {"timestamp": 1}, sort=[("timestamp", -1)]
+                    ),
+                    self.orders_collection.find_one({"room_id": room_id}, {"order_status": 1, "version": 1}),
+                    self.sentiment_collection.count_documents({"room_id": room_id})
+                )
+                return self.room_content_version(
+                    transcript_count,
+                    last_transcript.get("timestamp") if last_transcript else None,
+                    order,
+                    sentiment_count
+                )
+        except Exception as e:
+            logger.error(f"Failed to get room content version: {e}")
+            raise
+    
     async def get_call_summary(self, room_id: str):
         """Get call summary for a specific room"""
         try:
@@ -568,18 +942,569 @@ class MongoDBService:
         try:
             if self.use_memory:
                 if room_id in self._memory_call_summaries:
-                    del self._memory_call_summaries[room_id]
+                    previous = self._memory_call_summaries.pop(room_id)
+                    await self._apply_call_summary_rollup_delta(rollup_delta(previous, None))
                     logger.info(f"Deleted call summary from memory for room {room_id}")
                     return True
                 return False
             else:
-                result = await self.call_summaries_collection.delete_one({"room_id": room_id})
+                async def write(session):
+                    previous = await self.call_summaries_collection.find_one_and_delete({"room_id": room_id}, session=session)
+                    if previous:
+                        await self._apply_call_summary_rollup_delta(rollup_delta(previous, None), session=session)
+                    return previous
+                
+                previous = await self._run_in_transaction(write)
                 logger.info(f"Deleted call summary for room {room_id}")
-                return result.deleted_count > 0
+                return previous is not None
                 
         except Exception as e:
             logger.error(f"Failed to delete call summary: {e}")
             return False
 
+    # Call Summary Rollup Methods
+    async def _apply_call_summary_rollup_delta(self, delta: Dict[str, Dict[str, float]], session=None):
+        """Apply per-bucket counter increments from rollup_delta"""
+        if not delta:
+            return
+        
+        if self.use_memory:
+            for bucket, increments in delta.items():
+                rollup = self._memory_call_summary_rollups.setdefault(bucket, {"_id": bucket})
+                if bucket != ALL_TIME_BUCKET:
+                    rollup["day"] = bucket[len("day:"):]
+                for path, amount in increments.items():
+                    if "." in path:
+                        field, key = path.split(".", 1)
+                        counters = rollup.setdefault(field, {})
+                        counters[key] = counters.get(key, 0) + amount
+                    else:
+                        rollup[path] = rollup.get(path, 0) + amount
+            return
+        
+        operations = []
+        for bucket, increments in delta.items():
+            update = {"$inc": increments}
+            if bucket != ALL_TIME_BUCKET:
+                update["$setOnInsert"] = {"day": bucket[len("day:"):]}
+            operations.append(UpdateOne({"_id": bucket}, update, upsert=True))
+        await self.call_summary_rollups_collection.bulk_write(operations, ordered=False, session=session)
+
+    async def get_call_summary_rollup(self, bucket: str = ALL_TIME_BUCKET) -> Optional[dict]:
+        """Get one rollup bucket ('all' or 'day:YYYY-MM-DD')"""
+        try:
+            if self.use_memory:
+                return self._memory_call_summary_rollups.get(bucket)
+            return await self.call_summary_rollups_collection.find_one({"_id": bucket})
+        except Exception as e:
+            logger.error(f"Failed to get call summary rollup: {e}")
+            raise
+
+    async def get_call_summary_daily_rollups(self, day_from: Optional[str] = None, day_to: Optional[str] = None) -> List[dict]:
+        """Get per-day rollups with day_from <= day <= day_to (YYYY-MM-DD)"""
+        try:
+            if self.use_memory:
+                rollups = [r for r in self._memory_call_summary_rollups.values() if "day" in r]
+                return sorted(
+                    [r for r in rollups if (not day_from or r["day"] >= day_from) and (not day_to or r["day"] <= day_to)],
+                    key=lambda r: r["day"]
+                )
+            day_range = {"$exists": True}
+            if day_from:
+                day_range["$gte"] = day_from
+            if day_to:
+                day_range["$lte"] = day_to
+            cursor = self.call_summary_rollups_collection.find({"day": day_range}).sort("day", 1)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to get daily call summary rollups: {e}")
+            raise
+
+    @staticmethod
+    def _call_summary_filter_matches(summary: dict, date_from: Optional[str], date_to: Optional[str], outcome: Optional[str]) -> bool:
+        """In-memory equivalent of the analytics $match stage"""
+        generated_at = summary.get("generated_at")
+        if isinstance(generated_at, datetime):
+            generated_at = generated_at.isoformat()
+        if outcome and summary.get("call_outcome") != outcome:
+            return False
+        if date_from and (not generated_at or generated_at < date_from):
+            return False
+        if date_to and (not generated_at or generated_at >= date_to):
+            return False
+        return True
+
+    async def aggregate_call_summary_analytics(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        outcome: Optional[str] = None,
+        top_k: int = 5
+    ) -> dict:
+        """Compute analytics counters for a slice of call summaries in the database
+
+        Runs one $facet aggregation (totals, outcomes, top objections, top
+        improvement areas, performance levels) so no summary documents leave
+        MongoDB. date_from is inclusive, date_to exclusive. Returns a
+        rollup-shaped dict (see core.call_summary_rollups.analytics_from_rollup).
+        """
+        try:
+            # generated_at is stored as an ISO string, which sorts chronologically
+            iso_from = date_from.isoformat() if date_from else None
+            iso_to = date_to.isoformat() if date_to else None
+            
+            if self.use_memory:
+                summaries = [
+                    s for s in self._memory_call_summaries.values()
+                    if self._call_summary_filter_matches(s, iso_from, iso_to, outcome)
+                ]
+                return merge_rollups(self._nest_rollup_paths(summary_contribution(s)) for s in summaries)
+            
+            match = {}
+            if outcome:
+                match["call_outcome"] = outcome
+            if iso_from or iso_to:
+                match["generated_at"] = {}
+                if iso_from:
+                    match["generated_at"]["$gte"] = iso_from
+                if iso_to:
+                    match["generated_at"]["$lt"] = iso_to
+            
+            def top_counts(field: str, key: str, objects_only: bool = False):
+                # objects_only drops entries that are not documents, as summary_contribution does
+                return [
+                    {"$unwind": f"${field}"},
+                    *([{"$match": {field: {"$type": "object"}}}] if objects_only else []),
+                    {"$group": {"_id": key, "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1, "_id": 1}},
+                    {"$limit": top_k}
+                ]
+            
+            pipeline = [
+                {"$match": match},
+                {"$facet": {
+                    "totals": [{"$group": {
+                        "_id": None,
+                        "calls": {"$sum": 1},
+                        "successful_calls": {"$sum": {"$cond": [{"$eq": ["$call_outcome", "success"]}, 1, 0]}},
+                        "satisfaction_sum": {"$sum": {"$ifNull": ["$customer_satisfaction", 0]}},
+                        "satisfaction_count": {"$sum": {"$cond": [
+                            {"$ne": [{"$ifNull": ["$customer_satisfaction", 0]}, 0]}, 1, 0
+                        ]}},
+                        "objection_score_sum": {"$sum": {"$ifNull": ["$objection_handling_score", 0]}},
+                        "objection_score_count": {"$sum": {"$cond": [
+                            {"$eq": [{"$ifNull": ["$objection_handling_score", None]}, None]}, 0, 1
+                        ]}},
+                        "recommendations_sum": {"$sum": {"$ifNull": ["$recommendations_made", 0]}}
+                    }}],
+                    "outcomes": [{"$group": {"_id": {"$ifNull": ["$call_outcome", "unknown"]}, "count": {"$sum": 1}}}],
+                    "objections": top_counts("objections_raised", {"$ifNull": ["$objections_raised.type", "unknown"]}, objects_only=True),
+                    "improvements": top_counts("improvement_areas", "$improvement_areas"),
+                    "performance": [
+                        {"$match": {"agent_response_quality": {"$in": list(PERFORMANCE_LEVELS)}}},
+                        {"$group": {"_id": "$agent_response_quality", "count": {"$sum": 1}}}
+                    ]
+                }}
+            ]
+            
+            cursor = self.call_summaries_collection.aggregate(pipeline)
+            results = await cursor.to_list(length=1)
+            facets = results[0] if results else {}
+            
+            analytics = dict((facets.get("totals") or [{}])[0])
+            analytics.pop("_id", None)
+            for field in ("outcomes", "objections", "improvements", "performance"):
+                analytics[field] = {escape_key(item["_id"]): item["count"] for item in facets.get(field, [])}
+            return analytics
+        except Exception as e:
+            logger.error(f"Failed to aggregate call summary analytics: {e}")
+            raise
+
+    @staticmethod
+    def _nest_rollup_paths(increments: Dict[str, float]) -> dict:
+        """Turn flat 'field.key' counter paths into a nested rollup document"""
+        doc = {}
+        for path, amount in increments.items():
+            if "." in path:
+                field, key = path.split(".", 1)
+                doc.setdefault(field, {})[key] = amount
+            else:
+                doc[path] = amount
+        return doc
+
+    async def rebuild_call_summary_rollups(self) -> int:
+        """Recompute every rollup bucket from the stored call summaries"""
+        try:
+            buckets: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+            count = 0
+            
+            def add(summary):
+                for bucket, increments in rollup_delta(None, summary).items():
+                    for path, amount in increments.items():
+                        buckets[bucket][path] += amount
+            
+            if self.use_memory:
+                for summary in self._memory_call_summaries.values():
+                    add(summary)
+                    count += 1
+                self._memory_call_summary_rollups.clear()
+                await self._apply_call_summary_rollup_delta(buckets)
+                return count
+            
+            projection = {
+                "_id": 0, "call_outcome": 1, "customer_satisfaction": 1, "objection_handling_score": 1,
+                "recommendations_made": 1, "objections_raised.type": 1, "improvement_areas": 1,
+                "agent_response_quality": 1, "generated_at": 1
+            }
+            async for summary in self.call_summaries_collection.find({}, projection):
+                add(summary)
+                count += 1
+            
+            # Build complete documents, then swap them in and drop buckets that no longer exist
+            documents = []
+            for bucket, increments in buckets.items():
+                doc = {"_id": bucket, **self._nest_rollup_paths(increments)}
+                if bucket != ALL_TIME_BUCKET:
+                    doc["day"] = bucket[len("day:"):]
+                documents.append(doc)
+            
+            if documents:
+                await self.call_summary_rollups_collection.bulk_write(
+                    [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents],
+                    ordered=False
+                )
+            await self.call_summary_rollups_collection.delete_many({"_id": {"$nin": list(buckets)}})
+            return count
+        except Exception as e:
+            logger.error(f"Failed to rebuild call summary rollups: {e}")
+            raise
+
+    # Batch Re-summarization Methods
+    async def iter_room_id_batches(self, source: str = "summaries", after: Optional[str] = None, batch_size: int = 500):
+        """Stream room ids in ascending order, `batch_size` at a time
+        
+        source="summaries" walks rooms that already have a call summary,
+        source="transcripts" every room with at least one transcript.
+        """
+        try:
+            if source not in ("summaries", "transcripts"):
+                raise ValueError(f"Unknown room source: {source}")
+            
+            if self.use_memory:
+                rooms = self._memory_call_summaries if source == "summaries" else self._memory_transcripts
+                room_ids = sorted(r for r in rooms if (after is None or r > after) and (source == "summaries" or rooms[r]))
+                for i in range(0, len(room_ids), batch_size):
+                    yield room_ids[i:i + batch_size]
+                return
+            
+            match = {"room_id": {"$gt": after}} if after is not None else {}
+            if source == "summaries":
+                # Walks the unique room_id index
+                cursor = self.call_summaries_collection.find(match, {"_id": 0, "room_id": 1}).sort("room_id", 1).batch_size(batch_size)
+                field = "room_id"
+            else:
+                cursor = self.transcripts_collection.aggregate(
+                    [{"$match": match}, {"$sort": {"room_id": 1}}, {"$group": {"_id": "$room_id"}}, {"$sort": {"_id": 1}}],
+                    allowDiskUse=True,
+                    batchSize=batch_size
+                )
+                field = "_id"
+            
+            batch = []
+            async for doc in cursor:
+                batch.append(doc[field])
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        except Exception as e:
+            logger.error(f"Failed to stream room ids: {e}")
+            raise
+    
+    async def iter_order_batches(self, since: Optional[datetime] = None, batch_size: int = 1000, fields: Optional[List[str]] = None):
+        """Stream non-draft orders least recently written first ((updated_at, room_id) ascending), `batch_size` at a time
+        
+        With `since`, only orders written at or after it (orders never stamped
+        with updated_at are skipped).
+        """
+        try:
+            if self.use_memory:
+                orders = [
+                    o for o in self._memory_orders.values()
+                    if o.get("order_status") != "draft"
+                    and (since is None or (isinstance(o.get("updated_at"), datetime) and o["updated_at"] >= since))
+                ]
+                # Unstamped orders first (matches MongoDB's ascending sort on a missing field)
+                orders.sort(key=lambda o: (isinstance(o.get("updated_at"), datetime), o.get("updated_at") or datetime.min, o.get("room_id", "")))
+                for i in range(0, len(orders), batch_size):
+                    batch = orders[i:i + batch_size]
+                    yield [{f: o.get(f) for f in fields} for o in batch] if fields else batch
+                return
+            
+            query = {"order_status": {"$ne": "draft"}}
+            if since is not None:
+                query["updated_at"] = {"$gte": since}
+            projection = dict.fromkeys(fields, 1) if fields else None
+            cursor = self.orders_collection.find(query, projection).sort([("updated_at", 1), ("room_id", 1)]).batch_size(batch_size)
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        except Exception as e:
+            logger.error(f"Failed to stream orders: {e}")
+            raise
+    
+    async def get_rooms_for_summary(self, room_ids: List[str]) -> Dict[str, dict]:
+        """Transcripts, order, sentiment records and manual notes for many rooms in four queries
+        
+        Returns {room_id: {"transcripts", "order", "sentiment", "manual_notes",
+        "summary_id", "generated_at"}} with transcripts and sentiment records
+        oldest first; the last three come from the stored summary, if any.
+        """
+        try:
+            rooms = {
+                room_id: {
+                    "transcripts": [], "order": None, "sentiment": [],
+                    "manual_notes": None, "summary_id": None, "generated_at": None
+                }
+                for room_id in room_ids
+            }
+            
+            if self.use_memory:
+                for room_id, room in rooms.items():
+                    room["transcripts"] = sorted(self._memory_transcripts.get(room_id, []), key=lambda t: t.get("timestamp", 0))
+                    room["order"] = self._memory_orders.get(room_id)
+                    room["sentiment"] = [record["sentiment_data"] for record in self._memory_sentiment.get(room_id, [])]
+                    stored = self._memory_call_summaries.get(room_id) or {}
+                    for field in ("manual_notes", "summary_id", "generated_at"):
+                        room[field] = stored.get(field)
+                return rooms
+            
+            query = {"room_id": {"$in": list(room_ids)}}
+            transcripts, orders, sentiment, summaries = await asyncio.gather(
+                self.transcripts_collection.find(query).to_list(length=None),
+                self.orders_collection.find(query).to_list(length=None),
+                self.sentiment_collection.find(query, {"room_id": 1, "sentiment_data": 1, "created_at": 1}).to_list(length=None),
+                self.call_summaries_collection.find(
+                    query, {"room_id": 1, "manual_notes": 1, "summary_id": 1, "generated_at": 1}
+                ).to_list(length=None)
+            )
+            
+            # Ordering is done per room here rather than as one large server-side sort
+            for transcript in sorted(transcripts, key=lambda t: t.get("timestamp", 0)):
+                rooms[transcript["room_id"]]["transcripts"].append(transcript)
+            for order in orders:
+                rooms[order["room_id"]]["order"] = order
+            for record in sorted(sentiment, key=lambda r: r.get("created_at") or datetime.min):
+                rooms[record["room_id"]]["sentiment"].append(record["sentiment_data"])
+            for summary in summaries:
+                for field in ("manual_notes", "summary_id", "generated_at"):
+                    rooms[summary["room_id"]][field] = summary.get(field)
+            return rooms
+        except Exception as e:
+            logger.error(f"Failed to get rooms for summary: {e}")
+            raise
+    
+    async def bulk_store_call_summaries(self, summaries: List[dict]) -> int:
+        """Replace many call summaries in one unordered bulk write
+        
+        Rollups are not adjusted per summary; rebuild them once the batch job
+        is done (rebuild_call_summary_rollups).
+        """
+        try:
+            if not summaries:
+                return 0
+            
+            if self.use_memory:
+                for summary in summaries:
+                    self._memory_call_summaries[summary["room_id"]] = summary
+                return len(summaries)
+            
+            result = await self.call_summaries_collection.bulk_write(
+                [ReplaceOne({"room_id": summary["room_id"]}, summary, upsert=True) for summary in summaries],
+                ordered=False
+            )
+            return result.matched_count + result.upserted_count
+        except Exception as e:
+            logger.error(f"Failed to bulk store call summaries: {e}")
+            raise
+    
+    async def get_job_checkpoint(self, job_name: str) -> Optional[dict]:
+        """Saved progress of a resumable batch job"""
+        try:
+            if self.use_memory:
+                return self._memory_job_checkpoints.get(job_name)
+            return await self.job_checkpoints_collection.find_one({"_id": job_name})
+        except Exception as e:
+            logger.error(f"Failed to get job checkpoint: {e}")
+            raise
+    
+    async def save_job_checkpoint(self, job_name: str, checkpoint: dict):
+        """Replace the saved progress of a batch job"""
+        try:
+            checkpoint = {**checkpoint, "_id": job_name, "updated_at": datetime.utcnow()}
+            if self.use_memory:
+                self._memory_job_checkpoints[job_name] = checkpoint
+                return
+            await self.job_checkpoints_collection.replace_one({"_id": job_name}, checkpoint, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to save job checkpoint: {e}")
+            raise
+
+    # Notification Outbox Methods
+    async def _insert_outbox_messages(self, messages: List[dict], session=None):
+        """Insert outbox messages, ignoring any whose idempotency key is already queued"""
+        now = datetime.utcnow()
+        records = []
+        for message in messages:
+            records.append({
+                **message,
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+                "claimed_by": None,
+                "lease_expires_at": None,
+                "sent_at": None,
+                "last_error": None
+            })
+        
+        if self.use_memory:
+            for record in records:
+                self._memory_outbox.setdefault(record["idempotency_key"], record)
+            return len(records)
+        
+        if not records:
+            return 0
+        result = await self.outbox_collection.bulk_write(
+            [UpdateOne({"idempotency_key": r["idempotency_key"]}, {"$setOnInsert": r}, upsert=True) for r in records],
+            ordered=False,
+            session=session
+        )
+        return result.upserted_count
+    
+    async def enqueue_notifications(self, messages: List[dict]):
+        """Queue notifications that are not tied to a business record write"""
+        try:
+            queued = await self._insert_outbox_messages(messages)
+            logger.info(f"Queued {queued} notification(s) in outbox")
+            return queued
+        except Exception as e:
+            logger.error(f"Failed to queue notifications: {e}")
+            raise
+    
+    async def claim_outbox_batch(self, worker_id: str, limit: int = 50, lease_seconds: int = 120):
+        """Claim a batch of due outbox messages for delivery
+        
+        Messages stuck in 'sending' past their lease (e.g. the worker died
+        mid-batch) become claimable again.
+        """
+        try:
+            now = datetime.utcnow()
+            claim_token = f"{worker_id}:{uuid.uuid4().hex}"
+            lease_expires_at = now + timedelta(seconds=lease_seconds)
+            
+            def is_due(record: dict) -> bool:
+                if record["status"] == "pending":
+                    return record["next_attempt_at"] <= now
+                return record["status"] == "sending" and record["lease_expires_at"] <= now
+            
+            if self.use_memory:
+                due = sorted((r for r in self._memory_outbox.values() if is_due(r)), key=lambda r: r["next_attempt_at"])[:limit]
+                for record in due:
+                    record["status"] = "sending"
+                    record["claimed_by"] = claim_token
+                    record["lease_expires_at"] = lease_expires_at
+                return [dict(r) for r in due]
+            
+            due_filter = {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_expires_at": {"$lte": now}}
+            ]}
+            cursor = self.outbox_collection.find(due_filter, {"_id": 1}).sort("next_attempt_at", 1).limit(limit)
+            ids = [doc["_id"] for doc in await cursor.to_list(length=limit)]
+            if not ids:
+                return []
+            
+            # Re-check the due filter so concurrent workers never claim the same message
+            await self.outbox_collection.update_many(
+                {"_id": {"$in": ids}, **due_filter},
+                {"$set": {"status": "sending", "claimed_by": claim_token, "lease_expires_at": lease_expires_at}}
+            )
+            cursor = self.outbox_collection.find({"claimed_by": claim_token})
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Failed to claim outbox batch: {e}")
+            raise
+    
+    async def record_outbox_results(self, results: Dict[str, dict], claimed_by: str):
+        """Apply delivery results keyed by idempotency key in a single write
+        
+        Only messages still held under the `claimed_by` claim are updated: once
+        a lease expires and another worker re-claims a message, the late
+        results are dropped. Returns the number of messages updated; the rest
+        were lost leases.
+        """
+        try:
+            if not results:
+                return 0
+            if self.use_memory:
+                applied = 0
+                for key, fields in results.items():
+                    record = self._memory_outbox.get(key)
+                    if record and record["claimed_by"] == claimed_by:
+                        record.update(fields)
+                        record["attempts"] += 1
+                        record["claimed_by"] = None
+                        record["lease_expires_at"] = None
+                        if record["status"] == "sent":
+                            self._memory_outbox_sent.append((record["sent_at"], key))
+                        applied += 1
+                self._prune_memory_outbox()
+                return applied
+            
+            result = await self.outbox_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"idempotency_key": key, "claimed_by": claimed_by},
+                        {"$set": {**fields, "claimed_by": None, "lease_expires_at": None}, "$inc": {"attempts": 1}}
+                    ) for key, fields in results.items()
+                ],
+                ordered=False
+            )
+            return result.matched_count
+        except Exception as e:
+            logger.error(f"Failed to record outbox results: {e}")
+            raise
+    
+    def _prune_memory_outbox(self):
+        """Drop delivered messages older than OUTBOX_SENT_RETENTION (the TTL index does this in MongoDB)"""
+        cutoff = datetime.utcnow() - OUTBOX_SENT_RETENTION
+        sent = self._memory_outbox_sent
+        while sent and sent[0][0] <= cutoff:
+            _, key = sent.popleft()
+            record = self._memory_outbox.get(key)
+            if record is not None and record["status"] == "sent":
+                del self._memory_outbox[key]
+    
+    async def get_outbox_stats(self):
+        """Get outbox message counts by status"""
+        try:
+            if self.use_memory:
+                stats = defaultdict(int)
+                for record in self._memory_outbox.values():
+                    stats[record["status"]] += 1
+                return dict(stats)
+            cursor = self.outbox_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+            return {doc["_id"]: doc["count"] for doc in await cursor.to_list(length=None)}
+        except Exception as e:
+            logger.error(f"Failed to get outbox stats: {e}")
+            return {}
+
 # Global database service instance
 db_service = MongoDBService()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
@@ -6,6 +6,11 @@ from typing import Dict, List, Optional, Literal, Any
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from db.database import db_service
+from core.notification_outbox import OutboxWorker
+from utils.email_templates import email_templates
+from utils.keyword_matcher import KeywordMatcher
+from core.call_summary_rollups import analytics_from_rollup, ensure_rollups, rebuild_rollups
+import asyncio
 import logging
 import os
 import smtplib
@@ -43,7 +48,7 @@ except ImportError as e:
     question_generator = None
 
 try:
-    from core.call_summary_generator import summary_generator
+    from core.call_summary_generator import summary_generator, summary_is_current
     CALL_SUMMARY_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"Call summary generator not available: {e}")
@@ -52,11 +57,41 @@ except ImportError as e:
 
 try:
     from core.call_end_handler import generate_call_end_report
+    from core.report_jobs import report_jobs
     CALL_END_HANDLER_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"Call end handler not available: {e}")
     CALL_END_HANDLER_AVAILABLE = False
     generate_call_end_report = None
+    report_jobs = None
+
+try:
+    from core.resummarize import ResummarizeJob, JOB_NAME as RESUMMARIZE_JOB_NAME
+    RESUMMARIZE_AVAILABLE = True
+except ImportError as e:
+    logging.warning(f"Batch re-summarization not available: {e}")
+    RESUMMARIZE_AVAILABLE = False
+
+try:
+    from core.co_purchase_job import CoPurchaseJob, JOB_NAME as CO_PURCHASE_JOB_NAME
+    CO_PURCHASE_AVAILABLE = recommendation_engine is not None
+except ImportError as e:
+    logging.warning(f"Co-purchase model not available: {e}")
+    CO_PURCHASE_AVAILABLE = False
+
+try:
+    from services.llm_gateway import get_llm_gateway
+    LLM_GATEWAY_AVAILABLE = True
+except ImportError as e:
+    logging.warning(f"LLM gateway not available: {e}")
+    LLM_GATEWAY_AVAILABLE = False
+
+# Summaries canonicalize (misspelled) book titles against the catalog when both are loaded
+if summary_generator is not None and recommendation_engine is not None:
+    summary_generator.set_book_resolver(recommendation_engine)
+
+# Unit price used when the ordered book cannot be matched to the catalog
+DEFAULT_UNIT_PRICE = 15.99
 
 # Load environment variables
 load_dotenv()
@@ -120,6 +155,7 @@ class OrderData(BaseModel):
     order_status: str = "pending"
     order_date: Optional[datetime] = None
     special_requests: Optional[str] = None
+    version: Optional[int] = None  # Bumped on every write; pass back as expected_version
 
 class FeedbackData(BaseModel):
     feedback_id: Optional[str] = None
@@ -182,6 +218,16 @@ class UpdateOrderStatusRequest(BaseModel):
     new_status: str
     admin_notes: Optional[str] = None
 
+class BulkOrderStatusItem(BaseModel):
+    room_id: str
+    order_id: str
+    status: Literal["confirmed", "rejected"]  # admin accept/reject; anything else is a 422
+    customer_email: Optional[str] = None
+
+class BulkOrderStatusRequest(BaseModel):
+    updates: List[BulkOrderStatusItem] = Field(..., min_length=1, max_length=1000)
+    send_emails: bool = False
+
 
 class SentimentData(BaseModel):
     overall_sentiment: str
@@ -237,202 +283,116 @@ def generate_verification_token() -> str:
     """Generate a secure verification token"""
     return secrets.token_urlsafe(32)
 
-def send_admin_verification_email(admin_name: str, admin_email: str, verification_token: str):
-    """Send verification email to admin and notification to system administrator"""
-    try:
-        # Check SMTP configuration
-        if not SMTP_USERNAME or not SMTP_PASSWORD:
-            logging.warning("SMTP credentials not configured. Cannot send verification email.")
-            return
-            
-        # Email configuration
-        smtp_server = SMTP_SERVER
-        smtp_port = SMTP_PORT
-        sender_email = SMTP_USERNAME
-        sender_password = SMTP_PASSWORD
-        
-        # Create verification URL (you'll need to implement the verification endpoint)
-        verification_url = f"http://localhost:8000/api/auth/admin/verify-email?token={verification_token}"
-        
-        # Email to the admin
-        admin_msg = MIMEMultipart()
-        admin_msg['From'] = sender_email
-        admin_msg['To'] = admin_email
-        admin_msg['Subject'] = "Admin Account Verification Required"
-        
-        admin_body = f"""
-        Dear {admin_name},
-        
-        Your admin account has been created and is pending verification.
-        
-        Please wait for approval from the system administrator.
-        You will receive another email once your account is approved.
-        
-        Account Details:
-        - Name: {admin_name}
-        - Email: {admin_email}
-        
-        Best regards,
-        AI Sales Assistant Team
-        """
-        
-        admin_msg.attach(MIMEText(admin_body, 'plain'))
-        
-        # Email to system administrator for approval
-        approval_msg = MIMEMultipart()
-        approval_msg['From'] = sender_email
-        approval_msg['To'] = ADMIN_EMAIL
-        approval_msg['Subject'] = f"New Admin Registration Approval Required - {admin_name}"
-        
-        approval_body = f"""
-        A new admin account has been registered and requires your approval.
-        
-        Admin Details:
-        - Name: {admin_name}
-        - Email: {admin_email}
-        - Registration Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        To approve this admin account, click the link below:
-        {verification_url}
-        
-        If you did not expect this registration, please ignore this email.
-        
-        Best regards,
-        AI Sales Assistant System
-        """
-        
-        approval_msg.attach(MIMEText(approval_body, 'plain'))
-        
-        # Send emails
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            
-            # Send to admin
-            server.send_message(admin_msg)
-            logging.info(f"Verification email sent to admin: {admin_email}")
-            
-            # Send to approver
-            server.send_message(approval_msg)
-            logging.info(f"Approval notification sent to: {ADMIN_EMAIL}")
-            
-    except Exception as e:
-        logging.error(f"Failed to send verification email: {e}")
-        # For development, just log the verification URL
-        logging.info(f"Verification URL (for development): {verification_url}")
-        raise HTTPException(status_code=500, detail="Failed to send verification email")
+def build_template_email(idempotency_key: str, kind: str, recipient: str, template: str, context: Dict[str, Any]) -> dict:
+    """Render an email template into an outbox message"""
+    rendered = email_templates.render(template, context)
+    return {
+        "idempotency_key": idempotency_key,
+        "kind": kind,
+        "recipient": recipient,
+        "subject": rendered.subject,
+        "body": rendered.text,
+        "html_body": rendered.html
+    }
 
-def send_admin_approval_email(admin_name: str, admin_email: str, employee_id: Optional[str] = None):
-    """Send approval confirmation email to admin"""
-    try:
-        # Email configuration
-        smtp_server = SMTP_SERVER
-        smtp_port = SMTP_PORT
-        sender_email = SMTP_USERNAME
-        sender_password = SMTP_PASSWORD
-        
-        # Email to the admin confirming approval
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = admin_email
-        msg['Subject'] = "Admin Account Approved - Welcome!"
-        
-        body = f"""
-        Dear {admin_name},
-        
-        Great news! Your admin account has been approved and activated by the system administrator.
-        
-        You can now log in to the AI Sales Assistant admin panel using your credentials.
-        
-        Account Details:
-        - Name: {admin_name}
-        - Email: {admin_email}
-        - Employee ID: {employee_id or 'Not assigned'}
-        - Status: Active
-        
-        Login Instructions:
-        - Use your Employee ID: {employee_id}
-        - Use the password you created during registration
-        
-        Welcome to the team!
-        
-        Best regards,
-        AI Sales Assistant Team
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-            logging.info(f"Approval confirmation email sent to: {admin_email}")
-            
-    except Exception as e:
-        logging.error(f"Failed to send approval confirmation email: {e}")
-        # Don't raise exception as this is not critical
+def build_admin_verification_emails(admin_id: str, admin_name: str, admin_email: str, verification_token: str) -> List[dict]:
+    """Build the pending-verification email to the admin and the approval request to the system administrator"""
+    context = {
+        "admin_name": admin_name,
+        "admin_email": admin_email,
+        "registered_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "verification_url": f"http://localhost:8000/api/auth/admin/verify-email?token={verification_token}"
+    }
+    
+    messages = [build_template_email(
+        f"admin-verification:{admin_id}", "admin_verification", admin_email, "admin_verification", context
+    )]
+    if ADMIN_EMAIL:
+        messages.append(build_template_email(
+            f"admin-approval-request:{admin_id}", "admin_approval_request", ADMIN_EMAIL, "admin_approval_request", context
+        ))
+    else:
+        logging.warning("ADMIN_EMAIL not configured. Approval request will not be queued.")
+    return messages
+
+def build_admin_approval_email(admin_name: str, admin_email: str, employee_id: Optional[str] = None) -> dict:
+    """Build the approval confirmation email to the admin"""
+    context = {"admin_name": admin_name, "admin_email": admin_email, "employee_id": employee_id}
+    return build_template_email(
+        f"admin-approved:{admin_email}", "admin_approved", admin_email, "admin_approved", context
+    )
 
 def generate_employee_id() -> str:
     """Generate unique employee ID"""
     return f"EMP{datetime.now().strftime('%Y%m%d')}{secrets.token_hex(3).upper()}"
 
-def send_order_notification_email(order_data: OrderData, room_id: str):
-    """Send order notification email to admin"""
+def build_order_notification_email(order_data: OrderData, room_id: str) -> Optional[dict]:
+    """Build the new-order notification email to the admin"""
+    if not ADMIN_EMAIL:
+        logging.warning("ADMIN_EMAIL not configured. Skipping order notification.")
+        return None
+    
+    context = order_data.dict()
+    context["order_date"] = order_data.order_date or datetime.utcnow()
+    context["room_id"] = room_id
+    return build_template_email(
+        f"order-notification:{order_data.order_id}", "order_notification", ADMIN_EMAIL, "order_notification", context
+    )
+
+def build_order_status_emails(orders: List[Dict], status: str) -> List[dict]:
+    """Build order confirmation/rejection emails for a batch of orders sharing a status
+
+    Each order dict carries order_id, customer_email, customer_name, book_title and
+    the remaining order details (author, quantity, total_amount, ...).
+    """
+    template = "order_confirmed" if status == "confirmed" else "order_rejected"
+    rendered = email_templates.render_batch(template, orders)
+    return [
+        {
+            "idempotency_key": f"order-{status}:{order['order_id']}",
+            "kind": f"order_{status}",
+            "recipient": order["customer_email"],
+            "subject": email.subject,
+            "body": email.text,
+            "html_body": email.html
+        }
+        for order, email in zip(orders, rendered)
+    ]
+
+def deliver_outbox_emails(messages: List[dict]) -> Dict[str, Optional[str]]:
+    """Send a batch of outbox emails over a single SMTP connection"""
+    results: Dict[str, Optional[str]] = {}
     try:
-        if not SMTP_USERNAME or not SMTP_PASSWORD:
-            logging.warning("Email credentials not configured. Skipping email notification.")
-            return False
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+            server.starttls()
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
             
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = ADMIN_EMAIL
-        msg['Subject'] = f"New Book Order - {order_data.book_title or 'Unknown Book'}"
-        
-        # Email body
-        body = f"""
-        New Book Order Received!
-        
-        Order Details:
-        - Order ID: {order_data.order_id or 'N/A'}
-        - Customer ID: {order_data.customer_id or 'N/A'}
-        - Customer Name: {order_data.customer_name or 'N/A'}
-        - Book Title: {order_data.book_title or 'N/A'}
-        - Author: {order_data.author or 'N/A'}
-        - Genre: {order_data.genre or 'N/A'}
-        - Quantity: {order_data.quantity or 'N/A'}
-        - Unit Price: ${order_data.unit_price or 'N/A'}
-        - Total Amount: ${order_data.total_amount or 'N/A'}
-        - Payment Method: {order_data.payment_method or 'N/A'}
-        - Delivery Option: {order_data.delivery_option or 'N/A'}
-        - Delivery Address: {order_data.delivery_address or 'N/A'}
-        - Special Requests: {order_data.special_requests or 'None'}
-        - Order Date: {order_data.order_date or datetime.utcnow()}
-        - Room ID: {room_id}
-        
-        Please process this order promptly.
-        
-        Best regards,
-        BookWise AI Assistant
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(SMTP_USERNAME, ADMIN_EMAIL, text)
-        server.quit()
-        
-        logging.info(f"Order notification email sent for order {order_data.order_id}")
-        return True
-        
+            for message in messages:
+                key = message["idempotency_key"]
+                try:
+                    msg = MIMEMultipart('alternative')
+                    msg['From'] = SMTP_USERNAME
+                    msg['To'] = message["recipient"]
+                    msg['Subject'] = message["subject"]
+                    msg['X-Idempotency-Key'] = key
+                    msg.attach(MIMEText(message["body"], 'plain', 'utf-8'))
+                    if message.get("html_body"):
+                        msg.attach(MIMEText(message["html_body"], 'html', 'utf-8'))
+                    server.sendmail(SMTP_USERNAME, message["recipient"], msg.as_string())
+                    results[key] = None
+                    logging.info(f"Sent {message.get('kind', 'email')} notification to {message['recipient']}")
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except Exception as e:
+                    logging.error(f"Failed to send notification {key}: {e}")
+                    results[key] = str(e)
     except Exception as e:
-        logging.error(f"Failed to send order notification email: {e}")
-        return False
+        logging.error(f"SMTP batch delivery failed: {e}")
+        for message in messages:
+            results.setdefault(message["idempotency_key"], str(e))
+    return results
+
+outbox_worker = OutboxWorker(db_service, deliver_outbox_emails)
 
 
 def extract_order_data(transcripts: List[TranscriptItem]) -> OrderData:
@@ -596,12 +556,30 @@ def extract_order_data(transcripts: List[TranscriptItem]) -> OrderData:
     book_title = None
     if title_match:
         book_title = (title_match.group(1) or title_match.group(2) or "").strip()
+    author = author_match.group(1).strip() if author_match else None
+    genre = genre_match.group(1).lower() if genre_match else None
+    
+    # Canonicalize title/author against the catalog (transcripts are often misspelled)
+    unit_price = DEFAULT_UNIT_PRICE
+    if recommendation_engine is not None:
+        book = None
+        if book_title:
+            book = recommendation_engine.resolve_book(f"{book_title} {author or ''}") or recommendation_engine.resolve_book(book_title)
+        if book is None and not book_title:
+            mentioned = recommendation_engine.find_books_in_text(full_text)
+            book = mentioned[0] if mentioned else None
+        if book is not None:
+            book_title = book.title
+            author = book.author
+            genre = genre or book.genre.value
+            unit_price = book.price
+        elif author:
+            author = recommendation_engine.resolve_author(author) or author
     
     # Don't generate order ID during extraction - only when user confirms
     order_id = None
     
-    # Calculate total amount (placeholder logic - you can update with actual pricing)
-    unit_price = 15.99  # Default book price
+    # Calculate total amount from the catalog price (or the default)
     total_amount = None
     if quantity_val and unit_price:
         total_amount = quantity_val * unit_price
@@ -611,8 +589,8 @@ def extract_order_data(transcripts: List[TranscriptItem]) -> OrderData:
         customer_id=(customer_id_match.group(1).strip() if customer_id_match else None),
         customer_name=(name_match.group(1).strip() if name_match else None),
         book_title=book_title,
-        author=(author_match.group(1).strip() if author_match else None),
-        genre=(genre_match.group(1).lower() if genre_match else None),
+        author=author,
+        genre=genre,
         quantity=quantity_val,
         unit_price=unit_price,
         total_amount=total_amount,
@@ -676,12 +654,39 @@ async def get_livekit_token(req: TokenRequest):
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection on startup"""
+    """Initialize database connection and notification outbox worker on startup"""
     await db_service.connect()
+    try:
+        # One-time backfill of summaries stored before the analytics rollups existed
+        await ensure_rollups(db_service)
+    except Exception as e:
+        logging.error(f"Failed to backfill call summary rollups: {e}")
+    if recommendation_engine is not None:
+        try:
+            await recommendation_engine.connect_catalog()
+        except Exception as e:
+            logging.error(f"Failed to load the book catalog: {e}")
+    email_templates.preload()
+    if SMTP_USERNAME and SMTP_PASSWORD:
+        outbox_worker.start()
+    else:
+        logging.warning("SMTP not configured. Notifications will stay queued in the outbox.")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close database connection on shutdown"""
+    """Stop background workers and close database connection on shutdown"""
+    await outbox_worker.stop()
+    if report_jobs is not None:
+        await report_jobs.shutdown()
+    if resummarize_task is not None and not resummarize_task.done():
+        # The checkpoint lets the next run resume from the last completed chunk
+        resummarize_task.cancel()
+    if co_purchase_task is not None and not co_purchase_task.done():
+        co_purchase_task.cancel()
+    if recommendation_engine is not None:
+        await recommendation_engine.close_catalog()
+    if LLM_GATEWAY_AVAILABLE:
+        await get_llm_gateway().close()
     await db_service.disconnect()
 
 @app.post("/process-transcription", response_model=RoomData)
@@ -764,8 +769,9 @@ async def process_transcription(req: ProcessTranscriptionRequest):
             ) for t in transcripts
         ]
         
-        # Extract order data from all transcripts (for display only)
-        order_data = extract_order_data(transcript_items)
+        # Extract order data from all transcripts (for display only); catalog
+        # lookups may hit the store, so keep them off the event loop
+        order_data = await asyncio.to_thread(extract_order_data, transcript_items)
         
         # Don't automatically store orders - only store when user confirms via /orders/submit
         # This prevents creating orders just from conversation without confirmation
@@ -841,7 +847,7 @@ async def get_room(room_id: str):
 
 
 @app.get("/health")
-def health():
+async def health():
     return {
         "status": "ok",
         "services": {
@@ -849,6 +855,12 @@ def health():
             "livekit": "available" if LIVEKIT_AVAILABLE else "unavailable",
             "email": "configured" if SMTP_USERNAME and SMTP_PASSWORD else "not_configured"
         },
+        "notification_outbox": await db_service.get_outbox_stats(),
+        "call_report_jobs": report_jobs.stats() if report_jobs is not None else None,
+        "catalog_cache": recommendation_engine.book_cache.stats() if recommendation_engine is not None else None,
+        "recommendation_cache": recommendation_engine.recommendation_cache.stats() if recommendation_engine is not None else None,
+        "llm_gateway": get_llm_gateway().stats() if LLM_GATEWAY_AVAILABLE else None,
+        "sentiment_batching": sentiment_engine.openai_batcher.stats() if sentiment_engine is not None and sentiment_engine.openai_batcher is not None else None,
         "version": "1.0.0",
         "timestamp": datetime.utcnow().isoformat()
     }
@@ -969,23 +981,18 @@ async def register_admin(admin_data: AdminRegistration):
             "last_login": None
         }
         
-        # Store in database
-        admin_id = await db_service.create_admin(admin_record)
+        # Store in database together with the verification emails (delivered by the outbox worker)
+        verification_emails = build_admin_verification_emails(
+            admin_record["admin_id"], admin_data.name, admin_data.email, verification_token
+        )
+        admin_id = await db_service.create_admin(admin_record, outbox_messages=verification_emails)
         
-        # Send verification email (non-blocking)
-        try:
-            # Check if SMTP is configured before attempting to send
-            if SMTP_USERNAME and SMTP_PASSWORD:
-                send_admin_verification_email(admin_data.name, admin_data.email, verification_token)
-            else:
-                logging.warning("SMTP not configured. Verification email not sent.")
-                logging.info(f"Verification URL for development: http://localhost:8000/api/auth/admin/verify-email?token={verification_token}")
-        except Exception as e:
-            logging.warning(f"Failed to send verification email, but admin account created: {e}")
+        if not (SMTP_USERNAME and SMTP_PASSWORD):
+            logging.warning("SMTP not configured. Verification email queued but not sent.")
             logging.info(f"Verification URL for development: http://localhost:8000/api/auth/admin/verify-email?token={verification_token}")
         
         # Determine message based on email configuration
-        email_status = "Verification email sent to administrator." if (SMTP_USERNAME and SMTP_PASSWORD) else "Email configuration not set up - manual verification required."
+        email_status = "Verification email queued for administrator." if (SMTP_USERNAME and SMTP_PASSWORD) else "Email configuration not set up - manual verification required."
         
         return {
             "message": f"Admin account created successfully. {email_status} Employee ID will be assigned after approval.",
@@ -1024,17 +1031,15 @@ async def verify_admin_email(token: str):
         # Generate employee ID
         employee_id = generate_employee_id()
         
-        # Update admin verification status and assign employee_id
-        updated_admin = await db_service.update_admin_verification(token, email_verified=True, status="active", employee_id=employee_id)
+        # Update admin verification status, assign employee_id and queue the confirmation email
+        approval_email = build_admin_approval_email(admin["name"], admin["email"], employee_id)
+        updated_admin = await db_service.update_admin_verification(
+            token, email_verified=True, status="active", employee_id=employee_id,
+            outbox_messages=[approval_email]
+        )
         if not updated_admin:
             raise HTTPException(status_code=500, detail="Failed to update admin verification status")
         
-        # Send confirmation email to the admin
-        try:
-            send_admin_approval_email(updated_admin["name"], updated_admin["email"], updated_admin["employee_id"])
-        except Exception as e:
-            logging.warning(f"Failed to send approval confirmation email: {e}")
-        
         return {
             "message": "Admin account verified and activated successfully",
             "admin_name": updated_admin["name"],
@@ -1286,141 +1291,109 @@ async def get_all_transcripts():
         logging.error(f"Error getting all transcripts: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+ORDER_FIELDS = list(OrderData.model_fields)
+
+def order_listing_filters(status: Optional[str], date_from: Optional[datetime], date_to: Optional[datetime],
+                          payment_method: Optional[str], customer: Optional[str] = None) -> Dict[str, Any]:
+    """Collect order listing query parameters into db_service filters"""
+    return {
+        "status": status,
+        "customer": customer,
+        "payment_method": payment_method,
+        "date_from": date_from,
+        "date_to": date_to
+    }
+
+def parse_order_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated field list, rejecting unknown order fields"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in ORDER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown order fields: {', '.join(unknown)}")
+    return requested
+
+async def list_orders_response(filters: Dict[str, Any], limit: Optional[int], cursor: Optional[str], fields: Optional[str]) -> Dict[str, Any]:
+    """Fetch one page of orders and shape it as {total_orders, orders: {room_id: order}, next_cursor}"""
+    selected = parse_order_fields(fields)
+    try:
+        orders, next_cursor = await db_service.list_orders(filters, limit=limit, cursor=cursor, fields=selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    output_fields = selected or ORDER_FIELDS
+    page = {}
+    for order in orders:
+        item = {f: order.get(f) for f in output_fields}
+        if "order_status" in item and item["order_status"] is None:
+            item["order_status"] = "pending"
+        page[order["room_id"]] = item
+    
+    return {
+        "total_orders": len(page),
+        "orders": page,
+        "next_cursor": next_cursor
+    }
+
 @app.get("/orders/all")
-async def get_all_orders():
-    """Get all stored orders across all rooms"""
+async def get_all_orders(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    payment_method: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get stored orders across all rooms, newest first
+
+    Without `limit` every matching order is returned (legacy behaviour). With
+    `limit`, pass the returned `next_cursor` back as `cursor` for the next page.
+    Draft orders are excluded unless `status=draft`.
+    """
     try:
-        all_orders = {}
-        
-        if db_service.use_memory:
-            # Get from memory storage - exclude draft orders
-            for room_id, order_data in db_service._memory_orders.items():
-                # Skip draft orders - only show confirmed/pending orders
-                if order_data.get("order_status") == "draft":
-                    continue
-                all_orders[room_id] = OrderData(
-                    order_id=order_data.get("order_id"),
-                    customer_id=order_data.get("customer_id"),
-                    customer_name=order_data.get("customer_name"),
-                    book_title=order_data.get("book_title"),
-                    author=order_data.get("author"),
-                    genre=order_data.get("genre"),
-                    quantity=order_data.get("quantity"),
-                    unit_price=order_data.get("unit_price"),
-                    total_amount=order_data.get("total_amount"),
-                    payment_method=order_data.get("payment_method"),
-                    delivery_option=order_data.get("delivery_option"),
-                    delivery_address=order_data.get("delivery_address"),
-                    order_status=order_data.get("order_status", "pending"),
-                    order_date=order_data.get("order_date"),
-                    special_requests=order_data.get("special_requests"),
-                )
-        else:
-            # Get from MongoDB - exclude draft orders
-            if db_service.orders_collection is None:
-                return {"total_orders": 0, "orders": {}}
-            cursor = db_service.orders_collection.find({"order_status": {"$ne": "draft"}})
-            orders = await cursor.to_list(length=None)
-            
-            for order in orders:
-                all_orders[order["room_id"]] = OrderData(
-                    order_id=order.get("order_id"),
-                    customer_id=order.get("customer_id"),
-                    customer_name=order.get("customer_name"),
-                    book_title=order.get("book_title"),
-                    author=order.get("author"),
-                    genre=order.get("genre"),
-                    quantity=order.get("quantity"),
-                    unit_price=order.get("unit_price"),
-                    total_amount=order.get("total_amount"),
-                    payment_method=order.get("payment_method"),
-                    delivery_option=order.get("delivery_option"),
-                    delivery_address=order.get("delivery_address"),
-                    order_status=order.get("order_status", "pending"),
-                    order_date=order.get("order_date"),
-                    special_requests=order.get("special_requests"),
-                )
-        
-        return {
-            "total_orders": len(all_orders),
-            "orders": all_orders
-        }
-        
+        filters = order_listing_filters(status, date_from, date_to, payment_method)
+        return await list_orders_response(filters, limit, cursor, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting all orders: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/orders/count")
+async def count_orders(
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    payment_method: Optional[str] = None,
+    customer: Optional[str] = None
+):
+    """Count orders matching the listing filters"""
+    try:
+        filters = order_listing_filters(status, date_from, date_to, payment_method, customer)
+        return {"total_orders": await db_service.count_orders(filters)}
+    except Exception as e:
+        logging.error(f"Error counting orders: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.get("/orders/user/{user_id}")
-async def get_user_orders(user_id: str):
-    """Get orders for a specific user (by customer_id or customer email)"""
+async def get_user_orders(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    payment_method: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get orders for a specific user (by customer_id or customer name), newest first"""
     try:
-        user_orders = {}
-        
-        if db_service.use_memory:
-            # Get from memory storage - filter by customer_id and exclude draft orders
-            for room_id, order_data in db_service._memory_orders.items():
-                # Skip draft orders - only show confirmed/pending orders that user submitted
-                if order_data.get("order_status") == "draft":
-                    continue
-                if order_data.get("customer_id") == user_id or order_data.get("customer_name") == user_id:
-                    user_orders[room_id] = OrderData(
-                        order_id=order_data.get("order_id"),
-                        customer_id=order_data.get("customer_id"),
-                        customer_name=order_data.get("customer_name"),
-                        book_title=order_data.get("book_title"),
-                        author=order_data.get("author"),
-                        genre=order_data.get("genre"),
-                        quantity=order_data.get("quantity"),
-                        unit_price=order_data.get("unit_price"),
-                        total_amount=order_data.get("total_amount"),
-                        payment_method=order_data.get("payment_method"),
-                        delivery_option=order_data.get("delivery_option"),
-                        delivery_address=order_data.get("delivery_address"),
-                        order_status=order_data.get("order_status", "pending"),
-                        order_date=order_data.get("order_date"),
-                        special_requests=order_data.get("special_requests"),
-                    )
-        else:
-            # Get from MongoDB - filter by customer_id or customer_name, exclude draft orders
-            if db_service.orders_collection is None:
-                return {"total_orders": 0, "orders": {}}
-            cursor = db_service.orders_collection.find({
-                "$and": [
-                    {
-                        "$or": [
-                            {"customer_id": user_id},
-                            {"customer_name": user_id}
-                        ]
-                    },
-                    {"order_status": {"$ne": "draft"}}  # Exclude draft orders
-                ]
-            })
-            orders = await cursor.to_list(length=None)
-            
-            for order in orders:
-                user_orders[order["room_id"]] = OrderData(
-                    order_id=order.get("order_id"),
-                    customer_id=order.get("customer_id"),
-                    customer_name=order.get("customer_name"),
-                    book_title=order.get("book_title"),
-                    author=order.get("author"),
-                    genre=order.get("genre"),
-                    quantity=order.get("quantity"),
-                    unit_price=order.get("unit_price"),
-                    total_amount=order.get("total_amount"),
-                    payment_method=order.get("payment_method"),
-                    delivery_option=order.get("delivery_option"),
-                    delivery_address=order.get("delivery_address"),
-                    order_status=order.get("order_status", "pending"),
-                    order_date=order.get("order_date"),
-                    special_requests=order.get("special_requests"),
-                )
-        
-        return {
-            "total_orders": len(user_orders),
-            "orders": user_orders
-        }
-        
+        filters = order_listing_filters(status, date_from, date_to, payment_method, customer=user_id)
+        return await list_orders_response(filters, limit, cursor, fields)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting user orders: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -1509,16 +1482,14 @@ async def submit_order(req: SubmitOrderRequest):
         
         # Calculate total if not present
         if not order_data.get('total_amount') and order_data.get('quantity'):
-            unit_price = order_data.get('unit_price', 15.99)
+            unit_price = order_data.get('unit_price', DEFAULT_UNIT_PRICE)
             order_data['total_amount'] = float(order_data['quantity']) * unit_price
             order_data['unit_price'] = unit_price
         
-        # Store confirmed order in database
-        await db_service.store_order(req.room_id, order_data)
-        
-        # Send email notification
+        # Store confirmed order in database together with the admin notification
         order_obj = OrderData(**order_data)
-        send_order_notification_email(order_obj, req.room_id)
+        notification = build_order_notification_email(order_obj, req.room_id)
+        await db_service.store_order(req.room_id, order_data, outbox_messages=[notification] if notification else None)
         
         logging.info(f"Order submitted successfully: {order_data['order_id']}")
         
@@ -1540,29 +1511,33 @@ async def update_order_status(request: dict):
         room_id = request.get("room_id")
         order_id = request.get("order_id")
         status = request.get("status")  # 'confirmed' or 'rejected'
+        expected_version = request.get("expected_version")  # optional optimistic concurrency check
         
         if not room_id or not order_id or not status:
             raise HTTPException(status_code=400, detail="Missing required fields")
         
-        # Get existing order
-        order = await db_service.get_order(room_id)
+        # Targeted $set - no read-modify-write of the whole order
+        order = await db_service.update_order_fields(
+            room_id,
+            set_fields={"order_status": status, "updated_at": datetime.utcnow()},
+            order_id=order_id,
+            expected_version=expected_version
+        )
         if not order:
+            # A conflict only if this very order exists; otherwise there is nothing to update
+            existing = await db_service.get_order(room_id) if expected_version is not None else None
+            if existing and existing.get("order_id") == order_id:
+                raise HTTPException(status_code=409, detail="Order was modified by another request")
             raise HTTPException(status_code=404, detail="Order not found")
         
-        # Update order status
-        order['order_status'] = status
-        order['updated_at'] = datetime.utcnow()
-        
-        # Store updated order
-        await db_service.store_order(room_id, order)
-        
         logging.info(f"Order {order_id} status updated to {status}")
         
         return {
             "success": True,
             "message": f"Order {status} successfully",
             "order_id": order_id,
-            "status": status
+            "status": status,
+            "version": order.get("version")
         }
         
     except HTTPException:
@@ -1571,6 +1546,56 @@ async def update_order_status(request: dict):
         logging.error(f"Error updating order status: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to update order status: {str(e)}")
 
+@app.post("/api/admin/orders/bulk-update-status")
+async def bulk_update_order_status(req: BulkOrderStatusRequest):
+    """Update the status of many orders in one request (accept/reject a backlog)"""
+    try:
+        # Last entry wins if a room is listed twice
+        updates = {item.room_id: item for item in req.updates}
+        email_fields = ["customer_name", "book_title", "author", "quantity", "total_amount",
+                        "payment_method", "delivery_option", "delivery_address"] if req.send_emails else []
+        
+        updated = await db_service.bulk_update_order_status(
+            [{"room_id": i.room_id, "order_id": i.order_id, "status": i.status} for i in updates.values()],
+            projection=email_fields
+        )
+        
+        results = []
+        emails_by_status: Dict[str, List[Dict]] = {}
+        for item in updates.values():
+            order = updated.get(item.room_id)
+            results.append({
+                "room_id": item.room_id,
+                "order_id": item.order_id,
+                "status": item.status,
+                "success": order is not None,
+                "error": None if order else "Order not found"
+            })
+            if order and req.send_emails and item.customer_email and item.status in ("confirmed", "rejected"):
+                emails_by_status.setdefault(item.status, []).append({**order, "customer_email": item.customer_email})
+        
+        # Render and queue all customer emails in one outbox write
+        messages = []
+        for status, orders in emails_by_status.items():
+            messages.extend(build_order_status_emails(orders, status))
+        if messages:
+            await db_service.enqueue_notifications(messages)
+        
+        succeeded = sum(1 for r in results if r["success"])
+        logging.info(f"Bulk order status update: {succeeded}/{len(results)} updated, {len(messages)} emails queued")
+        
+        return {
+            "success": succeeded == len(results),
+            "updated": succeeded,
+            "failed": len(results) - succeeded,
+            "emails_queued": len(messages),
+            "results": results
+        }
+        
+    except Exception as e:
+        logging.error(f"Error bulk updating order status: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to bulk update order status: {str(e)}")
+
 @app.post("/api/admin/orders/send-confirmation")
 async def send_order_confirmation_email(request: dict):
     """Send order confirmation/rejection email to customer"""
@@ -1589,91 +1614,33 @@ async def send_order_confirmation_email(request: dict):
         if not isinstance(customer_email, str) or not customer_email.strip():
             raise HTTPException(status_code=400, detail="Invalid customer email")
         
-        # Check SMTP configuration
-        if not SMTP_USERNAME or not SMTP_PASSWORD:
-            logging.warning("SMTP not configured, skipping email")
-            return {"success": True, "message": "Email skipped (SMTP not configured)"}
-        
-        # Prepare email
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = customer_email
-        
-        if status == 'confirmed':
-            msg['Subject'] = f"Order Confirmed - {book_title or 'Your Book Order'}"
-            body = f"""
-Dear {customer_name or 'Customer'},
-
-Great news! Your book order has been confirmed! 🎉
-
-Order Details:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📚 Book Title: {book_title or 'N/A'}
-✍️  Author: {order_details.get('author', 'N/A')}
-📦 Quantity: {order_details.get('quantity', 1)}
-💰 Total Amount: ${order_details.get('total_amount', 0):.2f}
-💳 Payment Method: {order_details.get('payment_method', 'N/A')}
-🚚 Delivery Option: {order_details.get('delivery_option', 'N/A')}
-📍 Delivery Address: {order_details.get('delivery_address', 'N/A')}
-🆔 Order ID: {order_id}
-
-Your order will be processed and shipped soon. You will receive a tracking number once your order is dispatched.
-
-Thank you for choosing BookWise! 📖
-
-Best regards,
-BookWise Team
-            """
-        else:  # rejected
-            msg['Subject'] = f"Order Update - {book_title or 'Your Book Order'}"
-            body = f"""
-Dear {customer_name or 'Customer'},
-
-We regret to inform you that we are unable to process your order at this time.
-
-Order Details:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📚 Book Title: {book_title or 'N/A'}
-🆔 Order ID: {order_id}
-
-Possible reasons:
-• Book is currently out of stock
-• Delivery not available to your location
-• Payment verification issues
-
-Please contact our customer support for more information or to place a new order.
-
-We apologize for any inconvenience caused.
-
-Best regards,
-BookWise Team
-            """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(SMTP_USERNAME, customer_email, text)
-        server.quit()
+        # Queue the email; the outbox worker delivers it (and retries through SMTP outages)
+        messages = build_order_status_emails([{
+            **order_details,
+            "order_id": order_id,
+            "customer_email": customer_email,
+            "customer_name": customer_name,
+            "book_title": book_title
+        }], status)
+        await db_service.enqueue_notifications(messages)
         
-        logging.info(f"Order {status} email sent to {customer_email} for order {order_id}")
+        logging.info(f"Order {status} email queued for {customer_email} for order {order_id}")
         
         return {
             "success": True,
-            "message": f"Confirmation email sent successfully",
+            "message": "Confirmation email queued successfully",
             "order_id": order_id,
             "recipient": customer_email
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error sending confirmation email: {e}")
+        logging.error(f"Error queueing confirmation email: {e}")
         # Don't fail the request if email fails
         return {
             "success": False,
-            "message": f"Failed to send email: {str(e)}",
+            "message": f"Failed to queue email: {str(e)}",
             "order_id": order_id
         }
 
@@ -1895,7 +1862,9 @@ async def get_product_recommendations(customer_id: str, conversation_context: st
         return {
             "customer_id": customer_id,
             "recommendations": recommendations_data,
-            "total_recommendations": len(recommendations_data)
+            "total_recommendations": len(recommendations_data),
+            # AI suggestions missed the latency budget; a later request returns them
+            "ai_pending": recommendation_engine.ai_pending(customer_id)
         }
         
     except Exception as e:
@@ -1903,10 +1872,15 @@ async def get_product_recommendations(customer_id: str, conversation_context: st
         raise HTTPException(status_code=500, detail=f"Failed to get recommendations: {str(e)}")
 
 @app.get("/books/search")
-async def search_books(query: str, genre: str = None, max_price: float = None):
-    """Search books by title, author, or description"""
+async def search_books(
+    query: str,
+    genre: str = None,
+    max_price: float = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Search books by title, author, tags or description (ranked, prefix-aware)"""
     try:
-        from product_recommendation import BookGenre
+        from services.product_recommendation import BookGenre
         
         genre_enum = None
         if genre:
@@ -1918,7 +1892,8 @@ async def search_books(query: str, genre: str = None, max_price: float = None):
         books = await recommendation_engine.search_books(
             query=query,
             genre=genre_enum,
-            max_price=max_price
+            max_price=max_price,
+            limit=limit
         )
         
         # Convert books to dictionary format
@@ -1947,6 +1922,8 @@ async def search_books(query: str, genre: str = None, max_price: float = None):
             "total_results": len(books_data)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error searching books: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to search books: {str(e)}")
@@ -1975,7 +1952,8 @@ async def get_book_details(book_id: str):
             "availability": book.availability,
             "stock_quantity": book.stock_quantity,
             "tags": book.tags,
-            "similar_books": book.similar_books
+            "similar_books": book.similar_books,
+            "also_bought": await recommendation_engine.get_also_bought(book_id)
         }
         
     except HTTPException:
@@ -1984,6 +1962,67 @@ async def get_book_details(book_id: str):
         logging.error(f"Error getting book details: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get book details: {str(e)}")
 
+# Running co-purchase refresh; the job keeps its model between runs so later ones are incremental
+co_purchase_job = None
+co_purchase_task: Optional[asyncio.Task] = None
+
+
+@app.post("/recommendations/co-purchase/refresh")
+async def start_co_purchase_refresh(restart: bool = False):
+    """Refresh the "customers also bought" table from stored orders in the background"""
+    global co_purchase_job, co_purchase_task
+    try:
+        if not CO_PURCHASE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Co-purchase model not available")
+        if co_purchase_task is not None and not co_purchase_task.done():
+            raise HTTPException(status_code=409, detail="Co-purchase refresh is already running")
+        
+        if co_purchase_job is None:
+            co_purchase_job = CoPurchaseJob(
+                db_service,
+                recommendation_engine.catalog_store,
+                recommendation_engine.resolve_book,
+                directory=os.getenv("CO_PURCHASE_DIR") or None
+            )
+        co_purchase_task = asyncio.create_task(co_purchase_job.run(restart=restart))
+        return {
+            "success": True,
+            "message": "Co-purchase refresh started",
+            "started_at": datetime.utcnow().isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error starting co-purchase refresh: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start co-purchase refresh: {str(e)}")
+
+
+@app.get("/recommendations/co-purchase/refresh")
+async def get_co_purchase_refresh():
+    """Progress of the running or last co-purchase refresh"""
+    try:
+        if not CO_PURCHASE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Co-purchase model not available")
+        
+        running = co_purchase_task is not None and not co_purchase_task.done()
+        if running:
+            progress = dict(co_purchase_job.progress)
+        else:
+            progress = await db_service.get_job_checkpoint(CO_PURCHASE_JOB_NAME) or {"status": "idle"}
+            progress = {k: v for k, v in progress.items() if k != "_id"}
+            if co_purchase_task is not None and co_purchase_task.done() and not co_purchase_task.cancelled() and co_purchase_task.exception():
+                progress["error"] = str(co_purchase_task.exception())
+        
+        return {
+            "running": running,
+            "progress": progress
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting co-purchase refresh progress: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get co-purchase refresh progress: {str(e)}")
+
 # Question Generation Endpoints
 @app.post("/questions/generate")
 async def generate_next_question(request: Dict[str, Any]):
@@ -2086,7 +2125,8 @@ async def get_conversation_context(room_id: str):
                 "trust_level": context.trust_level,
                 "topics_discussed": context.topics_discussed,
                 "questions_asked_count": len(context.questions_asked),
-                "customer_responses_count": len(context.customer_responses),
+                "topic_counts": dict(context.topic_counts),
+                "customer_responses_count": context.responses_seen,
                 "current_topic": context.current_topic,
                 "conversation_duration": context.conversation_duration
             }
@@ -2207,6 +2247,12 @@ async def get_sentiment_analytics(room_id: str):
             "conversation_stage": "initial"
         }
 
+# Keyword families for the analytics panel metrics, compiled once
+METRICS_MATCHER = KeywordMatcher({
+    "recommendation": ["recommend*", "suggest*", "try", "consider"],
+    "objection": ["but", "however", "expensive", "not sure", "maybe"]
+})
+
 @app.get("/analytics/metrics/{room_id}")
 async def get_conversation_metrics(room_id: str):
     """Get conversation metrics for analytics panel"""
@@ -2232,13 +2278,11 @@ async def get_conversation_metrics(room_id: str):
         # Count questions and recommendations (simple keyword-based detection)
         questions_asked = sum(1 for t in assistant_messages if "?" in t.get("message", ""))
         recommendations_made = sum(1 for t in assistant_messages 
-                                 if any(word in t.get("message", "").lower() 
-                                       for word in ["recommend", "suggest", "try", "consider"]))
+                                 if "recommendation" in METRICS_MATCHER.families_in(t.get("message", "").lower()))
         
         # Count objections (simple keyword-based detection)
         objections_handled = sum(1 for t in user_messages 
-                               if any(word in t.get("message", "").lower() 
-                                     for word in ["but", "however", "expensive", "not sure", "maybe"]))
+                               if "objection" in METRICS_MATCHER.families_in(t.get("message", "").lower()))
         
         metrics_response = {
             "duration": duration,
@@ -2521,7 +2565,11 @@ async def get_realtime_sentiment(room_id: str):
 # ============================================
 
 @app.post("/api/call-summary/generate/{room_id}")
-async def generate_call_summary(room_id: str, manual_notes: Optional[str] = None):
+async def generate_call_summary(
+    room_id: str,
+    manual_notes: Optional[str] = None,
+    force: bool = Query(False, description="Regenerate even if the room has not changed since the stored summary")
+):
     """
     Generate comprehensive call summary with insights
     
@@ -2531,11 +2579,26 @@ async def generate_call_summary(room_id: str, manual_notes: Optional[str] = None
     - Tracks product/book interests
     - Analyzes conversation flow and outcomes
     - Provides actionable recommendations for improvement
+    
+    The stored summary is returned as-is when the room's transcripts, order
+    and sentiment records are unchanged since it was generated.
     """
     try:
         if not CALL_SUMMARY_AVAILABLE or summary_generator is None:
             raise HTTPException(status_code=503, detail="Call summary generator not available")
         
+        if not force:
+            content_version, stored_summary = await asyncio.gather(
+                db_service.get_room_content_version(room_id),
+                db_service.get_call_summary(room_id)
+            )
+            if content_version["transcripts"] and summary_is_current(stored_summary, content_version, manual_notes):
+                return {
+                    "message": "Call summary is up to date",
+                    "summary": {k: v for k, v in stored_summary.items() if k != "_id"},
+                    "cached": True
+                }
+        
         # Get transcripts from database
         transcripts_raw = await db_service.get_transcripts(room_id)
         if not transcripts_raw:
@@ -2576,6 +2639,13 @@ async def generate_call_summary(room_id: str, manual_notes: Optional[str] = None
         # Get sentiment data
         sentiment_data = await db_service.get_sentiment_data(room_id)
         
+        content_version = db_service.room_content_version(
+            len(transcripts_raw),
+            transcripts_raw[-1].get("timestamp"),
+            order_doc,
+            len(sentiment_data)
+        )
+        
         # Generate summary
         summary = await summary_generator.generate_summary(
             room_id=room_id,
@@ -2587,13 +2657,15 @@ async def generate_call_summary(room_id: str, manual_notes: Optional[str] = None
         
         # Store summary in database
         summary_dict = summary.to_dict()
+        summary_dict["content_version"] = content_version
         await db_service.store_call_summary(room_id, summary_dict)
         
         logging.info(f"Generated and stored call summary for room {room_id}")
         
         return {
             "message": "Call summary generated successfully",
-            "summary": summary_dict
+            "summary": summary_dict,
+            "cached": False
         }
         
     except HTTPException:
@@ -2694,7 +2766,12 @@ async def delete_call_summary(room_id: str):
 
 
 @app.post("/api/call-end-report/{room_id}")
-async def get_call_end_report(room_id: str, manual_notes: Optional[str] = None):
+async def get_call_end_report(
+    room_id: str,
+    manual_notes: Optional[str] = None,
+    background: bool = Query(False, description="Return a job handle immediately instead of waiting for the report"),
+    force: bool = Query(False, description="Regenerate the call summary even if the room has not changed")
+):
     """
     Generate complete call end report - Called when call ends
     
@@ -2704,7 +2781,9 @@ async def get_call_end_report(room_id: str, manual_notes: Optional[str] = None):
     3. Complete Transcripts
     4. Order Data (if available)
     
-    This is the main endpoint to call when a call session ends.
+    This is the main endpoint to call when a call session ends. With
+    background=true the report is generated as a job; fetch it from
+    /api/call-end-report/jobs/{job_id}.
     """
     try:
         if not CALL_END_HANDLER_AVAILABLE or not CALL_SUMMARY_AVAILABLE:
@@ -2713,20 +2792,34 @@ async def get_call_end_report(room_id: str, manual_notes: Optional[str] = None):
                 detail="Call end report generation not available"
             )
         
+        async def pipeline():
+            report = await generate_call_end_report(
+                room_id=room_id,
+                db_service=db_service,
+                summary_generator=summary_generator,
+                manual_notes=manual_notes,
+                force=force
+            )
+            return report.to_dict()
+        
+        if background:
+            job = report_jobs.submit(room_id, pipeline)
+            logging.info(f"Call end report job {job.job_id} queued for room {room_id}")
+            return {
+                "success": True,
+                "message": "Call end report generation started",
+                "job": job.to_dict()
+            }
+        
         # Generate complete report
-        report = await generate_call_end_report(
-            room_id=room_id,
-            db_service=db_service,
-            summary_generator=summary_generator,
-            manual_notes=manual_notes
-        )
+        report = await pipeline()
         
         logging.info(f"Call end report generated for room {room_id}")
         
         return {
             "success": True,
             "message": "Call end report generated successfully",
-            "report": report.to_dict()
+            "report": report
         }
         
     except HTTPException:
@@ -2739,8 +2832,118 @@ async def get_call_end_report(room_id: str, manual_notes: Optional[str] = None):
         )
 
 
+@app.get("/api/call-end-report/jobs/{job_id}")
+async def get_call_end_report_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish (long-poll)")
+):
+    """Status of a background call end report job, with the report once completed"""
+    try:
+        if not CALL_END_HANDLER_AVAILABLE:
+            raise HTTPException(
+                status_code=503,
+                detail="Call end report generation not available"
+            )
+        
+        job = await report_jobs.wait(job_id, wait)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Report job {job_id} not found")
+        
+        return {
+            "success": job.status != "failed",
+            "job": job.to_dict()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error fetching report job {job_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch report job: {str(e)}"
+        )
+
+
+@app.post("/api/call-summaries/analytics/rebuild")
+async def rebuild_call_summaries_analytics():
+    """Recompute the call summary analytics rollups from all stored summaries (backfill/repair)"""
+    try:
+        count = await rebuild_rollups(db_service)
+        return {
+            "success": True,
+            "summaries_processed": count,
+            "rebuilt_at": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        logging.error(f"Error rebuilding call summary analytics: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild analytics: {str(e)}")
+
+# Running batch re-summarization (one at a time per API process)
+resummarize_job = None
+resummarize_task: Optional[asyncio.Task] = None
+
+
+@app.post("/api/call-summaries/resummarize")
+async def start_call_summary_resummarization(
+    source: Literal["summaries", "transcripts"] = "summaries",
+    restart: bool = False,
+    chunk_size: int = Query(500, ge=1, le=5000)
+):
+    """Re-generate stored call summaries in the background (resumes an interrupted run unless restart=true)"""
+    global resummarize_job, resummarize_task
+    try:
+        if not RESUMMARIZE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Batch re-summarization not available")
+        if resummarize_task is not None and not resummarize_task.done():
+            raise HTTPException(status_code=409, detail="Re-summarization is already running")
+        
+        resummarize_job = ResummarizeJob(db_service, source=source, chunk_size=chunk_size, restart=restart)
+        resummarize_task = asyncio.create_task(resummarize_job.run())
+        return {
+            "success": True,
+            "message": "Re-summarization started",
+            "started_at": datetime.utcnow().isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error starting re-summarization: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start re-summarization: {str(e)}")
+
+
+@app.get("/api/call-summaries/resummarize")
+async def get_call_summary_resummarization():
+    """Progress of the running or last re-summarization job"""
+    try:
+        if not RESUMMARIZE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Batch re-summarization not available")
+        
+        running = resummarize_task is not None and not resummarize_task.done()
+        if running:
+            progress = dict(resummarize_job.progress)
+        else:
+            progress = await db_service.get_job_checkpoint(RESUMMARIZE_JOB_NAME) or {"status": "idle"}
+            progress = {k: v for k, v in progress.items() if k != "_id"}
+            if resummarize_task is not None and resummarize_task.done() and not resummarize_task.cancelled() and resummarize_task.exception():
+                progress["error"] = str(resummarize_task.exception())
+        
+        return {
+            "running": running,
+            "progress": progress
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting re-summarization progress: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get re-summarization progress: {str(e)}")
+
+
 @app.get("/api/call-summaries/analytics")
-async def get_call_summaries_analytics():
+async def get_call_summaries_analytics(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    outcome: Optional[str] = None
+):
     """
     Get analytics and insights from all call summaries
     
@@ -2751,81 +2954,26 @@ async def get_call_summaries_analytics():
     - Common objections
     - Top improvement areas
     - Agent performance metrics
+    
+    Optional filters slice by generation time (date_from inclusive, date_to
+    exclusive) and call outcome.
     """
     try:
-        summaries = await db_service.get_all_call_summaries(limit=1000)
-        
-        if not summaries:
-            return {
-                "total_calls": 0,
-                "message": "No call summaries available for analysis"
+        if date_from or date_to or outcome:
+            # Sliced analytics are computed inside MongoDB with one $facet aggregation
+            rollup = await db_service.aggregate_call_summary_analytics(date_from, date_to, outcome)
+        else:
+            # Served from the materialized rollups maintained by store_call_summary,
+            # so this covers the full history in constant time
+            rollup = await db_service.get_call_summary_rollup()
+        analytics = analytics_from_rollup(rollup)
+        if date_from or date_to or outcome:
+            analytics["filters"] = {
+                "date_from": date_from.isoformat() if date_from else None,
+                "date_to": date_to.isoformat() if date_to else None,
+                "outcome": outcome
             }
-        
-        # Calculate analytics
-        total_calls = len(summaries)
-        successful_calls = len([s for s in summaries if s.get("call_outcome") == "success"])
-        success_rate = (successful_calls / total_calls * 100) if total_calls > 0 else 0
-        
-        # Average satisfaction
-        satisfactions = [s.get("customer_satisfaction", 0) for s in summaries if s.get("customer_satisfaction")]
-        avg_satisfaction = sum(satisfactions) / len(satisfactions) if satisfactions else 0
-        
-        # Average objection handling score
-        objection_scores = [s.get("objection_handling_score", 0) for s in summaries if s.get("objection_handling_score") is not None]
-        avg_objection_handling = sum(objection_scores) / len(objection_scores) if objection_scores else 0
-        
-        # Count outcomes
-        outcomes = {}
-        for summary in summaries:
-            outcome = summary.get("call_outcome", "unknown")
-            outcomes[outcome] = outcomes.get(outcome, 0) + 1
-        
-        # Aggregate objections
-        all_objections = []
-        for summary in summaries:
-            objections = summary.get("objections_raised", [])
-            for obj in objections:
-                if isinstance(obj, dict):
-                    all_objections.append(obj.get("type", "unknown"))
-        
-        from collections import Counter
-        objection_counts = Counter(all_objections)
-        top_objections = [{"type": obj_type, "count": count} 
-                         for obj_type, count in objection_counts.most_common(5)]
-        
-        # Aggregate improvement areas
-        all_improvements = []
-        for summary in summaries:
-            improvements = summary.get("improvement_areas", [])
-            all_improvements.extend(improvements)
-        
-        improvement_counts = Counter(all_improvements)
-        top_improvements = [{"area": area, "count": count} 
-                          for area, count in improvement_counts.most_common(5)]
-        
-        # Agent performance distribution
-        performance_levels = {"excellent": 0, "good": 0, "needs_improvement": 0}
-        for summary in summaries:
-            quality = summary.get("agent_response_quality", "")
-            if quality in performance_levels:
-                performance_levels[quality] += 1
-        
-        # Average recommendations made
-        recommendations = [s.get("recommendations_made", 0) for s in summaries]
-        avg_recommendations = sum(recommendations) / len(recommendations) if recommendations else 0
-        
-        return {
-            "total_calls": total_calls,
-            "success_rate": round(success_rate, 2),
-            "average_satisfaction": round(avg_satisfaction, 2),
-            "average_objection_handling_score": round(avg_objection_handling, 2),
-            "average_recommendations_made": round(avg_recommendations, 2),
-            "outcomes_distribution": outcomes,
-            "top_objections": top_objections,
-            "top_improvement_areas": top_improvements,
-            "agent_performance_distribution": performance_levels,
-            "analysis_date": datetime.utcnow().isoformat()
-        }
+        return analytics
         
     except Exception as e:
         logging.error(f"Error generating call summaries analytics: {e}")
@@ -0,0 +1,334 @@
+"""
+Fuzzy Catalog Matching
+----------------------
+Resolves noisy, speech-to-text spellings of book titles and authors
+("the silent pacient", "harari sapience") to catalog book ids.
+
+Matching is word based. Every title/author word in the catalog is indexed
+three ways:
+- exactly,
+- by a phonetic key (a simplified Metaphone: "pacient" and "patient" share
+  "PXNT"),
+- by its character trigrams, which shortlist candidates for a bounded
+  Levenshtein check (at most 1-2 edits depending on word length).
+
+Adjacent query words are also tried joined ("mocking bird" -> "mockingbird").
+
+A query word resolves to the catalog words it is close to (cached per
+word), and books are scored by how much of their title (or author) and of
+the query those words cover.
+"""
+
+import heapq
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.catalog_search import STOP_WORDS
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Resolved query words kept before the cache is reset
+MAX_RESOLVED_CACHE = 50000
+
+# Catalog words in more titles/authors than this do not seed candidate books
+CANDIDATE_POSTINGS_LIMIT = 250
+
+# Trigram-shortlisted words checked with Levenshtein per query word
+MAX_EDIT_CHECKS = 50
+
+# Candidate books scored in full per query
+MAX_CANDIDATES = 64
+
+_PHONETIC_RULES = [
+    (re.compile(r"^kn|^gn|^pn|^wr"), lambda m: m.group(0)[1]),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"ght"), "t"),
+    (re.compile(r"[tcs]i(?=[aeiou])|sh|ch"), "X"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"ck|c|q"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"dg"), "j"),
+    (re.compile(r"th"), "0"),
+    (re.compile(r"v"), "f"),
+]
+
+
+@lru_cache(maxsize=100000)
+def phonetic_key(word: str) -> str:
+    """Simplified Metaphone key: consonant skeleton after common sound rewrites"""
+    for pattern, replacement in _PHONETIC_RULES:
+        word = pattern.sub(replacement, word)
+    if not word:
+        return ""
+    key = [word[0]]
+    for char in word[1:]:
+        if char in "aeiouhwy" or char == key[-1]:
+            continue
+        key.append(char)
+    return "".join(key).upper()
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(word: str) -> int:
+    """Edits tolerated for a word of this length"""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> Optional[int]:
+    """Edit distance between a and b, or None when it exceeds `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def content_words(text: str) -> List[str]:
+    """Lowercased words of `text` without stop words"""
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+
+
+@dataclass
+class FuzzyMatch:
+    """A catalog book a text span resolved to"""
+    book_id: str
+    score: float
+    field: str  # "title" or "author" - what the span mostly matched
+    title_coverage: float
+    author_coverage: float
+
+
+class CatalogFuzzyMatcher:
+    """Word-level fuzzy index over catalog titles and authors"""
+
+    def __init__(self):
+        self._fields: Dict[str, Dict[str, List[str]]] = {}  # book_id -> {"title": words, "author": words}
+        self._postings: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)  # word -> {(book_id, field)}
+        self._by_phonetic: Dict[str, Set[str]] = defaultdict(set)
+        self._by_trigram: Dict[str, Set[str]] = defaultdict(set)
+        self._resolved: Dict[str, List[Tuple[str, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def rebuild(self, books: Iterable):
+        self.__init__()
+        self.extend(books)
+
+    def extend(self, books: Iterable):
+        for book in books:
+            self.remove(book.book_id)
+            self._add(book)
+
+    def upsert(self, book):
+        self.remove(book.book_id)
+        self._add(book)
+
+    def remove(self, book_id: str):
+        fields = self._fields.pop(book_id, None)
+        if fields is None:
+            return
+        for field, words in fields.items():
+            for word in words:
+                postings = self._postings[word]
+                postings.discard((book_id, field))
+                if not postings:
+                    del self._postings[word]
+                    self._by_phonetic[phonetic_key(word)].discard(word)
+                    for gram in trigrams(word):
+                        self._by_trigram[gram].discard(word)
+        self._resolved.clear()
+
+    def _add(self, book):
+        fields = {
+            "title": list(dict.fromkeys(content_words(book.title or ""))),
+            "author": list(dict.fromkeys(content_words(book.author or ""))),
+        }
+        self._fields[book.book_id] = fields
+        for field, words in fields.items():
+            for word in words:
+                if word not in self._postings:
+                    self._by_phonetic[phonetic_key(word)].add(word)
+                    for gram in trigrams(word):
+                        self._by_trigram[gram].add(word)
+                self._postings[word].add((book.book_id, field))
+        self._resolved.clear()
+
+    def resolve_word(self, word: str) -> List[Tuple[str, float]]:
+        """Catalog words close to `word`, as (catalog word, similarity 0-1)"""
+        cached = self._resolved.get(word)
+        if cached is not None:
+            return cached
+
+        matches: Dict[str, float] = {}
+        if word in self._postings:
+            matches[word] = 1.0
+        limit = max_edits(word)
+        if limit:
+            candidates = set(self._by_phonetic.get(phonetic_key(word), ()))
+            # q-gram lemma: each edit destroys at most three trigrams
+            grams = trigrams(word)
+            shared = Counter(candidate for gram in grams for candidate in self._by_trigram.get(gram, ()))
+            needed = max(1, len(grams) - 3 * limit)
+            shortlist = [
+                (count, candidate) for candidate, count in shared.items()
+                if count >= needed and abs(len(candidate) - len(word)) <= limit
+            ]
+            candidates.update(candidate for _, candidate in heapq.nlargest(MAX_EDIT_CHECKS, shortlist))
+            for candidate in candidates:
+                if candidate in matches:
+                    continue
+                distance = bounded_levenshtein(word, candidate, limit)
+                if distance is None and phonetic_key(candidate) == phonetic_key(word):
+                    # Same sound, spelled further apart: accept at a discount
+                    distance = limit + 1
+                if distance is not None:
+                    matches[candidate] = max(0.0, 1 - distance / max(len(word), len(candidate)))
+
+        resolved = sorted(matches.items(), key=lambda item: -item[1])
+        if len(self._resolved) >= MAX_RESOLVED_CACHE:
+            self._resolved.clear()
+        self._resolved[word] = resolved
+        return resolved
+
+    def _score_books(self, words: List[str]) -> Dict[str, Dict[str, Dict[str, Tuple[float, Tuple[int, ...]]]]]:
+        """book_id -> field -> catalog word -> (best similarity, query positions it covers)
+
+        Candidate books come from the rarest matched catalog words; a word
+        shared by thousands of titles ("love", "night") only helps score
+        candidates found through rarer words. Only the MAX_CANDIDATES books
+        those words cover best are scored in full.
+        """
+        resolved: Dict[str, Tuple[float, Tuple[int, ...]]] = {}
+        spans = [((position,), word) for position, word in enumerate(words)]
+        spans += [((position, position + 1), words[position] + words[position + 1]) for position in range(len(words) - 1)]
+        for positions, word in spans:
+            for catalog_word, similarity in self.resolve_word(word):
+                best = resolved.get(catalog_word)
+                if best is None or similarity > best[0]:
+                    resolved[catalog_word] = (similarity, positions)
+        if not resolved:
+            return {}
+
+        by_rarity = sorted(resolved, key=lambda catalog_word: len(self._postings[catalog_word]))
+        seeds = [w for w in by_rarity if len(self._postings[w]) <= CANDIDATE_POSTINGS_LIMIT] or by_rarity[:1]
+        # Pre-rank by the field and query coverage the seed words alone give
+        field_coverage: Dict[Tuple[str, str], float] = defaultdict(float)
+        query_coverage: Dict[str, float] = defaultdict(float)
+        for catalog_word in seeds:
+            similarity, positions = resolved[catalog_word]
+            for book_id, field in self._postings[catalog_word]:
+                field_coverage[book_id, field] += similarity / len(self._fields[book_id][field])
+                query_coverage[book_id] += similarity * len(positions)
+        estimate: Dict[str, float] = {}
+        for (book_id, _), value in field_coverage.items():
+            value += query_coverage[book_id] / len(words)
+            if value > estimate.get(book_id, 0.0):
+                estimate[book_id] = value
+        candidates = heapq.nlargest(MAX_CANDIDATES, estimate, key=estimate.__getitem__)
+
+        hits: Dict[str, Dict[str, Dict[str, Tuple[float, Tuple[int, ...]]]]] = {}
+        for book_id in candidates:
+            fields = self._fields[book_id]
+            hits[book_id] = {
+                field: {w: resolved[w] for w in fields[field] if w in resolved}
+                for field in ("title", "author")
+            }
+        return hits
+
+    @staticmethod
+    def _query_coverage(words: List[str], fields) -> float:
+        """Share of the query words explained by a book's matched words"""
+        explained = [0.0] * len(words)
+        matched = {}
+        for field_hits in fields.values():
+            for catalog_word, (similarity, _) in field_hits.items():
+                matched[catalog_word] = max(matched.get(catalog_word, 0.0), similarity)
+        for field_hits in fields.values():
+            for similarity, positions in field_hits.values():
+                for position in positions:
+                    explained[position] = max(explained[position], similarity)
+        # Repeated query words ("rich dad poor dad") are explained by the same catalog word
+        for position, word in enumerate(words):
+            if not explained[position] and word in matched:
+                explained[position] = matched[word]
+        return sum(explained) / len(words)
+
+    def match(self, text: str, limit: int = 5, min_score: float = 0.6) -> List[FuzzyMatch]:
+        """Books a title/author span (e.g. "harari sapience") most likely refers to"""
+        words = content_words(text)
+        if not words:
+            return []
+
+        results = []
+        for book_id, fields in self._score_books(words).items():
+            title_words = self._fields[book_id]["title"]
+            author_words = self._fields[book_id]["author"]
+            title_coverage = sum(s for s, _ in fields["title"].values()) / len(title_words) if title_words else 0.0
+            author_coverage = sum(s for s, _ in fields["author"].values()) / len(author_words) if author_words else 0.0
+
+            query_coverage = self._query_coverage(words, fields)
+
+            title_score = (title_coverage + query_coverage) / 2
+            author_score = (author_coverage + query_coverage) / 2
+            score, field = (title_score, "title") if title_score >= author_score else (author_score, "author")
+            if score >= min_score:
+                results.append(FuzzyMatch(book_id, round(score, 4), field, round(title_coverage, 4), round(author_coverage, 4)))
+
+        results.sort(key=lambda match: (-match.score, match.book_id))
+        return results[:limit]
+
+    def best_match(self, text: str, min_score: float = 0.6) -> Optional[FuzzyMatch]:
+        matches = self.match(text, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+    def find_mentions(self, text: str, min_title_coverage: float = 0.75) -> List[FuzzyMatch]:
+        """Books whose titles are mentioned somewhere in free text (a whole message)
+
+        Matched title words must lie close together. A one-word title only
+        counts when its author is mentioned too, so "I'm educated" does not
+        resolve to "Educated".
+        """
+        words = content_words(text)
+        results = []
+        for book_id, fields in self._score_books(words).items():
+            title_words = self._fields[book_id]["title"]
+            title_hits = fields["title"]
+            if not title_words or not title_hits:
+                continue
+            title_coverage = sum(s for s, _ in title_hits.values()) / len(title_words)
+            if title_coverage < min_title_coverage:
+                continue
+            positions = [position for _, covered in title_hits.values() for position in covered]
+            if max(positions) - min(positions) > 2 * len(title_words):
+                continue
+            author_words = self._fields[book_id]["author"]
+            author_coverage = sum(s for s, _ in fields["author"].values()) / len(author_words) if author_words else 0.0
+            if len(title_words) == 1 and not fields["author"]:
+                continue
+            results.append(FuzzyMatch(book_id, round(title_coverage, 4), "title", round(title_coverage, 4), round(author_coverage, 4)))
+
+        results.sort(key=lambda match: (-match.score, match.book_id))
+        return results
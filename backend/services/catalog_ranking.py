@@ -0,0 +1,163 @@
+"""
+Catalog Ranking Index
+---------------------
+Maintained secondary structures for the rule-based recommendation
+strategies, so they never filter and sort the whole catalog per request:
+
+- the catalog and each genre as lists pre-sorted by (rating desc, price
+  asc), walked from the top until `limit` books pass the filters,
+- a price-sorted list for budget ranges (bisect), used instead of the
+  ranked walk when a narrow budget would make the walk long,
+- an in-stock bitmap (one byte per book slot), so stock changes flip a
+  bit instead of re-sorting anything.
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Batches up to this size are inserted in place rather than re-sorting the lists
+INSERT_IN_PLACE_LIMIT = 64
+
+RankEntry = Tuple[float, float, str]  # (-rating, price, book_id)
+
+
+def _genre_of(book) -> str:
+    return book.genre.value if hasattr(book.genre, "value") else str(book.genre)
+
+
+def _is_in_stock(book) -> bool:
+    return bool(book.availability) and (book.stock_quantity or 0) > 0
+
+
+class CatalogRankIndex:
+    """Ranked per-genre lists, price index and in-stock bitmap over catalog books"""
+
+    def __init__(self):
+        self._ranked: List[RankEntry] = []
+        self._by_genre: Dict[str, List[RankEntry]] = defaultdict(list)
+        self._prices: List[Tuple[float, str]] = []
+        self._entries: Dict[str, Tuple[str, RankEntry]] = {}  # book_id -> (genre, rank entry)
+        self._slot_of: Dict[str, int] = {}
+        self._free_slots: List[int] = []
+        self._in_stock = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self, books: Iterable):
+        self.__init__()
+        self.extend(books)
+
+    def extend(self, books: Iterable):
+        """Add or replace a batch of books"""
+        books = list({book.book_id: book for book in books}.values())
+        if len(books) <= INSERT_IN_PLACE_LIMIT:
+            for book in books:
+                self.upsert(book)
+            return
+        for book in books:
+            self.remove(book.book_id)
+        for book in books:
+            self._add(book, keep_sorted=False)
+        self._ranked.sort()
+        for ranked in self._by_genre.values():
+            ranked.sort()
+        self._prices.sort()
+
+    def upsert(self, book):
+        self.remove(book.book_id)
+        self._add(book, keep_sorted=True)
+
+    def _add(self, book, keep_sorted: bool):
+        genre = _genre_of(book)
+        entry = (-(book.rating or 0.0), book.price, book.book_id)
+        self._entries[book.book_id] = (genre, entry)
+        if keep_sorted:
+            insort(self._ranked, entry)
+            insort(self._by_genre[genre], entry)
+            insort(self._prices, (book.price, book.book_id))
+        else:
+            self._ranked.append(entry)
+            self._by_genre[genre].append(entry)
+            self._prices.append((book.price, book.book_id))
+
+        slot = self._free_slots.pop() if self._free_slots else len(self._in_stock)
+        if slot == len(self._in_stock):
+            self._in_stock.append(0)
+        self._slot_of[book.book_id] = slot
+        self._in_stock[slot] = _is_in_stock(book)
+
+    def remove(self, book_id: str):
+        item = self._entries.pop(book_id, None)
+        if item is None:
+            return
+        genre, entry = item
+        _delete_sorted(self._ranked, entry)
+        _delete_sorted(self._by_genre[genre], entry)
+        _delete_sorted(self._prices, (entry[1], book_id))
+        slot = self._slot_of.pop(book_id)
+        self._in_stock[slot] = 0
+        self._free_slots.append(slot)
+
+    def set_stock(self, book_id: str, in_stock: bool):
+        """Record a stock change (no re-sorting)"""
+        slot = self._slot_of.get(book_id)
+        if slot is not None:
+            self._in_stock[slot] = in_stock
+
+    def is_in_stock(self, book_id: str) -> bool:
+        slot = self._slot_of.get(book_id)
+        return slot is not None and bool(self._in_stock[slot])
+
+    def find(
+        self,
+        genre: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        in_stock_only: bool = True,
+        limit: Optional[int] = None
+    ) -> List[str]:
+        """Ids of books matching the filters, best rated (then cheapest) first"""
+        ranked = self._by_genre.get(genre, []) if genre is not None else self._ranked
+        in_stock, slot_of = self._in_stock, self._slot_of
+
+        if min_price is not None or max_price is not None:
+            low = bisect_left(self._prices, (min_price, "")) if min_price is not None else 0
+            high = bisect_right(self._prices, (max_price, "\uffff")) if max_price is not None else len(self._prices)
+            # The ranked walk stops after `limit` hits; expect to pass over about
+            # limit * len(ranked) / (books in budget) entries to get there
+            in_budget = high - low
+            walk_cost = limit * len(ranked) / max(in_budget, 1) if limit else len(ranked)
+            if in_budget < walk_cost:
+                # Cheaper to rank the books in the budget range directly
+                entries = []
+                for _, book_id in self._prices[low:high]:
+                    book_genre, entry = self._entries[book_id]
+                    if ((genre is None or book_genre == genre)
+                            and (min_rating is None or -entry[0] >= min_rating)
+                            and (not in_stock_only or in_stock[slot_of[book_id]])):
+                        entries.append(entry)
+                entries = heapq.nsmallest(limit, entries) if limit else sorted(entries)
+                return [entry[2] for entry in entries]
+
+        book_ids = []
+        for negative_rating, price, book_id in ranked:
+            if min_rating is not None and -negative_rating < min_rating:
+                break
+            if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                continue
+            if in_stock_only and not in_stock[slot_of[book_id]]:
+                continue
+            book_ids.append(book_id)
+            if limit and len(book_ids) >= limit:
+                break
+        return book_ids
+
+
+def _delete_sorted(items: list, item):
+    position = bisect_left(items, item)
+    if position < len(items) and items[position] == item:
+        del items[position]
@@ -0,0 +1,336 @@
+"""
+Book Catalog Search Index
+-------------------------
+In-memory inverted index over the book catalog with BM25 ranking.
+
+- Title, author, tags and description are tokenized, stop-word filtered and
+  Porter-stemmed; a term's frequency in a book is weighted by the field it
+  occurs in (a title hit counts more than a description hit).
+- A last query word that is not itself an indexed term matches as a prefix
+  (bisect over the sorted vocabulary), so partial, voice-typed titles such
+  as "great gats" work. Terms that leave the index stay in the sorted list
+  as tombstones until enough pile up to re-sort it.
+- Every query word must match; if no book matches all of them the search
+  falls back to ranking books that match any of them.
+- Genre, price and stock filters are intersections against per-genre
+  postings, a price-sorted list and the in-stock set (text matches are
+  checked against them directly, since there are usually far fewer).
+- Books are added, replaced and removed incrementally; `version` changes on
+  every update so callers can key caches on it.
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from nltk.stem import PorterStemmer
+
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "author": 2.0,
+    "tags": 1.5,
+    "description": 1.0,
+}
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the to was were will with".split()
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Prefix expansion limits: very short prefixes match too much of the vocabulary
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_EXPANSIONS = 50
+
+# key_terms keeps words found in up to this many books whatever `max_share` says,
+# so small catalogs are not filtered down to nothing
+KEY_TERM_MIN_BOOKS = 100
+
+_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=100000)
+def stem(word: str) -> str:
+    return _stemmer.stem(word)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, stop-word filtered, stemmed terms of `text`"""
+    return [stem(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def book_fields(book) -> Dict[str, str]:
+    """Searchable text of a catalog Book, per field"""
+    return {
+        "title": book.title or "",
+        "author": book.author or "",
+        "tags": " ".join(book.tags or []),
+        "description": book.description or "",
+    }
+
+
+class CatalogSearchIndex:
+    """Incrementally maintained BM25 index over catalog books"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.version = 0
+        # term -> {book_id: field-weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._terms: List[str] = []  # sorted vocabulary, for prefix lookups (may hold removed terms)
+        self._removed_terms = 0  # entries of _terms no longer in _postings
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_length: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._genre_ids: Dict[str, Set[str]] = defaultdict(set)
+        self._genre_of: Dict[str, str] = {}
+        self._prices: List[Tuple[float, str]] = []  # sorted (price, book_id)
+        self._price_of: Dict[str, float] = {}
+        self._rating_of: Dict[str, float] = {}
+        self._in_stock: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def rebuild(self, books: Iterable):
+        """Replace the whole index with `books`"""
+        version = self.version
+        self.__init__(self.k1, self.b)
+        self.version = version
+        self.extend(books)
+
+    def extend(self, books: Iterable):
+        """Index a batch of books, re-sorting the vocabulary once instead of per book"""
+        books = list({book.book_id: book for book in books}.values())
+        for book in books:
+            if book.book_id in self._doc_terms:
+                self._remove(book.book_id)
+        for book in books:
+            self._add(book, keep_sorted=False)
+        self._terms = sorted(self._postings)
+        self._removed_terms = 0
+        self._prices.sort()
+        self.version += 1
+
+    def upsert(self, book):
+        """Index a new book or re-index a changed one"""
+        if book.book_id in self._doc_terms:
+            self._remove(book.book_id)
+        self._add(book)
+        self.version += 1
+
+    def remove(self, book_id: str):
+        if book_id in self._doc_terms:
+            self._remove(book_id)
+            self.version += 1
+
+    def set_stock(self, book_id: str, in_stock: bool):
+        """Record a stock change without re-indexing the book's text"""
+        if book_id not in self._doc_terms:
+            return
+        if in_stock:
+            self._in_stock.add(book_id)
+        else:
+            self._in_stock.discard(book_id)
+        self.version += 1
+
+    def _add(self, book, keep_sorted: bool = True):
+        book_id = book.book_id
+        weighted: Dict[str, float] = defaultdict(float)
+        for field, text in book_fields(book).items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                weighted[term] += weight
+
+        for term, frequency in weighted.items():
+            postings = self._postings[term]
+            if not postings and keep_sorted:
+                position = bisect_left(self._terms, term)
+                if position < len(self._terms) and self._terms[position] == term:
+                    self._removed_terms -= 1  # a tombstone comes back to life
+                else:
+                    self._terms.insert(position, term)
+            postings[book_id] = frequency
+        self._doc_terms[book_id] = dict(weighted)
+        length = sum(weighted.values())
+        self._doc_length[book_id] = length
+        self._total_length += length
+
+        genre = book.genre.value if hasattr(book.genre, "value") else str(book.genre)
+        self._genre_ids[genre].add(book_id)
+        self._genre_of[book_id] = genre
+        if keep_sorted:
+            insort(self._prices, (book.price, book_id))
+        else:
+            self._prices.append((book.price, book_id))
+        self._price_of[book_id] = book.price
+        self._rating_of[book_id] = book.rating
+        if book.availability and book.stock_quantity > 0:
+            self._in_stock.add(book_id)
+
+    def _remove(self, book_id: str):
+        for term in self._doc_terms.pop(book_id):
+            postings = self._postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[term]
+                self._removed_terms += 1
+        if self._removed_terms > len(self._terms) // 2:
+            self._terms = sorted(self._postings)
+            self._removed_terms = 0
+        self._total_length -= self._doc_length.pop(book_id)
+
+        genre = self._genre_of.pop(book_id)
+        self._genre_ids[genre].discard(book_id)
+        price = self._price_of.pop(book_id)
+        position = bisect_left(self._prices, (price, book_id))
+        del self._prices[position]
+        self._rating_of.pop(book_id, None)
+        self._in_stock.discard(book_id)
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with `prefix`"""
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return []
+        terms, postings = self._terms, self._postings
+        start = bisect_left(terms, prefix)
+        end = bisect_left(terms, prefix + "\uffff", start)
+        live = (terms[position] for position in range(start, end) if terms[position] in postings)
+        return list(islice(live, MAX_PREFIX_EXPANSIONS))
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self._doc_terms)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def key_terms(self, text: str, limit: int, max_share: float = 1.0) -> List[str]:
+        """The `limit` most distinctive words of `text` (rarest in the catalog first), for use as a query
+
+        Words found in more than `max_share` of the books are skipped: they
+        barely change the ranking but make scoring touch most of the catalog.
+        """
+        max_books = max(max_share * len(self._doc_terms), KEY_TERM_MIN_BOOKS)
+        idf_of: Dict[str, float] = {}
+        for word in TOKEN_PATTERN.findall(text.lower()):
+            if word in STOP_WORDS or word in idf_of:
+                continue
+            postings = self._postings.get(stem(word))
+            if postings and len(postings) <= max_books:
+                idf_of[word] = self._idf(stem(word))
+        return heapq.nlargest(limit, idf_of, key=idf_of.get)
+
+    def _matching_ids(self, terms: List[str]):
+        """Books containing any of `terms`"""
+        if len(terms) == 1:
+            return self._postings[terms[0]].keys()
+        ids: Set[str] = set()
+        for term in terms:
+            ids.update(self._postings[term])
+        return ids
+
+    def _filter_ids(self, genre: Optional[str], max_price: Optional[float], in_stock_only: bool) -> Optional[Set[str]]:
+        """Books allowed by the filters (index intersections), or None when unfiltered"""
+        allowed: Optional[Set[str]] = self._in_stock if in_stock_only else None
+        if genre is not None:
+            genre_ids = self._genre_ids.get(genre, set())
+            allowed = genre_ids if allowed is None else _intersect(allowed, genre_ids)
+        if max_price is not None:
+            cheap_ids = {book_id for _, book_id in self._prices[:bisect_right(self._prices, (max_price, "\uffff"))]}
+            allowed = cheap_ids if allowed is None else _intersect(allowed, cheap_ids)
+        return allowed
+
+    def search(
+        self,
+        query: str,
+        genre: Optional[str] = None,
+        max_price: Optional[float] = None,
+        in_stock_only: bool = True,
+        limit: Optional[int] = None,
+        prefix: bool = True
+    ) -> List[Tuple[str, float]]:
+        """Ranked (book_id, score) pairs for `query`
+
+        An empty query (or one made only of stop words) returns every book
+        that passes the filters, ranked by rating.
+        """
+        words = [word for word in TOKEN_PATTERN.findall(query.lower()) if word not in STOP_WORDS]
+
+        # Index terms each query word stands for
+        word_terms: List[List[str]] = []
+        for position, word in enumerate(words):
+            terms = {stem(word)}
+            if prefix and position == len(words) - 1 and stem(word) not in self._postings:
+                terms.update(self._expand_prefix(word))
+                terms.update(self._expand_prefix(stem(word)))
+            word_terms.append([term for term in sorted(terms) if term in self._postings])
+
+        if not words:
+            allowed = self._filter_ids(genre, max_price, in_stock_only)
+            scores = dict.fromkeys(allowed if allowed is not None else self._doc_terms, 0.0)
+        else:
+            # Intersect candidates smallest-first; fall back to any-word matches
+            word_ids = sorted((self._matching_ids(terms) for terms in word_terms), key=len)
+            matched = set(word_ids[0])
+            for ids in word_ids[1:]:
+                if not matched:
+                    break
+                matched &= ids
+            if not matched:
+                matched = set().union(*word_ids)
+
+            # Filters narrow the candidates before any scoring work
+            if in_stock_only:
+                matched &= self._in_stock
+            if genre is not None:
+                matched &= self._genre_ids.get(genre, set())
+            if max_price is not None:
+                price_of = self._price_of
+                matched = {book_id for book_id in matched if price_of[book_id] <= max_price}
+
+            # BM25 length normalisation k1 * (1 - b + b * length / avgdl), for the candidates only
+            avgdl = self._total_length / len(self._doc_length) if self._doc_length else 1.0
+            base, per_length = self.k1 * (1 - self.b), self.k1 * self.b / avgdl
+            doc_length = self._doc_length
+            norms = {book_id: base + per_length * doc_length[book_id] for book_id in matched}
+            k1_plus_1 = self.k1 + 1
+            scores = dict.fromkeys(matched, 0.0)
+            for terms in word_terms:
+                best: Dict[str, float] = {}
+                for term in terms:
+                    idf_k = self._idf(term) * k1_plus_1
+                    postings = self._postings[term]
+                    if len(matched) <= len(postings):
+                        hits = ((book_id, postings[book_id]) for book_id in matched if book_id in postings)
+                    else:
+                        hits = ((book_id, frequency) for book_id, frequency in postings.items() if book_id in matched)
+                    for book_id, frequency in hits:
+                        score = idf_k * frequency / (frequency + norms[book_id])
+                        # A book matching several expansions of a prefix counts its best one
+                        if score > best.get(book_id, 0.0):
+                            best[book_id] = score
+                for book_id, score in best.items():
+                    scores[book_id] += score
+
+        rating_of, price_of = self._rating_of, self._price_of
+        rank_key = lambda item: (-round(item[1], 9), -rating_of[item[0]], price_of[item[0]], item[0])
+        items = scores.items()
+        if limit and limit < len(scores):
+            # Only books scoring at least the limit-th best score can make the cut
+            if words:
+                threshold = heapq.nlargest(limit, scores.values())[-1] - 1e-9
+                items = [item for item in items if item[1] >= threshold]
+            else:
+                threshold = heapq.nlargest(limit, (rating_of[book_id] for book_id in scores))[-1]
+                items = [item for item in items if rating_of[item[0]] >= threshold]
+            return sorted(items, key=rank_key)[:limit]
+        return sorted(items, key=rank_key)
+
+
+def _intersect(a: Set[str], b: Set[str]) -> Set[str]:
+    return a & b if len(a) <= len(b) else b & a
@@ -0,0 +1,409 @@
+"""
+Content-Based Book Similarity
+-----------------------------
+Top-k most similar books for every catalog book, from TF-IDF vectors over
+title, author, tags, description and genre.
+
+- Terms (stemmed, as in catalog search) are feature-hashed into a fixed
+  number of columns, so new books never require re-fitting a vocabulary.
+  Term frequencies are sublinear and field weighted; IDF is computed from
+  maintained document frequencies, and terms in more than `max_df` of a
+  large catalog are dropped (they carry no signal and dominate the cost).
+- Vectors are L2-normalized rows of a SciPy CSR matrix, so cosine
+  similarity is a sparse matrix product against the term -> books posting
+  lists: a book is only scored against books sharing a weighted term with
+  it, and the products stay sparse. Neighbors for all books are computed a
+  batch of rows at a time (batch size bounded by MAX_BATCH_PAIRS candidate
+  pairs) and kept in (books x k) neighbor/score arrays.
+- With a directory configured, the neighbor and score arrays are
+  memory-mapped .npy files, and the term counts and row ids are saved
+  next to them, so a restart reuses them instead of recomputing. The full
+  computation is meant to run off the request path (a background task, or
+  `python -m core.build_similarity` ahead of time).
+- Adding books computes only their rows: their own neighbors, merged into
+  the existing lists. A changed book gets a fresh row (the old one is
+  retired); `rebuild` compacts rows and refreshes every score under the
+  current IDF.
+"""
+
+import json
+import logging
+import os
+import uuid
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy import sparse
+
+from services.catalog_search import book_fields, tokenize
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "author": 2.0,
+    "tags": 1.5,
+    "description": 1.0,
+    "genre": 2.0,
+}
+
+# Candidate (row, book) pairs scored per batch, ~50 MB of sparse products
+MAX_BATCH_PAIRS = 1 << 22
+
+# max_df only applies once the catalog is large enough for frequencies to mean something
+MIN_BOOKS_FOR_MAX_DF = 1000
+
+# Neighbor rows allocated beyond the current book count when the arrays grow
+GROWTH_FACTOR = 1.5
+
+
+@lru_cache(maxsize=200000)
+def _feature(term: str, n_features: int) -> int:
+    # crc32 rather than hash(): the column must be stable across processes and restarts
+    return zlib.crc32(term.encode("utf-8")) % n_features
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the k best scores per row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _sparse_top_k(scores: sparse.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices (-1 padded) and values (-inf padded) of the k best stored entries per row, best first"""
+    rows = scores.shape[0]
+    top = np.full((rows, k), -1, dtype=np.int64)
+    top_scores = np.full((rows, k), -np.inf, dtype=np.float32)
+    if scores.nnz == 0 or k == 0:
+        return top, top_scores
+    if scores.nnz * 4 > rows * scores.shape[1]:
+        # Dense enough that partitioning a dense block beats sorting the stored entries
+        dense = scores.toarray()
+        dense[dense <= 0] = -np.inf
+        columns, values = _top_k(dense, k)
+        top[:, :columns.shape[1]], top_scores[:, :values.shape[1]] = columns, values
+        top[~np.isfinite(top_scores)] = -1
+        return top, top_scores
+    row_of = np.repeat(np.arange(rows), np.diff(scores.indptr))
+    # Rows stay in CSR order and, within a row, best first: cosine scores are in (0, 1]
+    order = np.argsort(2.0 * row_of - scores.data, kind="stable")
+    rank = np.arange(scores.nnz) - scores.indptr[row_of]
+    keep = rank < k
+    top[row_of[keep], rank[keep]] = scores.indices[order][keep]
+    top_scores[row_of[keep], rank[keep]] = scores.data[order][keep]
+    return top, top_scores
+
+
+class BookSimilarityIndex:
+    """Top-k content similarity between catalog books"""
+
+    def __init__(self, k: int = 10, n_features: int = 1 << 18, max_df: float = 0.1, directory: Optional[str] = None):
+        self.k = k
+        self.n_features = n_features
+        self.max_df = max_df
+        self.directory = directory
+        self.catalog_version: Optional[int] = None  # catalog version the saved files reflect
+        self._reset()
+
+    def _reset(self):
+        self._book_ids: List[Optional[str]] = []  # row -> book id (None once retired)
+        self._row_of: Dict[str, int] = {}
+        self._counts = sparse.csr_matrix((0, self.n_features), dtype=np.float32)  # raw weighted term counts
+        self._pending: List[Dict[int, float]] = []  # counts of rows not yet in _counts
+        self._vectors = sparse.csr_matrix((0, self.n_features), dtype=np.float32)  # TF-IDF rows
+        self._df = np.zeros(self.n_features, dtype=np.int32)
+        self._neighbors = np.full((0, self.k), -1, dtype=np.int32)
+        self._scores = np.full((0, self.k), -np.inf, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # Vectors
+
+    def _book_counts(self, book) -> Dict[int, float]:
+        counts: Dict[int, float] = defaultdict(float)
+        fields = book_fields(book)
+        fields["genre"] = "genre" + (book.genre.value if hasattr(book.genre, "value") else str(book.genre)).replace("-", "")
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                counts[_feature(term, self.n_features)] += weight
+        return counts
+
+    def _idf(self) -> np.ndarray:
+        books = len(self._row_of)
+        idf = (np.log((1 + books) / (1 + self._df)) + 1).astype(np.float32)
+        if books >= MIN_BOOKS_FOR_MAX_DF:
+            idf[self._df > self.max_df * books] = 0.0
+        return idf
+
+    @staticmethod
+    def _weight(counts: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+        """L2-normalized sublinear TF-IDF rows"""
+        weighted = counts.astype(np.float32, copy=True)
+        weighted.data = (1 + np.log(weighted.data)) * idf[weighted.indices]
+        weighted.eliminate_zeros()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return (sparse.diags(1 / norms) @ weighted).tocsr().astype(np.float32)
+
+    def _append_rows(self, books: List) -> List[int]:
+        """Register books as new rows (retiring rows of books seen before); returns the new rows"""
+        rows = []
+        for book in books:
+            self._retire(book.book_id)
+            counts = self._book_counts(book)
+            self._df[np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))] += 1
+            row = len(self._book_ids)
+            self._book_ids.append(book.book_id)
+            self._row_of[book.book_id] = row
+            self._pending.append(counts)
+            rows.append(row)
+        return rows
+
+    def _row_features(self, row: int) -> np.ndarray:
+        saved = self._counts.shape[0]
+        if row < saved:
+            return self._counts.indices[self._counts.indptr[row]:self._counts.indptr[row + 1]]
+        counts = self._pending[row - saved]
+        return np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+
+    def _retire(self, book_id: str):
+        row = self._row_of.pop(book_id, None)
+        if row is not None:
+            self._book_ids[row] = None
+            self._df[self._row_features(row)] -= 1
+
+    def _consolidate(self):
+        """Move pending rows into the count matrix"""
+        if not self._pending:
+            return
+        indptr, indices, data = [0], [], []
+        for counts in self._pending:
+            indices.append(np.fromiter(counts.keys(), dtype=np.int64, count=len(counts)))
+            data.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            indptr.append(indptr[-1] + len(counts))
+        rows = sparse.csr_matrix(
+            (np.concatenate(data), np.concatenate(indices), np.array(indptr)),
+            shape=(len(self._pending), self.n_features)
+        )
+        self._counts = sparse.vstack([self._counts, rows], format="csr")
+        self._pending = []
+
+    def _flush_vectors(self):
+        """Weight rows added since the last flush with the current IDF"""
+        self._consolidate()
+        first = self._vectors.shape[0]
+        if first < self._counts.shape[0]:
+            self._vectors = sparse.vstack([self._vectors, self._weight(self._counts[first:], self._idf())], format="csr")
+
+    # Neighbors
+
+    def _live_mask(self) -> np.ndarray:
+        return np.fromiter((book_id is not None for book_id in self._book_ids), dtype=bool, count=len(self._book_ids))
+
+    def _similarities(self, rows: np.ndarray, live: np.ndarray):
+        """(batch rows, sparse similarities) against the books sharing a weighted term
+        with each row, retired rows, self-pairs and non-positive scores dropped"""
+        postings = self._vectors.T.tocsr()  # term -> rows containing it
+        vectors = self._vectors[rows]
+        # Candidate pairs a row produces: the lengths of its terms' posting lists
+        row_of = np.repeat(np.arange(len(rows)), np.diff(vectors.indptr))
+        cost = np.cumsum(np.bincount(row_of, weights=np.diff(postings.indptr)[vectors.indices], minlength=len(rows)))
+        start = 0
+        while start < len(rows):
+            done = cost[start - 1] if start else 0.0
+            end = max(start + 1, int(np.searchsorted(cost, done + MAX_BATCH_PAIRS, side="right")))
+            chunk = rows[start:end]
+            scores = (vectors[start:end] @ postings).tocsr()
+            batch_row = np.repeat(np.arange(len(chunk)), np.diff(scores.indptr))
+            scores.data[~live[scores.indices] | (scores.indices == chunk[batch_row]) | (scores.data <= 0)] = 0
+            scores.eliminate_zeros()
+            yield chunk, scores
+            start = end
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._neighbors.shape[0]:
+            return
+        capacity = max(rows, int(self._neighbors.shape[0] * GROWTH_FACTOR))
+        neighbors = self._allocate("neighbors", (capacity, self.k), np.int32, -1)
+        scores = self._allocate("scores", (capacity, self.k), np.float32, -np.inf)
+        used = self._neighbors.shape[0]
+        neighbors[:used] = self._neighbors
+        scores[:used] = self._scores
+        self._neighbors, self._scores = neighbors, scores
+
+    def _allocate(self, name: str, shape, dtype, fill) -> np.ndarray:
+        if not self.directory:
+            return np.full(shape, fill, dtype=dtype)
+        os.makedirs(self.directory, exist_ok=True)
+        # A new file each time: the previous array may still be mapped, here or by another index
+        path = os.path.join(self.directory, f"{name}-{shape[0]}-{uuid.uuid4().hex[:8]}.npy")
+        array = open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        array[:] = fill
+        return array
+
+    def rebuild(self, books: Iterable):
+        """Index `books` from scratch and compute every book's neighbors"""
+        self._reset()
+        self.add_vectors(books)
+        self.compute_neighbors()
+
+    def add_vectors(self, books: Iterable):
+        """Register books without computing neighbors yet (for streaming a full rebuild)"""
+        self._append_rows(list({book.book_id: book for book in books}.values()))
+
+    def compute_neighbors(self):
+        """All-pairs top-k over every row, a batch of rows at a time"""
+        self._compact()
+        self._vectors = self._weight(self._counts, self._idf())
+        rows = len(self._book_ids)
+        self._neighbors = self._allocate("neighbors", (rows, self.k), np.int32, -1)
+        self._scores = self._allocate("scores", (rows, self.k), np.float32, -np.inf)
+        live = self._live_mask()
+        for chunk, scores in self._similarities(np.arange(rows), live):
+            self._neighbors[chunk], self._scores[chunk] = _sparse_top_k(scores, self.k)
+        self._clear_empty()
+
+    def _compact(self):
+        """Drop retired rows before a full recompute"""
+        self._consolidate()
+        keep = [row for row, book_id in enumerate(self._book_ids) if book_id is not None]
+        if len(keep) == len(self._book_ids):
+            return
+        self._book_ids = [self._book_ids[row] for row in keep]
+        self._counts = self._counts[keep]
+        self._row_of = {book_id: row for row, book_id in enumerate(self._book_ids)}
+
+    def update(self, books: Iterable):
+        """Add new or changed books, computing only their rows and merging them into existing lists"""
+        books = list({book.book_id: book for book in books}.values())
+        if not books:
+            return
+        self._flush_vectors()
+        previous_rows = self._vectors.shape[0]
+        new_rows = np.array(self._append_rows(books))
+        self._flush_vectors()
+        self._ensure_capacity(len(self._book_ids))
+        live = self._live_mask()
+
+        for chunk, scores in self._similarities(new_rows, live):
+            self._neighbors[chunk], self._scores[chunk] = _sparse_top_k(scores, self.k)
+
+            # The new rows may now be among the best neighbors of the existing books they share terms with
+            incoming = scores[:, :previous_rows].T.tocsr()  # existing rows x chunk
+            affected = np.flatnonzero(np.diff(incoming.indptr))
+            if affected.size:
+                candidates, candidate_scores = _sparse_top_k(incoming[affected], self.k)
+                candidate_ids = np.where(candidates >= 0, chunk[np.clip(candidates, 0, None)], -1)
+                current_ids = self._neighbors[affected]
+                current_scores = self._scores[affected].copy()
+                current_scores[(current_ids >= 0) & ~live[np.clip(current_ids, 0, None)]] = -np.inf
+                merged_ids = np.concatenate([current_ids, candidate_ids], axis=1)
+                merged_scores = np.concatenate([current_scores, candidate_scores], axis=1)
+                best, best_scores = _top_k(merged_scores, self.k)
+                self._neighbors[affected] = np.take_along_axis(merged_ids, best, axis=1)
+                self._scores[affected] = best_scores
+        self._clear_empty()
+
+    def remove(self, book_ids: Iterable[str]):
+        """Retire books; they stop appearing as anyone's neighbor"""
+        for book_id in book_ids:
+            self._retire(book_id)
+
+    def _clear_empty(self):
+        # Slots without a real neighbor (fewer than k candidates, or zero vectors)
+        empty = ~np.isfinite(self._scores) | (self._scores <= 0)
+        self._neighbors[empty] = -1
+
+    def neighbors(self, book_id: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(book id, cosine similarity) of the most similar live books, best first"""
+        row = self._row_of.get(book_id)
+        if row is None or row >= self._neighbors.shape[0]:
+            return []
+        results = []
+        for neighbor, score in zip(self._neighbors[row], self._scores[row]):
+            if neighbor < 0 or neighbor >= len(self._book_ids) or self._book_ids[neighbor] is None:
+                continue
+            results.append((self._book_ids[neighbor], round(float(score), 4)))
+            if k and len(results) >= k:
+                break
+        return results
+
+    # Persistence
+
+    def save(self, catalog_version: int):
+        """Write term counts and row ids next to the memory-mapped neighbor arrays"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._consolidate()
+        if isinstance(self._neighbors, np.memmap):
+            self._neighbors.flush()
+            self._scores.flush()
+        counts_path = os.path.join(self.directory, "counts.npz")
+        with open(counts_path + ".tmp", "wb") as handle:
+            sparse.save_npz(handle, self._counts)
+        os.replace(counts_path + ".tmp", counts_path)
+        meta = {
+            "k": self.k,
+            "n_features": self.n_features,
+            "catalog_version": catalog_version,
+            "book_ids": self._book_ids,
+            "neighbors_file": os.path.basename(getattr(self._neighbors, "filename", None) or ""),
+            "scores_file": os.path.basename(getattr(self._scores, "filename", None) or ""),
+        }
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(path + ".tmp", path)
+        self.catalog_version = catalog_version
+        self._remove_stale_files(meta)
+
+    def _remove_stale_files(self, meta: dict):
+        keep = {meta["neighbors_file"], meta["scores_file"]}
+        for name in os.listdir(self.directory):
+            if name.startswith(("neighbors-", "scores-")) and name not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def load(self) -> Optional[int]:
+        """Reopen saved files; returns the catalog version they reflect, or None"""
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, "meta.json"), encoding="utf-8") as handle:
+                meta = json.load(handle)
+            if meta["k"] != self.k or meta["n_features"] != self.n_features or not meta["neighbors_file"]:
+                return None
+            self._reset()
+            self._counts = sparse.load_npz(os.path.join(self.directory, "counts.npz")).tocsr().astype(np.float32)
+            self._neighbors = np.load(os.path.join(self.directory, meta["neighbors_file"]), mmap_mode="r+")
+            self._scores = np.load(os.path.join(self.directory, meta["scores_file"]), mmap_mode="r+")
+            self._book_ids = meta["book_ids"]
+            # counts.npz and meta.json are replaced one after the other; a crash in between leaves them apart
+            rows = len(self._book_ids)
+            if self._counts.shape[0] != rows or self._neighbors.shape[0] < rows or self._scores.shape != self._neighbors.shape:
+                raise ValueError(f"saved files disagree ({self._counts.shape[0]} count rows, {rows} book ids)")
+            self._row_of = {book_id: row for row, book_id in enumerate(self._book_ids) if book_id is not None}
+            live = np.array([book_id is not None for book_id in self._book_ids], dtype=bool)
+            self._df = np.bincount(self._counts[live].indices, minlength=self.n_features).astype(np.int32)
+            self._vectors = self._weight(self._counts, self._idf())
+            self.catalog_version = meta["catalog_version"]
+            return self.catalog_version
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load saved book similarity index: {e}")
+            self._reset()
+            return None
@@ -0,0 +1,691 @@
+"""
+Book Catalog Store
+------------------
+Persistence for the book catalog and customer profiles behind
+ProductRecommendationEngine.
+
+- CatalogStore is the interface; MemoryCatalogStore keeps documents in
+  process (the default, seeded with the sample catalog) and
+  MongoCatalogStore keeps them in the `books` and `customer_profiles`
+  collections (plus the precomputed "customers also bought" table in
+  `co_purchases`).
+- Stores work with plain documents; the engine converts them to Book /
+  CustomerProfile objects.
+- Every write bumps a catalog version and logs the changed book ids, so
+  other processes can invalidate their caches and re-index only what
+  changed (`changes_since`).
+- CatalogCache is a bounded read-through LRU of decoded books in front of a
+  store, so workers only hold the books they actually serve.
+- `import_books` streams CSV or NDJSON files into a store in batches.
+
+Usage:
+    python -m services.catalog_store import books.csv [--format csv|ndjson] [--batch-size N]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, DeleteOne, MongoClient, ReplaceOne, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Changes a consumer can be behind before it has to reload the whole catalog
+MAX_CHANGE_IDS = 10000
+
+# Catalog versions the in-memory change log keeps
+MEMORY_CHANGE_LOG_VERSIONS = 1000
+
+# Import errors kept in the import result
+MAX_IMPORT_ERRORS = 20
+
+BOOK_NUMBER_FIELDS = {"price": float, "rating": float, "publication_year": int, "page_count": int, "stock_quantity": int}
+
+
+def _in_stock(book: dict) -> bool:
+    return bool(book.get("availability", True)) and (book.get("stock_quantity") or 0) > 0
+
+
+def _rank_key(book: dict):
+    """Best rated first, cheaper first among equals"""
+    return (-(book.get("rating") or 0.0), book.get("price") or 0.0, book["book_id"])
+
+
+class CatalogStore(ABC):
+    """Book and customer profile persistence"""
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    @abstractmethod
+    async def count_books(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_books(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        """Book documents by id (missing ids are left out)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_books_blocking(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        """get_books for synchronous callers running off the event loop"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_books(self, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+        """Every book document, a batch at a time, in book_id order"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_books(
+        self,
+        genre: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        in_stock_only: bool = True,
+        limit: Optional[int] = None
+    ) -> List[dict]:
+        """Books matching the filters, best rated (then cheapest) first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_books(self, books: List[dict]) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_book(self, book_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_stock(self, book_id: str, stock_quantity: int, availability: Optional[bool] = None) -> bool:
+        """Update a book's stock level (and availability); False if the book does not exist"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_customer_profile(self, customer_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_customer_profile(self, profile: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_co_purchases(self, book_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        """Precomputed "customers also bought" rows for the books that have one"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def upsert_co_purchases(self, rows: Dict[str, List[dict]], replace: bool = False) -> int:
+        """Replace "customers also bought" rows (an empty list removes the row)
+
+        With replace=True `rows` is the whole table: rows for other books are removed.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def version(self) -> int:
+        """Catalog version, bumped by every book write"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def changes_since(self, version: int) -> Tuple[int, Optional[List[str]]]:
+        """(current version, ids of books changed after `version`)
+
+        The id list is None when the change log no longer reaches back to
+        `version` (or changed too much), meaning: reload everything.
+        """
+        raise NotImplementedError
+
+
+class MemoryCatalogStore(CatalogStore):
+    """In-process store (data does not persist)"""
+
+    def __init__(self, books: Iterable[dict] = (), profiles: Iterable[dict] = ()):
+        self._books: Dict[str, dict] = {book["book_id"]: book for book in books}
+        self._profiles: Dict[str, dict] = {profile["customer_id"]: profile for profile in profiles}
+        self._co_purchases: Dict[str, List[dict]] = {}
+        self._version = 0
+        self._changes: deque = deque(maxlen=MEMORY_CHANGE_LOG_VERSIONS)  # (version, book ids)
+
+    def _log_changes(self, book_ids: List[str]):
+        self._version += 1
+        self._changes.append((self._version, book_ids))
+
+    async def count_books(self) -> int:
+        return len(self._books)
+
+    async def get_books(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        return self.get_books_blocking(book_ids)
+
+    def get_books_blocking(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        return {book_id: self._books[book_id] for book_id in book_ids if book_id in self._books}
+
+    async def iter_books(self, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+        book_ids = sorted(self._books)
+        for start in range(0, len(book_ids), batch_size):
+            yield [self._books[book_id] for book_id in book_ids[start:start + batch_size] if book_id in self._books]
+
+    async def find_books(self, genre=None, min_price=None, max_price=None, min_rating=None,
+                         in_stock_only=True, limit=None) -> List[dict]:
+        books = [
+            book for book in self._books.values()
+            if (genre is None or book.get("genre") == genre)
+            and (min_price is None or book.get("price", 0.0) >= min_price)
+            and (max_price is None or book.get("price", 0.0) <= max_price)
+            and (min_rating is None or book.get("rating", 0.0) >= min_rating)
+            and (not in_stock_only or _in_stock(book))
+        ]
+        books.sort(key=_rank_key)
+        return books[:limit] if limit else books
+
+    async def upsert_books(self, books: List[dict]) -> int:
+        for book in books:
+            self._books[book["book_id"]] = book
+        if books:
+            self._log_changes([book["book_id"] for book in books])
+        return len(books)
+
+    async def delete_book(self, book_id: str) -> bool:
+        if self._books.pop(book_id, None) is None:
+            return False
+        self._log_changes([book_id])
+        return True
+
+    async def set_stock(self, book_id: str, stock_quantity: int, availability: Optional[bool] = None) -> bool:
+        book = self._books.get(book_id)
+        if book is None:
+            return False
+        book = {**book, "stock_quantity": stock_quantity}
+        if availability is not None:
+            book["availability"] = availability
+        self._books[book_id] = book
+        self._log_changes([book_id])
+        return True
+
+    async def get_customer_profile(self, customer_id: str) -> Optional[dict]:
+        return self._profiles.get(customer_id)
+
+    async def upsert_customer_profile(self, profile: dict):
+        self._profiles[profile["customer_id"]] = profile
+
+    async def get_co_purchases(self, book_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        return {book_id: self._co_purchases[book_id] for book_id in book_ids if book_id in self._co_purchases}
+
+    async def upsert_co_purchases(self, rows: Dict[str, List[dict]], replace: bool = False) -> int:
+        if replace:
+            self._co_purchases = {}
+        for book_id, also_bought in rows.items():
+            if also_bought:
+                self._co_purchases[book_id] = also_bought
+            else:
+                self._co_purchases.pop(book_id, None)
+        return len(rows)
+
+    async def version(self) -> int:
+        return self._version
+
+    async def changes_since(self, version: int) -> Tuple[int, Optional[List[str]]]:
+        if version == self._version:
+            return self._version, []
+        if version > self._version or not self._changes or self._changes[0][0] > version + 1:
+            return self._version, None
+        changed = list(dict.fromkeys(book_id for v, book_ids in self._changes if v > version for book_id in book_ids))
+        return self._version, changed if len(changed) <= MAX_CHANGE_IDS else None
+
+
+class MongoCatalogStore(CatalogStore):
+    """MongoDB store: `books`, `customer_profiles`, `co_purchases`, plus `catalog_meta` / `catalog_changes` for the change log"""
+
+    def __init__(self, mongo_url: str, db_name: str, change_retention_seconds: int = 86400):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self.change_retention_seconds = change_retention_seconds
+        self.client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=10000)
+        self.db = self.client[db_name]
+        self.books_collection = self.db.books
+        self.customer_profiles_collection = self.db.customer_profiles
+        self.co_purchases_collection = self.db.co_purchases  # {_id: book_id, also_bought: [...]}
+        self.meta_collection = self.db.catalog_meta
+        self.changes_collection = self.db.catalog_changes
+        self._blocking_client: Optional[MongoClient] = None
+
+    async def connect(self):
+        """Check the connection and create indexes"""
+        try:
+            await self.client.admin.command('ping')
+            await self.books_collection.create_index("book_id", unique=True)
+            await self.books_collection.create_index([("genre", ASCENDING), ("rating", DESCENDING), ("price", ASCENDING)])
+            await self.books_collection.create_index([("rating", DESCENDING), ("price", ASCENDING)])
+            await self.books_collection.create_index("price")
+            await self.books_collection.create_index("author")
+            await self.books_collection.create_index("isbn")
+            await self.customer_profiles_collection.create_index("customer_id", unique=True)
+            await self.customer_profiles_collection.create_index("email")
+            await self.changes_collection.create_index("version", unique=True)
+            await self.changes_collection.create_index("created_at", expireAfterSeconds=self.change_retention_seconds)
+            logger.info(f"✅ Catalog store connected: {self.db_name}")
+        except Exception as e:
+            logger.error(f"Failed to connect catalog store: {e}")
+            raise
+
+    async def disconnect(self):
+        self.client.close()
+        if self._blocking_client is not None:
+            self._blocking_client.close()
+
+    async def count_books(self) -> int:
+        return await self.books_collection.count_documents({})
+
+    async def get_books(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        try:
+            cursor = self.books_collection.find({"book_id": {"$in": list(book_ids)}}, {"_id": 0})
+            return {book["book_id"]: book async for book in cursor}
+        except Exception as e:
+            logger.error(f"Failed to get books: {e}")
+            raise
+
+    def get_books_blocking(self, book_ids: Iterable[str]) -> Dict[str, dict]:
+        try:
+            if self._blocking_client is None:
+                self._blocking_client = MongoClient(self.mongo_url, serverSelectionTimeoutMS=10000)
+            collection = self._blocking_client[self.db_name].books
+            cursor = collection.find({"book_id": {"$in": list(book_ids)}}, {"_id": 0})
+            return {book["book_id"]: book for book in cursor}
+        except Exception as e:
+            logger.error(f"Failed to get books: {e}")
+            raise
+
+    async def iter_books(self, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+        # Keyset pagination on the unique book_id index
+        after = None
+        while True:
+            query = {"book_id": {"$gt": after}} if after is not None else {}
+            cursor = self.books_collection.find(query, {"_id": 0}).sort("book_id", ASCENDING).limit(batch_size)
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                return
+            yield batch
+            after = batch[-1]["book_id"]
+
+    async def find_books(self, genre=None, min_price=None, max_price=None, min_rating=None,
+                         in_stock_only=True, limit=None) -> List[dict]:
+        try:
+            query: Dict[str, Any] = {}
+            if genre is not None:
+                query["genre"] = genre
+            if min_price is not None or max_price is not None:
+                query["price"] = {}
+                if min_price is not None:
+                    query["price"]["$gte"] = min_price
+                if max_price is not None:
+                    query["price"]["$lte"] = max_price
+            if min_rating is not None:
+                query["rating"] = {"$gte": min_rating}
+            if in_stock_only:
+                query["availability"] = {"$ne": False}
+                query["stock_quantity"] = {"$gt": 0}
+            cursor = self.books_collection.find(query, {"_id": 0}).sort(
+                [("rating", DESCENDING), ("price", ASCENDING), ("book_id", ASCENDING)]
+            )
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Failed to find books: {e}")
+            raise
+
+    async def _log_changes(self, book_ids: List[str]):
+        # Written after the books themselves, so a reader that sees the new
+        # version also sees the new documents. The change record lands just
+        # after the version bump; changes_since stops at the last one logged.
+        meta = await self.meta_collection.find_one_and_update(
+            {"_id": "books"}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        await self.changes_collection.insert_one(
+            {"version": meta["version"], "book_ids": book_ids, "created_at": datetime.utcnow()}
+        )
+
+    async def upsert_books(self, books: List[dict]) -> int:
+        try:
+            if not books:
+                return 0
+            result = await self.books_collection.bulk_write(
+                [ReplaceOne({"book_id": book["book_id"]}, book, upsert=True) for book in books],
+                ordered=False
+            )
+            await self._log_changes([book["book_id"] for book in books])
+            return result.matched_count + result.upserted_count
+        except Exception as e:
+            logger.error(f"Failed to upsert books: {e}")
+            raise
+
+    async def delete_book(self, book_id: str) -> bool:
+        try:
+            result = await self.books_collection.delete_one({"book_id": book_id})
+            if not result.deleted_count:
+                return False
+            await self._log_changes([book_id])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete book: {e}")
+            raise
+
+    async def set_stock(self, book_id: str, stock_quantity: int, availability: Optional[bool] = None) -> bool:
+        try:
+            fields: Dict[str, Any] = {"stock_quantity": stock_quantity}
+            if availability is not None:
+                fields["availability"] = availability
+            result = await self.books_collection.update_one({"book_id": book_id}, {"$set": fields})
+            if not result.matched_count:
+                return False
+            await self._log_changes([book_id])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update stock: {e}")
+            raise
+
+    async def get_customer_profile(self, customer_id: str) -> Optional[dict]:
+        try:
+            return await self.customer_profiles_collection.find_one({"customer_id": customer_id}, {"_id": 0})
+        except Exception as e:
+            logger.error(f"Failed to get customer profile: {e}")
+            raise
+
+    async def upsert_customer_profile(self, profile: dict):
+        try:
+            await self.customer_profiles_collection.replace_one(
+                {"customer_id": profile["customer_id"]}, profile, upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to store customer profile: {e}")
+            raise
+
+    async def get_co_purchases(self, book_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        try:
+            cursor = self.co_purchases_collection.find({"_id": {"$in": list(book_ids)}})
+            return {doc["_id"]: doc["also_bought"] async for doc in cursor}
+        except Exception as e:
+            logger.error(f"Failed to get co-purchases: {e}")
+            raise
+
+    async def upsert_co_purchases(self, rows: Dict[str, List[dict]], replace: bool = False) -> int:
+        try:
+            now = datetime.utcnow()
+            now = now.replace(microsecond=now.microsecond // 1000 * 1000)  # BSON dates keep milliseconds
+            if rows:
+                await self.co_purchases_collection.bulk_write([
+                    ReplaceOne({"_id": book_id}, {"also_bought": also_bought, "updated_at": now}, upsert=True)
+                    if also_bought else DeleteOne({"_id": book_id})
+                    for book_id, also_bought in rows.items()
+                ], ordered=False)
+            if replace:
+                # Rows not rewritten above belong to books that dropped out of the table
+                await self.co_purchases_collection.delete_many({"updated_at": {"$lt": now}})
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Failed to store co-purchases: {e}")
+            raise
+
+    async def version(self) -> int:
+        meta = await self.meta_collection.find_one({"_id": "books"})
+        return meta["version"] if meta else 0
+
+    async def _log_starts_after(self, version: int) -> bool:
+        oldest = await self.changes_collection.find_one({}, {"version": 1}, sort=[("version", ASCENDING)])
+        return oldest is None or oldest["version"] > version
+
+    async def changes_since(self, version: int) -> Tuple[int, Optional[List[str]]]:
+        try:
+            current = await self.version()
+            if current == version:
+                return current, []
+            if current < version:
+                return current, None
+            cursor = self.changes_collection.find({"version": {"$gt": version}}).sort("version", ASCENDING)
+            changed: Dict[str, None] = {}
+            expected = version + 1
+            async for change in cursor:
+                if change["version"] != expected:
+                    break
+                expected += 1
+                changed.update(dict.fromkeys(change["book_ids"]))
+                if len(changed) > MAX_CHANGE_IDS:
+                    return current, None
+            # A writer bumps the version before it logs the change, so with concurrent
+            # writers N+2 can be logged before N+1: a gap is a change not visible yet,
+            # and the log has only expired when its oldest record is past version + 1
+            if expected == version + 1 and await self._log_starts_after(expected):
+                return current, None
+            # Report only the versions read; the rest is picked up on a later call
+            return expected - 1, list(changed)
+        except Exception as e:
+            logger.error(f"Failed to read catalog changes: {e}")
+            raise
+
+
+def create_catalog_store(seed_books: Iterable[dict] = (), seed_profiles: Iterable[dict] = ()) -> CatalogStore:
+    """Store selected by CATALOG_STORE ("memory" or "mongo"); the memory store starts with the seed data"""
+    kind = os.getenv("CATALOG_STORE", "memory").lower()
+    if kind == "mongo":
+        return MongoCatalogStore(
+            os.getenv("DATABASE_URL", "mongodb://localhost:27017"),
+            os.getenv("DB_NAME", "agent_starter_db")
+        )
+    if kind != "memory":
+        logger.warning(f"Unknown CATALOG_STORE '{kind}' - using the in-memory catalog")
+    return MemoryCatalogStore(seed_books, seed_profiles)
+
+
+class CatalogCache:
+    """Bounded read-through LRU of decoded books in front of a CatalogStore
+
+    Shared by the event loop and worker threads (blocking title resolution,
+    report jobs), so the LRU is guarded by a lock. Each fill is tagged with
+    the invalidation generation it started in and is not cached if an
+    invalidation happened while it was reading the store, so a slow read
+    cannot put back a book that was just changed.
+    """
+
+    def __init__(self, store: CatalogStore, decode: Callable[[dict], Any], maxsize: int = 10000):
+        self.store = store
+        self.decode = decode
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.stale_fills = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _take_cached(self, book_ids: List[str]) -> Tuple[Dict[str, Any], List[str], int]:
+        found, missing = {}, []
+        with self._lock:
+            for book_id in book_ids:
+                item = self._items.get(book_id)
+                if item is None:
+                    missing.append(book_id)
+                else:
+                    self._items.move_to_end(book_id)
+                    found[book_id] = item
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self._generation
+
+    def _put(self, documents: Dict[str, dict], found: Dict[str, Any], generation: int):
+        items = {book_id: self.decode(document) for book_id, document in documents.items()}
+        found.update(items)
+        with self._lock:
+            if generation != self._generation:
+                # Read before an invalidation: serve it, but do not cache it
+                self.stale_fills += 1
+                return
+            self._items.update(items)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    async def get_many(self, book_ids: Iterable[str]) -> Dict[str, Any]:
+        """Books by id, loading misses from the store in one query"""
+        found, missing, generation = self._take_cached(list(dict.fromkeys(book_ids)))
+        if missing:
+            self._put(await self.store.get_books(missing), found, generation)
+        return found
+
+    def get_many_blocking(self, book_ids: Iterable[str]) -> Dict[str, Any]:
+        found, missing, generation = self._take_cached(list(dict.fromkeys(book_ids)))
+        if missing:
+            self._put(self.store.get_books_blocking(missing), found, generation)
+        return found
+
+    async def get(self, book_id: str) -> Optional[Any]:
+        return (await self.get_many([book_id])).get(book_id)
+
+    def get_blocking(self, book_id: str) -> Optional[Any]:
+        return self.get_many_blocking([book_id]).get(book_id)
+
+    def invalidate(self, book_ids: Optional[Iterable[str]] = None):
+        """Drop the given books (or everything) so the next read goes to the store"""
+        with self._lock:
+            self._generation += 1
+            if book_ids is None:
+                self._items.clear()
+                return
+            for book_id in book_ids:
+                self._items.pop(book_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_fills": self.stale_fills
+        }
+
+
+def normalize_book_record(record: Dict[str, Any]) -> dict:
+    """Book document from an imported CSV row / NDJSON object
+
+    Raises ValueError for records without an id or title, or with bad numbers.
+    """
+    book = {key: value for key, value in record.items() if key and value not in (None, "")}
+    if not book.get("book_id") or not book.get("title"):
+        raise ValueError("book_id and title are required")
+    for field, cast in BOOK_NUMBER_FIELDS.items():
+        if field in book:
+            try:
+                book[field] = cast(float(book[field])) if cast is int else cast(book[field])
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid {field}: {book[field]!r}")
+    if isinstance(book.get("availability"), str):
+        book["availability"] = book["availability"].strip().lower() not in ("false", "0", "no", "n")
+    for field in ("tags", "similar_books"):
+        if isinstance(book.get(field), str):
+            # CSV cells hold "a|b|c" (or a JSON list)
+            value = book[field].strip()
+            book[field] = json.loads(value) if value.startswith("[") else [v.strip() for v in value.split("|") if v.strip()]
+    if isinstance(book.get("genre"), str):
+        book["genre"] = book["genre"].strip().lower()
+    return book
+
+
+def iter_book_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line/row number, raw record) pairs parsed lazily from `lines`"""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if line:
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, ValueError(f"invalid JSON: {e}")
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+async def import_books(
+    store: CatalogStore,
+    path: str,
+    fmt: Optional[str] = None,
+    batch_size: int = 1000,
+    validate: Optional[Callable[[dict], Any]] = None
+) -> Dict[str, Any]:
+    """Stream a CSV/NDJSON file into `store`, one bulk upsert per batch
+
+    `validate` may raise ValueError/KeyError to reject a normalized record.
+    """
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    result: Dict[str, Any] = {"imported": 0, "failed": 0, "errors": []}
+    batch: List[dict] = []
+    with open(path, newline="", encoding="utf-8") as handle:
+        for number, record in iter_book_records(handle, fmt):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                book = normalize_book_record(record)
+                if validate is not None:
+                    validate(book)
+            except (ValueError, KeyError, TypeError) as e:
+                result["failed"] += 1
+                if len(result["errors"]) < MAX_IMPORT_ERRORS:
+                    result["errors"].append(f"line {number}: {e}")
+                continue
+            batch.append(book)
+            if len(batch) >= batch_size:
+                result["imported"] += await store.upsert_books(batch)
+                batch = []
+    if batch:
+        result["imported"] += await store.upsert_books(batch)
+    return result
+
+
+async def _main(argv) -> int:
+    from services.product_recommendation import book_from_document
+
+    parser = argparse.ArgumentParser(prog="python -m services.catalog_store", description="Book catalog store tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="bulk import books from a CSV or NDJSON file")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    importer.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv[1:])
+
+    store = create_catalog_store()
+    if isinstance(store, MemoryCatalogStore):
+        print("CATALOG_STORE is not 'mongo' - nothing would persist", file=sys.stderr)
+        return 1
+    await store.connect()
+    try:
+        result = await import_books(store, args.path, args.format, args.batch_size, validate=book_from_document)
+    finally:
+        await store.disconnect()
+    print(f"Imported {result['imported']} books ({result['failed']} rejected)")
+    for error in result["errors"]:
+        print(f"  {error}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv)))
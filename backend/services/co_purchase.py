@@ -0,0 +1,207 @@
+"""
+Co-Purchase Model
+-----------------
+Item-to-item collaborative filtering ("customers who bought X also
+bought Y") from confirmed orders.
+
+- Each customer's basket is the set of books they have a confirmed order
+  for. With B the (customers x books) basket matrix, the co-purchase
+  counts are the sparse product C = B^T B; the diagonal holds how many
+  customers bought each book.
+- Scores are cosine normalized, C[i, j] / sqrt(C[i, i] * C[j, j]), so
+  bestsellers do not top every list; the top k rows per book form the
+  table that is served during calls (a lookup, never a computation).
+- Orders are added and removed individually (keyed by room id). `refresh`
+  applies the basket changes since the last refresh as a delta
+  B_new^T B_new - B_old^T B_old over the affected customers only, and
+  re-ranks only the books whose counts (or whose partners' counts)
+  changed; it returns just those rows.
+- `save` / `load` keep the order list in a directory, so an incremental
+  refresh in a new process does not rescan every order.
+"""
+
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "orders.npz"
+
+
+class CoPurchaseModel:
+    """Sparse co-occurrence counts over customer baskets and their top-k table"""
+
+    def __init__(self, k: int = 10, min_customers: int = 1):
+        self.k = k
+        self.min_customers = min_customers  # customers who must share a pair for it to count
+        self._orders: Dict[str, Tuple[str, str]] = {}  # room id -> (customer, book id)
+        self._purchases: Dict[str, Counter] = defaultdict(Counter)  # customer -> book id -> confirmed orders
+        self._baskets: Dict[str, Set[int]] = {}  # customer -> book columns reflected in _counts
+        self._dirty: Set[str] = set()  # customers whose purchases changed since the last refresh
+        self._book_ids: List[str] = []
+        self._column_of: Dict[str, int] = {}
+        self._counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    @property
+    def customers(self) -> int:
+        return len(self._baskets)
+
+    @property
+    def books(self) -> int:
+        return len(self._book_ids)
+
+    def has_order(self, room_id: str) -> bool:
+        return room_id in self._orders
+
+    def _column(self, book_id: str) -> int:
+        column = self._column_of.get(book_id)
+        if column is None:
+            column = len(self._book_ids)
+            self._book_ids.append(book_id)
+            self._column_of[book_id] = column
+        return column
+
+    def add_order(self, room_id: str, customer: str, book_id: str):
+        """Count a confirmed order (re-adding a room replaces its previous order)"""
+        if self._orders.get(room_id) == (customer, book_id):
+            return
+        self.remove_order(room_id)
+        self._orders[room_id] = (customer, book_id)
+        self._purchases[customer][book_id] += 1
+        self._dirty.add(customer)
+
+    def remove_order(self, room_id: str):
+        """Stop counting an order (cancelled or rejected)"""
+        order = self._orders.pop(room_id, None)
+        if order is None:
+            return
+        customer, book_id = order
+        purchases = self._purchases[customer]
+        purchases[book_id] -= 1
+        if purchases[book_id] <= 0:
+            del purchases[book_id]
+        self._dirty.add(customer)
+
+    def _basket_matrix(self, baskets: List[Set[int]], columns: int) -> sparse.csr_matrix:
+        indptr = np.cumsum([0] + [len(basket) for basket in baskets])
+        indices = np.fromiter((column for basket in baskets for column in basket), dtype=np.int32, count=indptr[-1])
+        return sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(baskets), columns))
+
+    def refresh(self) -> Dict[str, List[dict]]:
+        """Apply order changes since the last refresh; returns the table rows that changed
+
+        A book whose row became empty maps to [] (its stored row should be removed).
+        """
+        if not self._dirty:
+            return {}
+        customers = list(self._dirty)
+        self._dirty = set()
+        old = [self._baskets.get(customer, set()) for customer in customers]
+        new = [{self._column(book_id) for book_id in self._purchases[customer]} for customer in customers]
+        columns = len(self._book_ids)
+
+        before, after = self._basket_matrix(old, columns), self._basket_matrix(new, columns)
+        delta = (after.T @ after - before.T @ before).tocsr()
+        delta.eliminate_zeros()
+        if self._counts.shape[0] < columns:
+            self._counts.resize((columns, columns))
+        self._counts = (self._counts + delta).tocsr()
+        self._counts.eliminate_zeros()
+
+        for customer, basket in zip(customers, new):
+            if basket:
+                self._baskets[customer] = basket
+            else:
+                self._baskets.pop(customer, None)
+                self._purchases.pop(customer, None)
+
+        # Rows whose counts changed, plus rows pairing with a book whose
+        # customer total changed (their cosine denominators moved)
+        changed_rows = np.unique(delta.tocoo().row)
+        changed_totals = np.flatnonzero(delta.diagonal())
+        if changed_totals.size:
+            partners = self._counts[changed_totals].indices
+            changed_rows = np.union1d(changed_rows, partners)
+        return self._rank(changed_rows)
+
+    def _rank(self, rows: Iterable[int]) -> Dict[str, List[dict]]:
+        """Top-k table rows for `rows`, ranked in one vectorized pass"""
+        rows = np.asarray(list(rows) if not isinstance(rows, np.ndarray) else rows, dtype=np.int64)
+        book_ids = self._book_ids
+        table = {book_ids[row]: [] for row in rows.tolist()}
+        if not rows.size:
+            return table
+        counts = self._counts
+        totals = counts.diagonal().astype(np.float64)
+        selected = counts[rows]
+        group = np.repeat(np.arange(len(rows)), np.diff(selected.indptr))
+        partners, shared = selected.indices, selected.data
+        keep = (partners != rows[group]) & (shared >= self.min_customers)
+        group, partners, shared = group[keep], partners[keep], shared[keep]
+        scores = shared / np.sqrt(totals[rows[group]] * totals[partners])
+
+        # Best score first within each row; ties go to the alphabetically first
+        # book, so the order does not depend on column order
+        name_rank = np.empty(len(self._book_ids), dtype=np.int64)
+        name_rank[np.argsort(np.array(self._book_ids, dtype=str), kind="stable")] = np.arange(len(self._book_ids))
+        order = np.lexsort((name_rank[partners], -scores, group))
+        group, partners, shared, scores = group[order], partners[order], shared[order], scores[order]
+        starts = np.searchsorted(group, group, side="left")
+        top = np.flatnonzero(np.arange(len(group)) - starts < self.k)
+
+        for row, partner, score, customers in zip(
+            rows[group[top]].tolist(), partners[top].tolist(), np.round(scores[top], 4).tolist(), shared[top].tolist()
+        ):
+            table[book_ids[row]].append({"book_id": book_ids[partner], "score": score, "customers": customers})
+        return table
+
+    def table(self) -> Dict[str, List[dict]]:
+        """Every non-empty row of the current table"""
+        return {book_id: row for book_id, row in self._rank(np.arange(self._counts.shape[0])).items() if row}
+
+    def also_bought(self, book_id: str) -> List[dict]:
+        column = self._column_of.get(book_id)
+        if column is None or column >= self._counts.shape[0]:
+            return []
+        return self._rank([column])[book_id]
+
+    # Persistence
+
+    def save(self, directory: str):
+        """Write the counted orders (the counts are rebuilt from them on load)"""
+        os.makedirs(directory, exist_ok=True)
+        rooms = list(self._orders)
+        path = os.path.join(directory, STATE_FILE)
+        with open(path + ".tmp", "wb") as handle:
+            np.savez_compressed(
+                handle,
+                rooms=np.array(rooms, dtype=str),
+                customers=np.array([self._orders[room][0] for room in rooms], dtype=str),
+                books=np.array([self._orders[room][1] for room in rooms], dtype=str),
+            )
+        os.replace(path + ".tmp", path)
+
+    def load(self, directory: str) -> bool:
+        """Restore counted orders and recompute the counts; False if nothing was saved"""
+        path = os.path.join(directory, STATE_FILE)
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as state:
+                rooms, customers, books = state["rooms"], state["customers"], state["books"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load saved co-purchase orders: {e}")
+            return False
+        self.__init__(k=self.k, min_customers=self.min_customers)
+        for room_id, customer, book_id in zip(rooms.tolist(), customers.tolist(), books.tolist()):
+            self.add_order(room_id, customer, book_id)
+        self.refresh()
+        return True
@@ -0,0 +1,209 @@
+"""
+LLM Gateway
+-----------
+One pooled OpenAI client shared by every service that calls the chat API
+(sentiment analysis, recommendations, question generation), instead of a
+client per service with default connection limits and no timeouts.
+
+- The underlying HTTP connection pool, the default per-call timeout and the
+  number of requests allowed upstream at once are set from the
+  environment (LLM_MAX_CONNECTIONS, LLM_TIMEOUT_SECONDS,
+  LLM_MAX_CONCURRENCY); OPENAI_BASE_URL points the client at another
+  server, such as tests/fake_openai_server.py.
+- Identical requests made while one is already in flight (same model,
+  messages and parameters) share that request's response.
+- Calls, shared calls, errors, timeouts, tokens and latency are counted per
+  caller and reported by `stats()` (shown on /health).
+
+Services hold `get_llm_gateway().client_for("<caller>")`, which exposes the
+same `chat.completions.create(...)` call as an `openai.AsyncOpenAI` client.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_TIMEOUT_SECONDS = 20.0
+
+
+class CallerClient:
+    """`AsyncOpenAI`-shaped view of the gateway that attributes calls to one caller"""
+
+    def __init__(self, gateway: "LLMGateway", caller: str):
+        self.caller = caller
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._gateway = gateway
+
+    async def _create(self, **params):
+        return await self._gateway.complete(self.caller, **params)
+
+
+class LLMGateway:
+    """Shared chat-completions client with pooling, timeouts, a concurrency
+    limit, in-flight deduplication and per-caller metrics"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS
+    ):
+        self._api_key = api_key
+        self._base_url = base_url
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY))),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS))),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", str(DEFAULT_TIMEOUT_SECONDS)))
+        )
+
+    # The key and base URL are read when needed rather than at construction,
+    # since services may be imported before main loads the .env file
+    @property
+    def api_key(self) -> Optional[str]:
+        return self._api_key or os.getenv("OPENAI_API_KEY") or None
+
+    @property
+    def base_url(self) -> Optional[str]:
+        return self._base_url or os.getenv("OPENAI_BASE_URL") or None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def client_for(self, caller: str) -> Optional[CallerClient]:
+        """Client for `caller`, or None when no API key is configured"""
+        return CallerClient(self, caller) if self.available else None
+
+    def _get_client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=1,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    ),
+                    timeout=self.timeout
+                )
+            )
+        return self._client
+
+    @staticmethod
+    def _request_key(params: Dict[str, Any]) -> str:
+        # Excludes the timeout, which complete() applies to each caller separately
+        encoded = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    async def complete(self, caller: str, **params):
+        """`chat.completions.create(**params)` through the shared client"""
+        metrics = self._metrics[caller]
+        metrics["calls"] += 1
+        started = time.perf_counter()
+        timeout = params.pop("timeout", None)
+        timeout = self.timeout if timeout is None else timeout
+        key = self._request_key(params)
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics["shared"] += 1
+        else:
+            # The upstream call is bounded by the gateway timeout (or a longer one asked
+            # for), not by the first caller's, since later callers may wait longer
+            params["timeout"] = max(self.timeout, timeout)
+            task = asyncio.create_task(self._request(caller, params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        try:
+            # Shielded, so a caller that gives up does not cancel the request for the others
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except (openai.APITimeoutError, asyncio.TimeoutError):
+            metrics["timeouts"] += 1
+            raise
+        except Exception:
+            metrics["errors"] += 1
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            metrics["latency_seconds"] += latency
+            metrics["max_latency_seconds"] = max(metrics["max_latency_seconds"], latency)
+
+    async def _request(self, caller: str, params: Dict[str, Any]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            response = await self._get_client().chat.completions.create(**params)
+        # Tokens are charged to the caller that sent the request, not to those sharing it
+        metrics = self._metrics[caller]
+        metrics["requests"] += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics["prompt_tokens"] += usage.prompt_tokens or 0
+            metrics["completion_tokens"] += usage.completion_tokens or 0
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        callers = {}
+        for caller, metrics in self._metrics.items():
+            calls = int(metrics["calls"])
+            callers[caller] = {
+                "calls": calls,
+                "requests": int(metrics["requests"]),
+                "shared": int(metrics["shared"]),
+                "errors": int(metrics["errors"]),
+                "timeouts": int(metrics["timeouts"]),
+                "prompt_tokens": int(metrics["prompt_tokens"]),
+                "completion_tokens": int(metrics["completion_tokens"]),
+                "avg_latency_ms": round(metrics["latency_seconds"] / calls * 1000, 1) if calls else 0.0,
+                "max_latency_ms": round(metrics["max_latency_seconds"] * 1000, 1)
+            }
+        return {
+            "configured": self.available,
+            "max_concurrency": self.max_concurrency,
+            "max_connections": self.max_connections,
+            "timeout_seconds": self.timeout,
+            "in_flight": len(self._in_flight),
+            "callers": callers
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """The process-wide gateway, configured from the environment on first use"""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway.from_env()
+    return _gateway
@@ -10,8 +10,10 @@ This module implements:
 """
 
 import os
+import asyncio
 import logging
 import json
+import time
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
 from dataclasses import dataclass, asdict
@@ -19,7 +21,14 @@ from enum import Enum
 from collections import defaultdict
 
 # LLM imports
-import openai
+from services.llm_gateway import get_llm_gateway
+
+from services.catalog_search import CatalogSearchIndex
+from services.catalog_fuzzy import CatalogFuzzyMatcher
+from services.catalog_ranking import CatalogRankIndex
+from services.catalog_similarity import BookSimilarityIndex
+from services.recommendation_cache import RecommendationCache, context_fingerprint
+from services.catalog_store import CatalogCache, CatalogStore, MemoryCatalogStore, create_catalog_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -99,38 +108,137 @@ class Recommendation:
     book: Book
     confidence_score: float
     reason: str
-    recommendation_type: str  # "similar_books", "trending", "personalized", "cross_sell"
+    recommendation_type: str  # "similar_books", "co_purchase", "trending", "personalized", "cross_sell"
     discount_available: bool = False
     discount_percentage: float = 0.0
 
+# In-stock books offered to the AI per request, and how much of the
+# conversation it sees - together they bound the prompt size
+AI_CANDIDATE_BOOKS = 20
+AI_CONTEXT_CHARS = 2000
+
+# Distinct conversation words used to retrieve candidates (rarest first), skipping
+# words found in more than AI_QUERY_MAX_SHARE of the catalog
+AI_QUERY_TERMS = 12
+AI_QUERY_MAX_SHARE = 0.05
+
+AI_DESCRIPTION_CHARS = 80
+
+# Seconds an AI recommendation call may run (it can continue past the request's latency budget)
+AI_REQUEST_TIMEOUT = 15.0
+AI_CATALOG_COLUMNS = "id|title|author|genre|price|rating|description"
+
+# Similar books considered per purchased book, and the weakest cosine similarity that counts
+SIMILAR_BOOKS = 3
+MIN_SIMILARITY = 0.05
+
+BOOK_DEFAULTS = {"author": "", "rating": 0.0, "description": "", "isbn": "", "publication_year": 0, "page_count": 0}
+
+def book_to_document(book: Book) -> Dict[str, Any]:
+    """Catalog store document for a book"""
+    document = asdict(book)
+    document["genre"] = book.genre.value
+    return document
+
+def book_from_document(document: Dict[str, Any]) -> Book:
+    """Book from a catalog store document (raises ValueError/KeyError if unusable)"""
+    fields = {name: document[name] for name in Book.__dataclass_fields__ if document.get(name) is not None}
+    for name, default in BOOK_DEFAULTS.items():
+        fields.setdefault(name, default)
+    fields["genre"] = BookGenre(document["genre"])
+    fields["price"] = float(document["price"])
+    return Book(**fields)
+
+def profile_to_document(profile: CustomerProfile) -> Dict[str, Any]:
+    """Catalog store document for a customer profile"""
+    document = asdict(profile)
+    document["segment"] = profile.segment.value
+    document["favorite_genres"] = [genre.value for genre in profile.favorite_genres]
+    document["budget_range"] = list(profile.budget_range)
+    preferences = dict(profile.preferences)
+    if "preferred_genres" in preferences:
+        preferences["preferred_genres"] = [genre.value for genre in preferences["preferred_genres"]]
+    if "price_range" in preferences:
+        preferences["price_range"] = list(preferences["price_range"])
+    document["preferences"] = preferences
+    return document
+
+def profile_from_document(document: Dict[str, Any]) -> CustomerProfile:
+    """Customer profile from a catalog store document"""
+    fields = {name: document[name] for name in CustomerProfile.__dataclass_fields__ if name in document}
+    fields["segment"] = CustomerSegment(document["segment"])
+    fields["favorite_genres"] = [BookGenre(genre) for genre in document.get("favorite_genres", [])]
+    fields["budget_range"] = tuple(document["budget_range"])
+    preferences = dict(document.get("preferences") or {})
+    if "preferred_genres" in preferences:
+        preferences["preferred_genres"] = [BookGenre(genre) for genre in preferences["preferred_genres"]]
+    if "price_range" in preferences:
+        preferences["price_range"] = tuple(preferences["price_range"])
+    fields["preferences"] = preferences
+    return CustomerProfile(**fields)
+
+def book_prompt_line(book: Book) -> str:
+    """One compact AI_CATALOG_COLUMNS line describing a book"""
+    description = book.description or ""
+    if len(description) > AI_DESCRIPTION_CHARS:
+        description = description[:AI_DESCRIPTION_CHARS].rsplit(" ", 1)[0] + "..."
+    fields = [book.book_id, book.title, book.author, book.genre.value, f"{book.price:.2f}", f"{book.rating:.1f}", description]
+    return "|".join(" ".join(str(field).replace("|", "/").split()) for field in fields)
+
+
 class ProductRecommendationEngine:
     """
     Advanced product recommendation engine with CRM integration
+    
+    Books and customer profiles live in a CatalogStore. The engine keeps the
+    search index and fuzzy matcher in process (built by streaming the store
+    and kept current from its change log), the similar-books index (loaded
+    from disk, or built by a background task) and a bounded cache of Book
+    objects rather than every Book.
     """
     
-    def __init__(self):
+    def __init__(self, catalog_store: Optional[CatalogStore] = None):
         self.openai_client = None
-        self.book_catalog: Dict[str, Book] = {}
-        self.customer_profiles: Dict[str, CustomerProfile] = {}
         self.recommendation_history: Dict[str, List[Recommendation]] = {}
+        self.search_index = CatalogSearchIndex()
+        self.fuzzy_matcher = CatalogFuzzyMatcher()
+        self.rank_index = CatalogRankIndex()
+        self.similarity = BookSimilarityIndex(directory=os.getenv("BOOK_SIMILARITY_DIR") or None)
+        self._similarity_lock = asyncio.Lock()
+        self._similarity_build: Optional[asyncio.Task] = None
+        self._catalog_reload: Optional[asyncio.Task] = None
+        self.catalog_version = 0  # store version the indexes reflect
+        self.catalog_loaded = False
+        self.catalog_sync_interval = float(os.getenv("CATALOG_SYNC_SECONDS", "5"))
+        self._last_catalog_sync = 0.0
+        self._prompt_lines: Dict[str, Tuple[Book, str]] = {}  # book_id -> (cached Book, prompt line)
+        # Seconds get_recommendations waits before answering without the AI strategy
+        self.latency_budget = float(os.getenv("RECOMMENDATION_BUDGET_SECONDS", "0.5"))
+        self._pending_ai: Dict[tuple, asyncio.Task] = {}
+        self.recommendation_cache = RecommendationCache(
+            maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "30"))
+        )
         
         # Initialize with sample data
-        self._initialize_sample_data()
+        self._initialize_sample_data(catalog_store)
+        self.book_cache = CatalogCache(
+            self.catalog_store, book_from_document, maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "10000"))
+        )
         self._initialize_openai()
     
     def _initialize_openai(self):
         """Initialize OpenAI client for advanced recommendations"""
         try:
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if openai_api_key:
-                self.openai_client = openai.AsyncOpenAI(api_key=openai_api_key)
+            if get_llm_gateway().available:
+                self.openai_client = get_llm_gateway().client_for("recommendations")
                 logger.info("OpenAI client initialized for product recommendations")
             else:
                 logger.warning("OpenAI API key not found - using rule-based recommendations only")
         except Exception as e:
             logger.error(f"Error initializing OpenAI: {e}")
     
-    def _initialize_sample_data(self):
+    def _initialize_sample_data(self, catalog_store: Optional[CatalogStore] = None):
         """Initialize with sample book catalog and customer data"""
         # Sample book catalog
         sample_books = [
@@ -248,13 +356,6 @@ class ProductRecommendationEngine:
             )
         ]
         
-        # Add to catalog
-        for book in sample_books:
-            self.book_catalog[book.book_id] = book
-        
-        # Set up similar books relationships
-        self._setup_similar_books()
-        
         # Sample customer profiles
         sample_customers = [
             CustomerProfile(
@@ -305,75 +406,259 @@ class ProductRecommendationEngine:
             )
         ]
         
-        for customer in sample_customers:
-            self.customer_profiles[customer.customer_id] = customer
-    
-    def _setup_similar_books(self):
-        """Set up similar books relationships for recommendations"""
-        # Define similar books based on genre, themes, and author
-        similar_books_map = {
-            "BK001": ["BK003", "BK007"],  # Classic fiction
-            "BK002": ["BK004"],  # Self-help/business
-            "BK003": ["BK001", "BK007"],  # Classic fiction
-            "BK004": ["BK002"],  # Self-help
-            "BK005": ["BK003"],  # Thriller/mystery
-            "BK006": ["BK008"],  # Non-fiction
-            "BK007": ["BK001", "BK003"],  # Fiction
-            "BK008": ["BK006"]  # Biography/history
-        }
-        
-        for book_id, similar_ids in similar_books_map.items():
-            if book_id in self.book_catalog:
-                self.book_catalog[book_id].similar_books = similar_ids
+        self._sample_books = sample_books
+        self._sample_customers = sample_customers
+        self.catalog_store = catalog_store or create_catalog_store(
+            [book_to_document(book) for book in sample_books],
+            [profile_to_document(customer) for customer in sample_customers]
+        )
+        if catalog_store is None and isinstance(self.catalog_store, MemoryCatalogStore):
+            # The store holds exactly the sample books - index them directly
+            self.search_index.rebuild(sample_books)
+            self.fuzzy_matcher.rebuild(sample_books)
+            self.rank_index.rebuild(sample_books)
+            self.similarity.rebuild(sample_books)
+            self.catalog_loaded = True
+    
+    async def connect_catalog(self):
+        """Connect the catalog store, seed an empty one with the sample data, and build the indexes"""
+        await self.catalog_store.connect()
+        if self.catalog_loaded:
+            return
+        if await self.catalog_store.count_books() == 0:
+            logger.info("Catalog store is empty - seeding it with the sample catalog")
+            await self.catalog_store.upsert_books([book_to_document(book) for book in self._sample_books])
+            for customer in self._sample_customers:
+                await self.catalog_store.upsert_customer_profile(profile_to_document(customer))
+        await self.load_catalog()
+    
+    async def load_catalog(self, batch_size: int = 5000):
+        """Rebuild the in-process indexes by streaming every book from the store"""
+        version = await self.catalog_store.version()
+        search_index, fuzzy_matcher, rank_index = CatalogSearchIndex(), CatalogFuzzyMatcher(), CatalogRankIndex()
+        similarity = await self._restore_similarity(version)
+        count = 0
+        async for documents in self.catalog_store.iter_books(batch_size):
+            books = self._decode_books(documents)
+            search_index.extend(books)
+            fuzzy_matcher.extend(books)
+            rank_index.extend(books)
+            count += len(books)
+        search_index.version = self.search_index.version + 1
+        self.search_index, self.fuzzy_matcher, self.rank_index = search_index, fuzzy_matcher, rank_index
+        if similarity is not None:
+            self.similarity = similarity
+        else:
+            # No usable saved index: compute it in the background; until it is swapped in,
+            # similar-book recommendations use the current (possibly empty) index
+            self._start_similarity_build()
+        self.book_cache.invalidate()
+        self.recommendation_cache.clear()
+        self.catalog_version = version
+        self.catalog_loaded = True
+        self._last_catalog_sync = time.monotonic()
+        logger.info(f"Indexed {count} catalog books (version {version})")
+    
+    async def _restore_similarity(self, version: int) -> Optional[BookSimilarityIndex]:
+        """Saved similarity index brought up to `version`, or None when it has to be rebuilt"""
+        similarity = BookSimilarityIndex(directory=self.similarity.directory)
+        saved_version = similarity.load()
+        if saved_version is None:
+            return None
+        if saved_version == version:
+            return similarity
+        try:
+            caught_up, changed = await self.catalog_store.changes_since(saved_version)
+            if changed is not None and caught_up == version and len(changed) < len(similarity):
+                documents = await self.catalog_store.get_books(changed)
+                books = self._decode_books(documents.values())
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, similarity.update, books)
+                similarity.remove(book_id for book_id in changed if book_id not in documents)
+                similarity.save(version)
+                logger.info(f"Reused saved book similarity index (caught up {len(changed)} changed books)")
+                return similarity
+        except Exception as e:
+            logger.warning(f"Could not catch up saved book similarity index: {e}")
+        return None
+    
+    def _start_similarity_build(self):
+        if self._similarity_build is None or self._similarity_build.done():
+            self._similarity_build = asyncio.create_task(self.build_similarity())
+    
+    async def build_similarity(self, batch_size: int = 5000):
+        """Compute every book's similar books from the store and swap the result in (and save it)"""
+        try:
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            version = await self.catalog_store.version()
+            similarity = BookSimilarityIndex(directory=self.similarity.directory)
+            async for documents in self.catalog_store.iter_books(batch_size):
+                similarity.add_vectors(self._decode_books(documents))
+            # CPU bound - keep it off the event loop
+            await loop.run_in_executor(None, similarity.compute_neighbors)
+            async with self._similarity_lock:
+                # Apply the changes made while it was computed; later ones arrive through _index_books
+                version, changed = await self.catalog_store.changes_since(version)
+                if changed is None:
+                    logger.warning("Catalog change log no longer covers the similarity build - some books may be stale")
+                elif changed:
+                    documents = await self.catalog_store.get_books(changed)
+                    await loop.run_in_executor(None, similarity.update, self._decode_books(documents.values()))
+                    similarity.remove(book_id for book_id in changed if book_id not in documents)
+                await loop.run_in_executor(None, similarity.save, version)
+                self.similarity = similarity
+            self.recommendation_cache.clear()
+            logger.info(f"Built book similarity index for {len(similarity)} books in {time.perf_counter() - started:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error building book similarity index: {e}")
+    
+    async def sync_catalog(self, force: bool = False):
+        """Apply catalog changes made by other processes (at most every catalog_sync_interval seconds)"""
+        if not force and time.monotonic() - self._last_catalog_sync < self.catalog_sync_interval:
+            return
+        self._last_catalog_sync = time.monotonic()
+        try:
+            version, changed = await self.catalog_store.changes_since(self.catalog_version)
+            if changed is None:
+                # Too far behind the change log: re-index in the background (not in the request)
+                self._start_catalog_reload()
+                return
+            if changed:
+                self.book_cache.invalidate(changed)
+                documents = await self.catalog_store.get_books(changed)
+                await self._index_books(self._decode_books(documents.values()), [book_id for book_id in changed if book_id not in documents])
+            self.catalog_version = version
+        except Exception as e:
+            logger.error(f"Error syncing catalog changes: {e}")
+    
+    def _start_catalog_reload(self):
+        if self._catalog_reload is None or self._catalog_reload.done():
+            self._catalog_reload = asyncio.create_task(self._reload_catalog())
+    
+    async def _reload_catalog(self):
+        try:
+            await self.load_catalog()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error reloading catalog: {e}")
+    
+    @staticmethod
+    def _decode_books(documents) -> List[Book]:
+        books = []
+        for document in documents:
+            try:
+                books.append(book_from_document(document))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping invalid catalog book {document.get('book_id')}: {e}")
+        return books
+    
+    async def _index_books(self, books: List[Book], removed_ids: List[str] = ()):
+        # Any catalog change can alter what each strategy returns
+        self.recommendation_cache.clear()
+        if books:
+            self.search_index.extend(books)
+            self.fuzzy_matcher.extend(books)
+            self.rank_index.extend(books)
+        for book_id in removed_ids:
+            self.search_index.remove(book_id)
+            self.fuzzy_matcher.remove(book_id)
+            self.rank_index.remove(book_id)
+        async with self._similarity_lock:
+            similarity = self.similarity
+            if books:
+                # Scores the changed rows against the books sharing their terms - run it off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, similarity.update, books)
+            similarity.remove(removed_ids)
+    
+    async def close_catalog(self):
+        """Persist the similarity index and disconnect the catalog store"""
+        for task in (self._similarity_build, self._catalog_reload):
+            if task is not None and not task.done():
+                task.cancel()
+        try:
+            # Skip an index never built or loaded (one still being built would be saved as up
+            # to date); a background build may have caught it up past the engine's version
+            if self.similarity.catalog_version is not None:
+                self.similarity.save(max(self.catalog_version, self.similarity.catalog_version))
+        except Exception as e:
+            logger.error(f"Error saving book similarity index: {e}")
+        await self.catalog_store.disconnect()
+    
+    async def _get_books(self, book_ids: List[str]) -> List[Book]:
+        """Books in `book_ids` order, skipping ids no longer in the catalog"""
+        books = await self.book_cache.get_many(book_ids)
+        return [books[book_id] for book_id in book_ids if book_id in books]
     
     async def get_recommendations(self, customer_id: str, conversation_context: str = "", 
                                 max_recommendations: int = 5) -> List[Recommendation]:
         """
         Get personalized product recommendations for a customer
         """
+        started = time.monotonic()
         try:
+            await self.sync_catalog()
+            
+            # Only the AI strategy reads the conversation; without it the context cannot change the result
+            fingerprint = context_fingerprint(conversation_context[-AI_CONTEXT_CHARS:]) if self.openai_client else ""
+            cache_key = (customer_id, fingerprint, max_recommendations, self.catalog_version)
+            cached = self.recommendation_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+            
             # Get customer profile
-            customer = self.customer_profiles.get(customer_id)
+            customer = await self.get_customer_profile(customer_id)
             if not customer:
                 # Create new customer profile if not found
                 customer = await self._create_new_customer_profile(customer_id)
             
-            # Generate recommendations using multiple strategies
-            recommendations = []
-            
-            # 1. Personalized recommendations based on history
-            personalized_recs = await self._get_personalized_recommendations(customer, max_recommendations)
-            recommendations.extend(personalized_recs)
-            
-            # 2. Genre-based recommendations
-            genre_recs = await self._get_genre_based_recommendations(customer, max_recommendations)
-            recommendations.extend(genre_recs)
-            
-            # 3. Trending/popular books
-            trending_recs = await self._get_trending_recommendations(max_recommendations)
-            recommendations.extend(trending_recs)
-            
-            # 4. AI-powered contextual recommendations
+            # The AI strategy may outlive this request: it is shared by identical
+            # requests while running and fills the cache when it finishes late
+            ai_task = None
             if self.openai_client and conversation_context:
-                ai_recs = await self._get_ai_contextual_recommendations(
-                    customer, conversation_context, max_recommendations
-                )
-                recommendations.extend(ai_recs)
+                ai_task = self._pending_ai.get(cache_key)
+                if ai_task is None:
+                    ai_task = asyncio.create_task(self._get_ai_contextual_recommendations(
+                        customer, conversation_context, max_recommendations
+                    ))
+                    self._pending_ai[cache_key] = ai_task
+                    ai_task.add_done_callback(lambda _, key=cache_key: self._pending_ai.pop(key, None))
             
-            # Remove duplicates and sort by confidence
-            unique_recommendations = self._deduplicate_recommendations(recommendations)
-            sorted_recommendations = sorted(
-                unique_recommendations, 
-                key=lambda x: x.confidence_score, 
-                reverse=True
+            # Rule-based strategies run concurrently: personalized history, co-purchases,
+            # favorite genres and trending books
+            strategy_results = await asyncio.gather(
+                self._get_personalized_recommendations(customer, max_recommendations),
+                self._get_co_purchase_recommendations(customer, max_recommendations),
+                self._get_genre_based_recommendations(customer, max_recommendations),
+                self._get_trending_recommendations(max_recommendations)
             )
+            rule_based = [rec for recs in strategy_results for rec in recs]
+            
+            # AI-powered contextual recommendations, if they arrive within the latency budget
+            ai_recs = []
+            if ai_task is not None:
+                remaining = self.latency_budget - (time.monotonic() - started)
+                try:
+                    ai_recs = await asyncio.wait_for(asyncio.shield(ai_task), timeout=max(remaining, 0.0))
+                except asyncio.TimeoutError:
+                    logger.info(f"AI recommendations for {customer_id} missed the latency budget - returning rule-based results")
+                    generation = self.recommendation_cache.generation
+                    ai_task.add_done_callback(lambda task: self._cache_enriched(
+                        task, cache_key, customer_id, rule_based, max_recommendations, generation
+                    ))
+            
+            top_recommendations = self._rank_recommendations(rule_based + ai_recs, max_recommendations)
             
             # Store recommendation history
             if customer_id not in self.recommendation_history:
                 self.recommendation_history[customer_id] = []
-            self.recommendation_history[customer_id].extend(sorted_recommendations[:max_recommendations])
+            self.recommendation_history[customer_id].extend(top_recommendations)
             
-            return sorted_recommendations[:max_recommendations]
+            self.recommendation_cache.put(cache_key, customer_id, top_recommendations)
+            return top_recommendations
             
         except Exception as e:
             logger.error(f"Error generating recommendations: {e}")
@@ -407,14 +692,20 @@ class ProductRecommendationEngine:
         recommendations = []
         
         # Get books similar to previously purchased books
+        purchased = await self.book_cache.get_many(purchase["book_id"] for purchase in customer.purchase_history)
+        for book in purchased.values():
+            book.similar_books = self._similar_book_ids(book.book_id)
+        similar = await self.book_cache.get_many(
+            similar_id for book in purchased.values() for similar_id in book.similar_books
+        )
         for purchase in customer.purchase_history:
             book_id = purchase["book_id"]
-            if book_id in self.book_catalog:
-                book = self.book_catalog[book_id]
+            if book_id in purchased:
+                book = purchased[book_id]
                 if book.similar_books:
                     for similar_id in book.similar_books:
-                        if similar_id in self.book_catalog:
-                            similar_book = self.book_catalog[similar_id]
+                        if similar_id in similar:
+                            similar_book = similar[similar_id]
                             if similar_book.availability and similar_book.stock_quantity > 0:
                                 rec = Recommendation(
                                     book=similar_book,
@@ -426,22 +717,58 @@ class ProductRecommendationEngine:
         
         return recommendations[:max_recs]
     
+    async def _get_co_purchase_recommendations(self, customer: CustomerProfile,
+                                             max_recs: int) -> List[Recommendation]:
+        """Recommend what customers with the same purchases also bought (precomputed table lookup)"""
+        purchased = [purchase["book_id"] for purchase in customer.purchase_history if purchase.get("book_id")]
+        if not purchased:
+            return []
+        rows = await self.catalog_store.get_co_purchases(purchased)
+        scores: Dict[str, float] = defaultdict(float)
+        bought_with: Dict[str, str] = {}
+        for book_id in purchased:
+            for entry in rows.get(book_id, []):
+                if entry["book_id"] not in purchased:
+                    scores[entry["book_id"]] += entry["score"]
+                    bought_with.setdefault(entry["book_id"], book_id)
+        
+        ranked = sorted(scores, key=lambda book_id: -scores[book_id])
+        books = await self.book_cache.get_many(ranked + list(set(bought_with.values())))
+        recommendations = []
+        for book_id in ranked:
+            book, source = books.get(book_id), books.get(bought_with[book_id])
+            if book is None or source is None or not (book.availability and book.stock_quantity > 0):
+                continue
+            recommendations.append(Recommendation(
+                book=book,
+                confidence_score=0.75,
+                reason=f"Customers who bought '{source.title}' also bought this",
+                recommendation_type="co_purchase"
+            ))
+            if len(recommendations) >= max_recs:
+                break
+        return recommendations
+    
+    async def get_also_bought(self, book_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Top "customers also bought" entries for a book (from the precomputed table)"""
+        rows = await self.catalog_store.get_co_purchases([book_id])
+        return rows.get(book_id, [])[:limit]
+    
     async def _get_genre_based_recommendations(self, customer: CustomerProfile, 
                                              max_recs: int) -> List[Recommendation]:
         """Generate recommendations based on customer's favorite genres"""
         recommendations = []
         
-        # Get books from favorite genres
+        # Get books from favorite genres, best rated within budget first
         for genre in customer.favorite_genres:
-            genre_books = [book for book in self.book_catalog.values() 
-                          if book.genre == genre and book.availability and book.stock_quantity > 0]
-            
-            # Sort by rating and price within budget
-            genre_books = [book for book in genre_books 
-                          if customer.budget_range[0] <= book.price <= customer.budget_range[1]]
-            genre_books.sort(key=lambda x: (x.rating, -x.price), reverse=True)
+            genre_books = await self._find_books(
+                genre=genre.value,
+                min_price=customer.budget_range[0],
+                max_price=customer.budget_range[1],
+                limit=max_recs
+            )
             
-            for book in genre_books[:max_recs]:
+            for book in genre_books:
                 rec = Recommendation(
                     book=book,
                     confidence_score=0.7,
@@ -457,11 +784,9 @@ class ProductRecommendationEngine:
         recommendations = []
         
         # Get top-rated books with good stock
-        trending_books = [book for book in self.book_catalog.values() 
-                         if book.availability and book.stock_quantity > 0 and book.rating >= 4.0]
-        trending_books.sort(key=lambda x: (x.rating, -x.price), reverse=True)
+        trending_books = await self._find_books(min_rating=4.0, limit=max_recs)
         
-        for book in trending_books[:max_recs]:
+        for book in trending_books:
             rec = Recommendation(
                 book=book,
                 confidence_score=0.6,
@@ -480,19 +805,12 @@ class ProductRecommendationEngine:
             return []
         
         try:
-            # Prepare book catalog summary for AI
-            catalog_summary = []
-            for book in self.book_catalog.values():
-                if book.availability and book.stock_quantity > 0:
-                    catalog_summary.append({
-                        "id": book.book_id,
-                        "title": book.title,
-                        "author": book.author,
-                        "genre": book.genre.value,
-                        "price": book.price,
-                        "rating": book.rating,
-                        "description": book.description[:100] + "..."
-                    })
+            # Offer the AI only the books relevant to this conversation, one compact line each
+            conversation_context = conversation_context[-AI_CONTEXT_CHARS:]
+            candidates = await self._candidate_books(customer, conversation_context)
+            if not candidates:
+                return []
+            catalog_fragment = self._catalog_fragment(candidates)
             
             # Create AI prompt
             prompt = f"""
@@ -507,8 +825,8 @@ class ProductRecommendationEngine:
             
             Conversation Context: {conversation_context}
             
-            Available Books:
-            {json.dumps(catalog_summary, indent=2)}
+            Available Books ({AI_CATALOG_COLUMNS}):
+            {catalog_fragment}
             
             Return a JSON response with up to {max_recs} recommendations:
             {{
@@ -530,7 +848,8 @@ class ProductRecommendationEngine:
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=500,
-                temperature=0.3
+                temperature=0.3,
+                timeout=AI_REQUEST_TIMEOUT
             )
             
             content = response.choices[0].message.content
@@ -538,10 +857,12 @@ class ProductRecommendationEngine:
             
             # Convert AI recommendations to our format
             recommendations = []
-            for rec_data in ai_result.get("recommendations", []):
+            recommended = ai_result.get("recommendations", [])
+            books = await self.book_cache.get_many(rec_data.get("book_id") for rec_data in recommended)
+            for rec_data in recommended:
                 book_id = rec_data.get("book_id")
-                if book_id in self.book_catalog:
-                    book = self.book_catalog[book_id]
+                if book_id in books:
+                    book = books[book_id]
                     rec = Recommendation(
                         book=book,
                         confidence_score=rec_data.get("confidence_score", 0.7),
@@ -556,55 +877,177 @@ class ProductRecommendationEngine:
             logger.error(f"Error in AI contextual recommendations: {e}")
             return []
     
-    def _deduplicate_recommendations(self, recommendations: List[Recommendation]) -> List[Recommendation]:
-        """Remove duplicate recommendations based on book_id"""
-        seen_books = set()
-        unique_recommendations = []
+    async def _candidate_books(self, customer: CustomerProfile, conversation_context: str) -> List[Book]:
+        """Up to AI_CANDIDATE_BOOKS in-stock books for the AI: titles mentioned in the
+        conversation, then search hits for its most distinctive words, then the
+        customer's favorite genres within budget and the top-rated books"""
+        book_ids = [match.book_id for match in self.fuzzy_matcher.find_mentions(conversation_context)]
+        query = " ".join(self.search_index.key_terms(conversation_context, AI_QUERY_TERMS, AI_QUERY_MAX_SHARE))
+        if query:
+            book_ids.extend(book_id for book_id, _ in self.search_index.search(query, limit=AI_CANDIDATE_BOOKS, prefix=False))
+        book_ids = list(dict.fromkeys(book_ids))
         
+        books = [book for book in await self._get_books(book_ids) if book.availability and book.stock_quantity > 0]
+        for genre in customer.favorite_genres:
+            if len(books) >= AI_CANDIDATE_BOOKS:
+                break
+            books.extend(await self._find_books(
+                genre=genre.value, min_price=customer.budget_range[0], max_price=customer.budget_range[1], limit=AI_CANDIDATE_BOOKS
+            ))
+        if len(books) < AI_CANDIDATE_BOOKS:
+            books.extend(await self._find_books(limit=AI_CANDIDATE_BOOKS))
+        return list({book.book_id: book for book in books}.values())[:AI_CANDIDATE_BOOKS]
+    
+    def _catalog_fragment(self, books: List[Book]) -> str:
+        """Prompt lines for `books`; a line is reused until the cache hands out a new Book for it"""
+        lines = []
+        for book in books:
+            cached = self._prompt_lines.get(book.book_id)
+            if cached is None or cached[0] is not book:
+                if len(self._prompt_lines) >= self.book_cache.maxsize:
+                    self._prompt_lines.clear()
+                cached = self._prompt_lines[book.book_id] = (book, book_prompt_line(book))
+            lines.append(cached[1])
+        return "\n".join(lines)
+    
+    def _rank_recommendations(self, recommendations: List[Recommendation], max_recs: int) -> List[Recommendation]:
+        """Remove duplicates and keep the most confident"""
+        unique_recommendations = self._deduplicate_recommendations(recommendations)
+        return sorted(unique_recommendations, key=lambda x: x.confidence_score, reverse=True)[:max_recs]
+    
+    def _cache_enriched(self, task: asyncio.Task, cache_key: tuple, customer_id: str,
+                        rule_based: List[Recommendation], max_recs: int, generation: int):
+        """Replace the cached rule-based list once a late AI result arrives"""
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+        if self.recommendation_cache.generation != generation:
+            return  # the catalog or profile changed meanwhile; the next request recomputes
+        self.recommendation_cache.put(cache_key, customer_id, self._rank_recommendations(rule_based + task.result(), max_recs))
+    
+    def ai_pending(self, customer_id: str) -> bool:
+        """Whether AI recommendations for this customer are still being generated"""
+        return any(key[0] == customer_id for key in self._pending_ai)
+    
+    def _deduplicate_recommendations(self, recommendations: List[Recommendation]) -> List[Recommendation]:
+        """Remove duplicate recommendations based on book_id, keeping the most confident one"""
+        best: Dict[str, Recommendation] = {}
         for rec in recommendations:
-            if rec.book.book_id not in seen_books:
-                seen_books.add(rec.book.book_id)
-                unique_recommendations.append(rec)
+            current = best.get(rec.book.book_id)
+            if current is None or rec.confidence_score > current.confidence_score:
+                best[rec.book.book_id] = rec
         
-        return unique_recommendations
+        return list(best.values())
     
     async def get_book_by_id(self, book_id: str) -> Optional[Book]:
         """Get a specific book by ID"""
-        return self.book_catalog.get(book_id)
+        await self.sync_catalog()
+        book = await self.book_cache.get(book_id)
+        if book is not None:
+            book.similar_books = self._similar_book_ids(book_id)
+        return book
+    
+    def _similar_book_ids(self, book_id: str) -> List[str]:
+        """Most similar books by content, strongest first"""
+        return [
+            similar_id for similar_id, score in self.similarity.neighbors(book_id, k=SIMILAR_BOOKS)
+            if score >= MIN_SIMILARITY
+        ]
+    
+    async def _find_books(self, genre: Optional[str] = None, min_price: Optional[float] = None,
+                          max_price: Optional[float] = None, min_rating: Optional[float] = None,
+                          limit: Optional[int] = None) -> List[Book]:
+        """In-stock books, best rated first"""
+        if self.catalog_loaded:
+            book_ids = self.rank_index.find(
+                genre=genre, min_price=min_price, max_price=max_price, min_rating=min_rating, limit=limit
+            )
+            return await self._get_books(book_ids)
+        documents = await self.catalog_store.find_books(
+            genre=genre, min_price=min_price, max_price=max_price, min_rating=min_rating, limit=limit
+        )
+        return self._decode_books(documents)
     
     async def search_books(self, query: str, genre: Optional[BookGenre] = None, 
-                          max_price: Optional[float] = None) -> List[Book]:
-        """Search books by title, author, or description"""
-        results = []
-        query_lower = query.lower()
-        
-        for book in self.book_catalog.values():
-            if not book.availability or book.stock_quantity <= 0:
-                continue
-            
-            # Check genre filter
-            if genre and book.genre != genre:
-                continue
-            
-            # Check price filter
-            if max_price and book.price > max_price:
-                continue
-            
-            # Check if query matches title, author, or description
-            if (query_lower in book.title.lower() or 
-                query_lower in book.author.lower() or 
-                query_lower in book.description.lower()):
-                results.append(book)
+                          max_price: Optional[float] = None, limit: Optional[int] = None) -> List[Book]:
+        """Search in-stock books by title, author, tags or description, best match first"""
+        await self.sync_catalog()
+        ranked = self.search_index.search(
+            query,
+            genre=genre.value if genre else None,
+            max_price=max_price,
+            limit=limit
+        )
+        if ranked:
+            return await self._get_books([book_id for book_id, _ in ranked])
         
-        # Sort by relevance (rating and price)
-        results.sort(key=lambda x: (x.rating, -x.price), reverse=True)
-        return results
+        # Nothing matched literally - try the query as a misspelled title/author
+        books = []
+        matches = self.fuzzy_matcher.match(query, limit=limit or 5)
+        for book in await self._get_books([match.book_id for match in matches]):
+            if (book.availability and book.stock_quantity > 0
+                    and (genre is None or book.genre == genre)
+                    and (max_price is None or book.price <= max_price)):
+                books.append(book)
+        return books
+    
+    # The resolvers below are synchronous and a cache miss goes to the store
+    # with a blocking read, so never call them on the event loop: callers run
+    # them via asyncio.to_thread or an executor.
+    def resolve_book(self, text: str, min_score: float = 0.6) -> Optional[Book]:
+        """Catalog book a (possibly misspelled) title span refers to"""
+        match = self.fuzzy_matcher.best_match(text, min_score=min_score)
+        if match is None or match.field != "title":
+            return None
+        return self.book_cache.get_blocking(match.book_id)
+    
+    def resolve_author(self, text: str, min_score: float = 0.6) -> Optional[str]:
+        """Catalog spelling of a (possibly misspelled) author name"""
+        match = self.fuzzy_matcher.best_match(text, min_score=min_score)
+        if match is None or match.field != "author":
+            return None
+        book = self.book_cache.get_blocking(match.book_id)
+        return book.author if book else None
+    
+    def find_books_in_text(self, text: str) -> List[Book]:
+        """Catalog books whose titles are mentioned in free text"""
+        book_ids = [match.book_id for match in self.fuzzy_matcher.find_mentions(text)]
+        books = self.book_cache.get_many_blocking(book_ids) if book_ids else {}
+        return [books[book_id] for book_id in book_ids if book_id in books]
+    
+    async def upsert_books(self, books: List[Book]) -> int:
+        """Add or replace catalog books in the store and re-index them"""
+        stored = await self.catalog_store.upsert_books([book_to_document(book) for book in books])
+        self.book_cache.invalidate(book.book_id for book in books)
+        await self._index_books(books)
+        return stored
+    
+    async def upsert_book(self, book: Book):
+        """Add or replace a catalog book and re-index it"""
+        await self.upsert_books([book])
+    
+    async def update_stock(self, book_id: str, stock_quantity: int, availability: Optional[bool] = None) -> bool:
+        """Record a stock level change; the indexes only flip the book's in-stock flag"""
+        if not await self.catalog_store.set_stock(book_id, stock_quantity, availability):
+            return False
+        self.book_cache.invalidate([book_id])
+        book = await self.book_cache.get(book_id)
+        in_stock = book is not None and book.availability and book.stock_quantity > 0
+        self.search_index.set_stock(book_id, in_stock)
+        self.rank_index.set_stock(book_id, in_stock)
+        self.recommendation_cache.clear()
+        return True
+    
+    async def remove_book(self, book_id: str) -> bool:
+        """Remove a book from the catalog store and the indexes"""
+        removed = await self.catalog_store.delete_book(book_id)
+        self.book_cache.invalidate([book_id])
+        await self._index_books([], [book_id])
+        return removed
     
     async def update_customer_profile(self, customer_id: str, purchase_data: Dict[str, Any]):
         """Update customer profile with new purchase data"""
-        if customer_id in self.customer_profiles:
-            customer = self.customer_profiles[customer_id]
-            
+        customer = await self.get_customer_profile(customer_id)
+        if customer is not None:
             # Add to purchase history
             customer.purchase_history.append(purchase_data)
             
@@ -617,10 +1060,8 @@ class ProductRecommendationEngine:
             customer.average_order_value = total_value / customer.total_purchases
             
             # Update preferences based on purchase
-            book_id = purchase_data.get("book_id")
-            if book_id in self.book_catalog:
-                book = self.book_catalog[book_id]
-                
+            book = await self.book_cache.get(purchase_data.get("book_id"))
+            if book is not None:
                 # Add to favorite authors if not already there
                 if book.author not in customer.favorite_authors:
                     customer.favorite_authors.append(book.author)
@@ -628,14 +1069,18 @@ class ProductRecommendationEngine:
                 # Add to favorite genres if not already there
                 if book.genre not in customer.favorite_genres:
                     customer.favorite_genres.append(book.genre)
+            
+            await self.catalog_store.upsert_customer_profile(profile_to_document(customer))
+            self.recommendation_cache.invalidate_customer(customer_id)
     
-    def get_customer_profile(self, customer_id: str) -> Optional[CustomerProfile]:
+    async def get_customer_profile(self, customer_id: str) -> Optional[CustomerProfile]:
         """Get customer profile by ID"""
-        return self.customer_profiles.get(customer_id)
+        document = await self.catalog_store.get_customer_profile(customer_id)
+        return profile_from_document(document) if document else None
     
-    def get_all_books(self) -> List[Book]:
-        """Get all available books"""
-        return [book for book in self.book_catalog.values() if book.availability and book.stock_quantity > 0]
+    async def get_all_books(self, limit: Optional[int] = None) -> List[Book]:
+        """Get available books, best rated first"""
+        return await self._find_books(limit=limit)
 
 # Global recommendation engine instance
 recommendation_engine = ProductRecommendationEngine()
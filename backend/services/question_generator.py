@@ -13,14 +13,17 @@ import os
 import logging
 import json
 import re
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Any
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 import random
 
 # LLM imports
-import openai
+from services.llm_gateway import get_llm_gateway
+
+from utils.keyword_matcher import KeywordMatcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -55,6 +58,30 @@ class ObjectionType(Enum):
     COMPETITOR_OBJECTION = "competitor_objection"
     BUDGET_OBJECTION = "budget_objection"
 
+# Conversation topic keywords (whole words/phrases), compiled once
+TOPIC_KEYWORDS = {
+    "fiction": ["fiction", "novel", "novels", "story", "character", "characters"],
+    "non-fiction": ["non-fiction", "fact", "facts", "real", "true story"],
+    "mystery": ["mystery", "mysteries", "thriller*", "suspense", "crime"],
+    "romance": ["romance", "love", "relationship*", "romantic"],
+    "business": ["business", "finance", "money", "investment*"],
+    "self-help": ["self-help", "motivation", "improvement", "personal development"],
+    "price": ["price*", "cost*", "expensive", "cheap", "budget"],
+    "author": ["author*", "writer*", "wrote"],
+    "genre": ["genre*", "type", "category", "kind"]
+}
+TOPIC_MATCHER = KeywordMatcher(TOPIC_KEYWORDS)
+
+# Objection phrases per type, in detection priority order
+OBJECTION_TYPE_KEYWORDS = {
+    ObjectionType.PRICE_OBJECTION: ["too expensive", "too much", "can't afford", "price*", "cost*"],
+    ObjectionType.NEED_OBJECTION: ["don't need", "not interested", "not looking for"],
+    ObjectionType.TRUST_OBJECTION: ["not sure", "don't know", "unfamiliar", "never heard"],
+    ObjectionType.TIME_OBJECTION: ["no time", "busy", "later", "not now"],
+    ObjectionType.AUTHORITY_OBJECTION: ["need to ask", "check with", "think about"]
+}
+OBJECTION_TYPE_MATCHER = KeywordMatcher({t.value: k for t, k in OBJECTION_TYPE_KEYWORDS.items()})
+
 @dataclass
 class Question:
     """Question data structure"""
@@ -67,6 +94,7 @@ class Question:
     follow_up_questions: List[str] = None
     success_indicators: List[str] = None
     objection_handling: bool = False
+    topic: Optional[str] = None  # conversation topic the question suits; derived from its text when unset
 
 @dataclass
 class ObjectionResponse:
@@ -86,11 +114,82 @@ class ConversationContext:
     purchase_intent: float
     objection_level: float
     trust_level: float
-    topics_discussed: List[str]
+    topics_discussed: List[str]  # distinct topics, in the order first mentioned
     questions_asked: List[str]
-    customer_responses: List[str]
+    customer_responses: Deque[str]  # the latest MAX_CUSTOMER_RESPONSES
     current_topic: str
     conversation_duration: float  # in minutes
+    asked_question_ids: Set[str] = field(default_factory=set)
+    topic_counts: Counter = field(default_factory=Counter)  # topic -> messages mentioning it
+    responses_seen: int = 0
+    history_cursor: int = 0  # length of the history last applied
+    history_tail: Tuple[str, ...] = ()  # its last HISTORY_TAIL messages
+
+# Customer responses kept per conversation
+MAX_CUSTOMER_RESPONSES = 50
+
+# Trailing messages remembered to find where a resent history continues
+HISTORY_TAIL = 3
+
+# Random draws tried before falling back to listing a bucket's unasked templates
+TEMPLATE_SAMPLE_ATTEMPTS = 8
+
+class QuestionTemplateIndex:
+    """Question templates bucketed by stage, objection handling, question type and topic
+    
+    Every template is filed under its exact key and under the "any type" and
+    "any topic" wildcards, so a selection is a few dictionary lookups plus a
+    random draw, however many templates a stage has.
+    """
+    
+    def __init__(self, topic_of: Callable[[str], str]):
+        self.topic_of = topic_of
+        self._buckets: Dict[tuple, List[Question]] = defaultdict(list)
+        self._stage_sizes: Dict[ConversationStage, int] = defaultdict(int)
+    
+    def __len__(self) -> int:
+        return sum(self._stage_sizes.values())
+    
+    def add(self, question: Question):
+        topic = question.topic or self.topic_of(question.text)
+        stage, flag = question.conversation_stage, question.objection_handling
+        for question_type in (question.question_type, None):
+            for key_topic in (topic, None):
+                self._buckets[(stage, flag, question_type, key_topic)].append(question)
+        self._stage_sizes[stage] += 1
+    
+    def has_stage(self, stage: ConversationStage) -> bool:
+        return self._stage_sizes.get(stage, 0) > 0
+    
+    def select(self, stage: ConversationStage, asked: Set[str], allow_objection_handling: bool,
+               question_type: Optional[QuestionType] = None, topic: Optional[str] = None) -> Optional[Question]:
+        """A random unasked template for the stage, preferring `topic`; None if all were asked"""
+        flags = (False, True) if allow_objection_handling else (False,)
+        for key_topic in ((topic, None) if topic else (None,)):
+            pools = [self._buckets.get((stage, flag, question_type, key_topic), ()) for flag in flags]
+            question = self._pick(pools, asked)
+            if question is not None:
+                return question
+        return None
+    
+    def _pick(self, pools: Sequence[Sequence[Question]], asked: Set[str]) -> Optional[Question]:
+        total = sum(len(pool) for pool in pools)
+        if not total:
+            return None
+        # While few of the pooled templates were asked, a random draw almost
+        # always finds an unasked one
+        if total > 2 * len(asked):
+            for _ in range(TEMPLATE_SAMPLE_ATTEMPTS):
+                position = random.randrange(total)
+                for pool in pools:
+                    if position < len(pool):
+                        question = pool[position]
+                        break
+                    position -= len(pool)
+                if question.question_id not in asked:
+                    return question
+        remaining = [question for pool in pools for question in pool if question.question_id not in asked]
+        return random.choice(remaining) if remaining else None
 
 class DynamicQuestionGenerator:
     """
@@ -106,13 +205,17 @@ class DynamicQuestionGenerator:
         self._initialize_openai()
         self._initialize_question_templates()
         self._initialize_objection_responses()
+        
+        self.template_index = QuestionTemplateIndex(self._extract_current_topic)
+        for questions in self.question_templates.values():
+            for question in questions:
+                self.template_index.add(question)
     
     def _initialize_openai(self):
         """Initialize OpenAI client for advanced question generation"""
         try:
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if openai_api_key:
-                self.openai_client = openai.AsyncOpenAI(api_key=openai_api_key)
+            if get_llm_gateway().available:
+                self.openai_client = get_llm_gateway().client_for("questions")
                 logger.info("OpenAI client initialized for question generation")
             else:
                 logger.warning("OpenAI API key not found - using template-based questions only")
@@ -250,6 +353,12 @@ class DynamicQuestionGenerator:
             )
         ]
     
+    def add_question_templates(self, questions: List[Question]):
+        """Register more templates (e.g. a localized library) for selection"""
+        for question in questions:
+            self.question_templates.setdefault(question.conversation_stage, []).append(question)
+            self.template_index.add(question)
+    
     def _initialize_objection_responses(self):
         """Initialize objection handling responses"""
         
@@ -322,7 +431,7 @@ class DynamicQuestionGenerator:
                     trust_level=0.5,
                     topics_discussed=[],
                     questions_asked=[],
-                    customer_responses=[],
+                    customer_responses=deque(maxlen=MAX_CUSTOMER_RESPONSES),
                     current_topic="",
                     conversation_duration=0.0
                 )
@@ -340,6 +449,7 @@ class DynamicQuestionGenerator:
             if question:
                 # Update context with new question
                 context.questions_asked.append(question.text)
+                context.asked_question_ids.add(question.question_id)
                 self.conversation_contexts[room_id] = context
             
             return question
@@ -361,17 +471,22 @@ class DynamicQuestionGenerator:
             context.objection_level = sentiment_data.get("objection_level", 0.0)
             context.trust_level = sentiment_data.get("trust_level", 0.5)
         
-        # Analyze conversation history for topics and responses
-        recent_messages = conversation_history[-10:]  # Last 10 messages
-        
-        for message in recent_messages:
-            # Extract topics discussed
-            topics = self._extract_topics(message)
-            context.topics_discussed.extend(topics)
+        # Analyze only the messages not seen on earlier calls for topics and responses
+        for message in self._new_messages(context, conversation_history):
+            # Count each topic once per message mentioning it
+            for topic in self._extract_topics(message):
+                if topic not in context.topic_counts:
+                    context.topics_discussed.append(topic)
+                context.topic_counts[topic] += 1
             
             # Identify customer responses
             if not message.startswith("Assistant:") and not message.startswith("Agent:"):
                 context.customer_responses.append(message)
+                context.responses_seen += 1
+        
+        if conversation_history:
+            context.history_cursor = len(conversation_history)
+            context.history_tail = tuple(conversation_history[-HISTORY_TAIL:])
         
         # Determine conversation stage based on context
         context.stage = self._determine_conversation_stage(context)
@@ -380,29 +495,31 @@ class DynamicQuestionGenerator:
         if context.customer_responses:
             context.current_topic = self._extract_current_topic(context.customer_responses[-1])
     
+    def _new_messages(self, context: ConversationContext, conversation_history: List[str]) -> List[str]:
+        """Messages of `conversation_history` not yet applied to the context"""
+        tail = context.history_tail
+        if not tail:
+            return conversation_history
+        size, cursor = len(tail), context.history_cursor
+        
+        # The full history resent: everything past the cursor is new
+        if size <= cursor <= len(conversation_history) and tuple(conversation_history[cursor - size:cursor]) == tail:
+            return conversation_history[cursor:]
+        
+        # A sliding window: continue after the latest place the remembered tail
+        # appears (only its last messages may still be at the window's start)
+        for end in range(len(conversation_history), 0, -1):
+            overlap = min(size, end)
+            if tuple(conversation_history[end - overlap:end]) == tail[size - overlap:]:
+                return conversation_history[end:]
+        
+        # No overlap with what was seen
+        return conversation_history
+    
     def _extract_topics(self, message: str) -> List[str]:
         """Extract topics from a message"""
-        topics = []
-        message_lower = message.lower()
-        
-        # Define topic keywords
-        topic_keywords = {
-            "fiction": ["fiction", "novel", "story", "character"],
-            "non-fiction": ["non-fiction", "fact", "real", "true story"],
-            "mystery": ["mystery", "thriller", "suspense", "crime"],
-            "romance": ["romance", "love", "relationship", "romantic"],
-            "business": ["business", "finance", "money", "investment"],
-            "self-help": ["self-help", "motivation", "improvement", "personal development"],
-            "price": ["price", "cost", "expensive", "cheap", "budget"],
-            "author": ["author", "writer", "wrote"],
-            "genre": ["genre", "type", "category", "kind"]
-        }
-        
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                topics.append(topic)
-        
-        return topics
+        found = TOPIC_MATCHER.families_in(message.lower())
+        return [topic for topic in TOPIC_KEYWORDS if topic in found]
     
     def _determine_conversation_stage(self, context: ConversationContext) -> ConversationStage:
         """Determine current conversation stage based on context"""
@@ -418,8 +535,8 @@ class DynamicQuestionGenerator:
             return ConversationStage.CLOSING
         
         # Check if we have enough discovery information
-        if (len(context.topics_discussed) > 2 and 
-            any(topic in context.topics_discussed for topic in ["genre", "author", "fiction", "non-fiction"])):
+        if (sum(context.topic_counts.values()) > 2 and 
+            any(context.topic_counts[topic] for topic in ["genre", "author", "fiction", "non-fiction"])):
             return ConversationStage.PRESENTATION
         
         # Default to discovery if we don't have enough information
@@ -516,25 +633,19 @@ class DynamicQuestionGenerator:
     async def _generate_template_question(self, context: ConversationContext) -> Optional[Question]:
         """Generate question using predefined templates"""
         
-        # Get available questions for current stage
-        stage_questions = self.question_templates.get(context.stage, [])
-        
-        if not stage_questions:
+        if not self.template_index.has_stage(context.stage):
             return None
         
-        # Filter questions based on context
-        suitable_questions = []
-        
-        for question in stage_questions:
-            # Skip if we've already asked this question
-            if question.text in context.questions_asked:
-                continue
-            
-            # Check if question is suitable for current context
-            if self._is_question_suitable(question, context):
-                suitable_questions.append(question)
+        # An unasked template for the stage, on the current topic when there is
+        # one; objection handling only once the customer is objecting
+        question = self.template_index.select(
+            context.stage,
+            context.asked_question_ids,
+            allow_objection_handling=context.objection_level >= 0.3,
+            topic=context.current_topic
+        )
         
-        if not suitable_questions:
+        if question is None:
             # If no suitable questions, return a generic one
             return Question(
                 question_id="GENERIC_001",
@@ -545,25 +656,7 @@ class DynamicQuestionGenerator:
                 expected_response_type="general"
             )
         
-        # Return a random suitable question
-        return random.choice(suitable_questions)
-    
-    def _is_question_suitable(self, question: Question, context: ConversationContext) -> bool:
-        """Check if a question is suitable for the current context"""
-        
-        # Check objection handling
-        if question.objection_handling and context.objection_level < 0.3:
-            return False
-        
-        # Check conversation stage
-        if question.conversation_stage != context.stage:
-            return False
-        
-        # Check if we've already asked similar questions
-        if any(similar in question.text.lower() for similar in context.questions_asked):
-            return False
-        
-        return True
+        return question
     
     async def handle_objection(self, objection_text: str, context: ConversationContext) -> Optional[ObjectionResponse]:
         """Handle customer objections with appropriate responses"""
@@ -584,29 +677,12 @@ class DynamicQuestionGenerator:
     
     def _detect_objection_type(self, objection_text: str) -> ObjectionType:
         """Detect the type of objection from customer text"""
-        text_lower = objection_text.lower()
-        
-        # Price objections
-        if any(phrase in text_lower for phrase in ["too expensive", "too much", "can't afford", "price", "cost"]):
-            return ObjectionType.PRICE_OBJECTION
-        
-        # Need objections
-        if any(phrase in text_lower for phrase in ["don't need", "not interested", "not looking for"]):
-            return ObjectionType.NEED_OBJECTION
-        
-        # Trust objections
-        if any(phrase in text_lower for phrase in ["not sure", "don't know", "unfamiliar", "never heard"]):
-            return ObjectionType.TRUST_OBJECTION
-        
-        # Time objections
-        if any(phrase in text_lower for phrase in ["no time", "busy", "later", "not now"]):
-            return ObjectionType.TIME_OBJECTION
-        
-        # Authority objections
-        if any(phrase in text_lower for phrase in ["need to ask", "check with", "think about"]):
-            return ObjectionType.AUTHORITY_OBJECTION
+        found = OBJECTION_TYPE_MATCHER.families_in(objection_text.lower())
         
-        # Default to price objection
+        # First matching type in priority order; default to price objection
+        for objection_type in OBJECTION_TYPE_KEYWORDS:
+            if objection_type.value in found:
+                return objection_type
         return ObjectionType.PRICE_OBJECTION
     
     def _select_best_objection_response(self, responses: List[ObjectionResponse], 
@@ -0,0 +1,96 @@
+"""
+Recommendation Result Cache
+---------------------------
+Bounded LRU of finished recommendation lists, so a panel polling
+/recommendations/{customer_id} does not rerun every strategy (and the
+OpenAI call) while nothing relevant has changed.
+
+- Keys are built by the engine from the customer id, a fingerprint of the
+  normalized conversation context, the requested count and the catalog
+  state; entries also expire after `ttl` seconds.
+- Entries are indexed by customer, so a profile change drops just that
+  customer's lists.
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional, Set
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def context_fingerprint(text: str) -> str:
+    """Digest of `text` ignoring case, punctuation and spacing"""
+    normalized = " ".join(WORD_PATTERN.findall(text.lower()))
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=12).hexdigest() if normalized else ""
+
+
+class RecommendationCache:
+    """Customer-indexed LRU of recommendation lists with a time-to-live"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires at, customer id, value)
+        self._keys_of: Dict[str, Set[Hashable]] = defaultdict(set)
+        self.generation = 0  # bumped by every invalidation, so late writers can tell their result is stale
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is not None and item[0] <= time.monotonic():
+            self._drop(key)
+            self.expired += 1
+            item = None
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[2]
+
+    def put(self, key: Hashable, customer_id: str, value: Any):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._drop(key)
+        self._items[key] = (time.monotonic() + self.ttl, customer_id, value)
+        self._keys_of[customer_id].add(key)
+        while len(self._items) > self.maxsize:
+            self._drop(next(iter(self._items)))
+
+    def _drop(self, key: Hashable):
+        item = self._items.pop(key, None)
+        if item is not None:
+            keys = self._keys_of[item[1]]
+            keys.discard(key)
+            if not keys:
+                del self._keys_of[item[1]]
+
+    def invalidate_customer(self, customer_id: str):
+        self.generation += 1
+        for key in list(self._keys_of.get(customer_id, ())):
+            self._drop(key)
+
+    def clear(self):
+        self.generation += 1
+        self._items.clear()
+        self._keys_of.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
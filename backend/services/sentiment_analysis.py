@@ -20,7 +20,8 @@ from enum import Enum
 import numpy as np
 
 # LLM and ML imports
-import openai
+from services.llm_gateway import get_llm_gateway
+from services.sentiment_batcher import SentimentBatcher
 
 # Optional transformers import
 try:
@@ -39,6 +40,8 @@ from textblob import TextBlob
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import nltk
 
+from utils.keyword_matcher import KeywordMatcher
+
 # Download required NLTK data
 try:
     nltk.download('punkt', quiet=True)
@@ -51,6 +54,27 @@ except Exception as e:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sales context keyword categories (whole words/phrases), compiled once
+SALES_CONTEXT_KEYWORDS = {
+    "purchase": [
+        "buy", "purchase", "order", "get", "want", "need", "interested",
+        "price", "cost", "how much", "available", "in stock"
+    ],
+    "objection": [
+        "but", "however", "expensive", "too much", "can't afford",
+        "not sure", "maybe later", "think about it", "not interested"
+    ],
+    "trust": [
+        "thank you", "great", "perfect", "excellent", "helpful",
+        "recommend", "trust", "reliable", "good"
+    ],
+    "urgency": [
+        "urgent", "asap", "quickly", "soon", "immediately", "rush",
+        "deadline", "time sensitive"
+    ]
+}
+SALES_CONTEXT_MATCHER = KeywordMatcher(SALES_CONTEXT_KEYWORDS)
+
 class SentimentLabel(Enum):
     """Sentiment classification labels"""
     VERY_POSITIVE = "very_positive"
@@ -118,6 +142,7 @@ class SentimentAnalysisEngine:
     
     def __init__(self):
         self.openai_client = None
+        self.openai_batcher: Optional[SentimentBatcher] = None
         self.llama_pipeline = None
         self.vader_analyzer = SentimentIntensityAnalyzer()
         self.emotion_pipeline = None
@@ -133,10 +158,18 @@ class SentimentAnalysisEngine:
         """Initialize LLM models and pipelines"""
         try:
             # Initialize OpenAI
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if openai_api_key:
-                self.openai_client = openai.AsyncOpenAI(api_key=openai_api_key)
+            if get_llm_gateway().available:
+                self.openai_client = get_llm_gateway().client_for("sentiment")
                 logger.info("OpenAI client initialized successfully")
+                # Utterances arriving within the window (from any room) share one request
+                window = float(os.getenv("SENTIMENT_BATCH_WINDOW_MS", "50")) / 1000
+                if window > 0:
+                    self.openai_batcher = SentimentBatcher(
+                        self._score_batch_with_openai,
+                        self._score_with_openai,
+                        window=window,
+                        max_batch=int(os.getenv("SENTIMENT_BATCH_SIZE", "20"))
+                    )
             else:
                 logger.warning("OpenAI API key not found")
             
@@ -227,7 +260,12 @@ class SentimentAnalysisEngine:
         """Analyze sentiment using OpenAI GPT"""
         if not self.openai_client:
             return {"error": "OpenAI not available"}
-        
+        if self.openai_batcher is not None:
+            return await self.openai_batcher.score(message)
+        return await self._score_with_openai(message)
+    
+    async def _score_with_openai(self, message: str) -> Dict[str, Any]:
+        """Score one message with its own OpenAI request"""
         try:
             response = await self.openai_client.chat.completions.create(
                 model="gpt-3.5-turbo",
@@ -260,6 +298,37 @@ class SentimentAnalysisEngine:
             logger.error(f"OpenAI analysis error: {e}")
             return {"error": str(e)}
     
+    async def _score_batch_with_openai(self, messages: List[str]) -> str:
+        """Score several messages with one OpenAI request; returns the raw reply (a JSON array)"""
+        utterances = json.dumps([{"id": index, "text": message} for index, message in enumerate(messages)], ensure_ascii=False)
+        response = await self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": """You are a sales conversation sentiment analyzer. You receive a JSON array of customer messages, each with an "id" and "text", from unrelated conversations. Score each message on its own and return only a JSON array with one object per message, in the same order:
+                    [
+                        {
+                            "id": 0,
+                            "sentiment": "very_positive|positive|neutral|negative|very_negative",
+                            "confidence": 0.0-1.0,
+                            "polarity": -1.0 to 1.0,
+                            "purchase_intent": 0.0-1.0,
+                            "objection_level": 0.0-1.0,
+                            "trust_level": 0.0-1.0,
+                            "urgency": 0.0-1.0,
+                            "engagement": 0.0-1.0,
+                            "key_phrases": ["phrase1", "phrase2"]
+                        }
+                    ]"""
+                },
+                {"role": "user", "content": utterances}
+            ],
+            max_tokens=min(150 * len(messages), 4000),
+            temperature=0.1
+        )
+        return response.choices[0].message.content
+    
     async def _analyze_with_llama(self, message: str) -> Dict[str, Any]:
         """Analyze sentiment using LLaMA-based model"""
         if not self.llama_pipeline:
@@ -370,35 +439,12 @@ class SentimentAnalysisEngine:
         try:
             message_lower = message.lower()
             
-            # Purchase intent keywords
-            purchase_keywords = [
-                "buy", "purchase", "order", "get", "want", "need", "interested",
-                "price", "cost", "how much", "available", "in stock"
-            ]
-            
-            # Objection keywords
-            objection_keywords = [
-                "but", "however", "expensive", "too much", "can't afford",
-                "not sure", "maybe later", "think about it", "not interested"
-            ]
-            
-            # Trust keywords
-            trust_keywords = [
-                "thank you", "great", "perfect", "excellent", "helpful",
-                "recommend", "trust", "reliable", "good"
-            ]
-            
-            # Urgency keywords
-            urgency_keywords = [
-                "urgent", "asap", "quickly", "soon", "immediately", "rush",
-                "deadline", "time sensitive"
-            ]
-            
-            # Calculate scores
-            purchase_intent = sum(1 for keyword in purchase_keywords if keyword in message_lower) / len(purchase_keywords)
-            objection_level = sum(1 for keyword in objection_keywords if keyword in message_lower) / len(objection_keywords)
-            trust_level = sum(1 for keyword in trust_keywords if keyword in message_lower) / len(trust_keywords)
-            urgency = sum(1 for keyword in urgency_keywords if keyword in message_lower) / len(urgency_keywords)
+            # Distinct keywords per category, found in one pass
+            found = SALES_CONTEXT_MATCHER.distinct_count(message_lower)
+            purchase_intent = found.get("purchase", 0) / len(SALES_CONTEXT_KEYWORDS["purchase"])
+            objection_level = found.get("objection", 0) / len(SALES_CONTEXT_KEYWORDS["objection"])
+            trust_level = found.get("trust", 0) / len(SALES_CONTEXT_KEYWORDS["trust"])
+            urgency = found.get("urgency", 0) / len(SALES_CONTEXT_KEYWORDS["urgency"])
             
             return {
                 "purchase_intent": min(purchase_intent * 2, 1.0),  # Scale up but cap at 1.0
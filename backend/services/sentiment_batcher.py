@@ -0,0 +1,157 @@
+"""
+Sentiment Request Batching
+--------------------------
+Collects customer utterances that arrive within a short window (from any
+room) and scores them with one chat completion that returns a JSON array,
+instead of one request per message.
+
+- A batch is sent when the window closes or it reaches `max_batch`
+  utterances; identical utterances in a batch are scored once.
+- The reply is parsed leniently: a bare array, an array wrapped in an
+  object or code fence, or a reply cut off part way all yield the scores
+  that are complete. Utterances without a usable score fall back to a
+  single-message request.
+- If the batch request itself fails (timeout, API error) every utterance
+  in it gets an error result, so callers fall back to the local analyzers
+  rather than multiplying load on a struggling API.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_LABELS = {"very_positive", "positive", "neutral", "negative", "very_negative"}
+
+
+def parse_batch_scores(content: str, count: int) -> List[Optional[Dict[str, Any]]]:
+    """Scores by utterance index from a batch reply; None where no valid score was found"""
+    scores: List[Optional[Dict[str, Any]]] = [None] * count
+    for item in _json_objects(content or ""):
+        index = item.get("id")
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < count:
+            continue
+        if item.get("sentiment") not in SENTIMENT_LABELS:
+            continue
+        scores[index] = {name: value for name, value in item.items() if name != "id"}
+    return scores
+
+
+def _json_objects(content: str) -> List[dict]:
+    """The score objects in `content`, recovering what it can from malformed replies"""
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        parsed = next((value for value in parsed.values() if isinstance(value, list)), [parsed])
+    if isinstance(parsed, list):
+        return [item for item in parsed if isinstance(item, dict)]
+
+    # Not valid JSON as a whole (extra prose, a code fence, or truncated by the
+    # token limit): decode each complete top-level object on its own
+    decoder = json.JSONDecoder()
+    objects, position = [], content.find("{")
+    while position != -1:
+        try:
+            item, end = decoder.raw_decode(content, position)
+        except ValueError:
+            position = content.find("{", position + 1)
+            continue
+        if isinstance(item, dict):
+            objects.append(item)
+        position = content.find("{", end)
+    return objects
+
+
+class SentimentBatcher:
+    """Coalesces single-utterance scoring calls into batched requests
+
+    `score_batch(messages)` sends one request for several utterances and
+    returns the raw reply text; `score_one(message)` is the single-message
+    path used for utterances the batch reply did not cover.
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[List[str]], Awaitable[str]],
+        score_one: Callable[[str], Awaitable[Dict[str, Any]]],
+        window: float = 0.05,
+        max_batch: int = 20
+    ):
+        self.score_batch = score_batch
+        self.score_one = score_one
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.messages = 0
+        self.fallbacks = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+
+    async def score(self, message: str) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self.messages += 1
+        waiters = self._pending.setdefault(message, [])
+        waiters.append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            batch, self._pending = self._pending, {}
+            task = asyncio.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: Dict[str, List[asyncio.Future]]):
+        messages = list(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(messages))
+        started = time.perf_counter()
+        try:
+            if len(messages) == 1:
+                results = [await self.score_one(messages[0])]
+            else:
+                scores = parse_batch_scores(await self.score_batch(messages), len(messages))
+                missing = [index for index, score in enumerate(scores) if score is None]
+                if missing:
+                    self.fallbacks += len(missing)
+                    logger.warning(f"Sentiment batch reply covered {len(messages) - len(missing)}/{len(messages)} utterances; scoring the rest singly")
+                    retried = await asyncio.gather(*(self.score_one(messages[index]) for index in missing))
+                    for index, result in zip(missing, retried):
+                        scores[index] = result
+                results = scores
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"Sentiment batch of {len(messages)} failed after {time.perf_counter() - started:.2f}s: {e}")
+            results = [{"error": str(e)}] * len(messages)
+
+        for message, result in zip(messages, results):
+            for future in batch[message]:
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000),
+            "max_batch": self.max_batch,
+            "messages": self.messages,
+            "batches": self.batches,
+            "avg_batch": round(self.messages / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "fallbacks": self.fallbacks,
+            "failed_batches": self.failed_batches
+        }
@@ -0,0 +1,70 @@
+"""Microbenchmark: catalog section of the AI recommendation prompt
+
+For growing synthetic catalogs, compares the original prompt section (every
+in-stock book as indented JSON) with candidate retrieval plus compact
+cached lines: characters (~4 per token) and time to build it.
+
+Run from the backend directory:
+    python tests/bench_ai_prompt.py [books ...]
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_catalog_search import make_catalog
+from services.catalog_store import MemoryCatalogStore
+from services.product_recommendation import ProductRecommendationEngine, book_to_document
+
+
+def full_dump(books):
+    """Original approach: every in-stock book, pretty-printed"""
+    return json.dumps([
+        {
+            "id": b.book_id, "title": b.title, "author": b.author, "genre": b.genre.value,
+            "price": b.price, "rating": b.rating, "description": b.description[:100] + "..."
+        }
+        for b in books if b.availability and b.stock_quantity > 0
+    ], indent=2)
+
+
+async def bench(sizes=(1000, 10000)):
+    for count in sizes:
+        books, vocabulary = make_catalog(count)
+        engine = ProductRecommendationEngine(MemoryCatalogStore([book_to_document(book) for book in books]))
+        await engine.connect_catalog()
+        customer = await engine._create_new_customer_profile("bench")
+        rng = random.Random(9)
+        contexts = [
+            f"Customer: I enjoyed {rng.choice(books).title} and want something about "
+            + " ".join(rng.choices(vocabulary[:3000], k=8))
+            for _ in range(50)
+        ]
+
+        started = time.perf_counter()
+        original = full_dump(books)
+        original_ms = (time.perf_counter() - started) * 1000
+
+        print(f"\n{'='*60}\nAI prompt catalog section ({count} books)\n{'='*60}")
+        print(f"   all in-stock books as JSON   {len(original):>10,} chars  (~{len(original) // 4:,} tokens)  {original_ms:8.1f} ms")
+        for label in ("candidates, cold lines", "candidates, cached lines"):
+            timings, sizes_seen = [], []
+            for context in contexts:
+                started = time.perf_counter()
+                fragment = engine._catalog_fragment(await engine._candidate_books(customer, context))
+                timings.append(time.perf_counter() - started)
+                sizes_seen.append(len(fragment))
+            timings.sort()
+            print(
+                f"   {label:<28} {max(sizes_seen):>10,} chars max (~{max(sizes_seen) // 4:,} tokens)  "
+                f"median {timings[len(timings) // 2] * 1000:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(tuple(int(arg) for arg in sys.argv[1:]) or (1000, 10000)))
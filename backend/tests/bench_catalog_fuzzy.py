@@ -0,0 +1,55 @@
+"""Microbenchmark: resolving misspelled titles with CatalogFuzzyMatcher
+
+Uses the synthetic catalog from bench_catalog_search and queries each
+sampled title with one character replaced, as speech-to-text tends to.
+
+Run from the backend directory:
+    python tests/bench_catalog_fuzzy.py [books]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_catalog_search import make_catalog
+from services.catalog_fuzzy import CatalogFuzzyMatcher
+
+
+def misspell(rng: random.Random, title: str) -> str:
+    chars = list(title.lower())
+    chars[rng.randrange(len(chars))] = rng.choice("aeiou")
+    return "".join(chars)
+
+
+def bench(count: int = 50000):
+    books, _ = make_catalog(count)
+    print(f"\n{'='*60}\nFuzzy title matching ({count} books)\n{'='*60}")
+
+    matcher = CatalogFuzzyMatcher()
+    start = time.perf_counter()
+    matcher.rebuild(books)
+    print(f"   matcher build                {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    rng = random.Random(5)
+    sampled = [rng.choice(books) for _ in range(200)]
+    queries = [misspell(rng, book.title) for book in sampled]
+
+    for label in ("cold (words unresolved)", "warm (words cached)"):
+        timings, found = [], 0
+        for book, query in zip(sampled, queries):
+            started = time.perf_counter()
+            matches = matcher.match(query)
+            timings.append(time.perf_counter() - started)
+            found += any(match.book_id == book.book_id for match in matches)
+        timings.sort()
+        print(
+            f"   {label:<28} median {timings[len(timings) // 2] * 1000:7.2f} ms   "
+            f"max {timings[-1] * 1000:7.2f} ms   source book in top 5: {found}/{len(queries)}"
+        )
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,74 @@
+"""Microbenchmark: rule-based recommendation lookups, full scan vs CatalogRankIndex
+
+For growing synthetic catalogs, times the genre-within-budget and trending
+queries the recommendation strategies make, first as the previous
+filter-and-sort over every book and then through the maintained indexes
+(checking both return the same books).
+
+Run from the backend directory:
+    python tests/bench_catalog_ranking.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_catalog_search import make_catalog
+from services.catalog_ranking import CatalogRankIndex
+from services.product_recommendation import BookGenre
+
+
+def scan(books, genre=None, min_price=None, max_price=None, min_rating=None, limit=5):
+    """Previous approach: filter and sort the whole catalog"""
+    matches = [
+        b for b in books
+        if b.availability and b.stock_quantity > 0
+        and (genre is None or b.genre.value == genre)
+        and (min_price is None or b.price >= min_price)
+        and (max_price is None or b.price <= max_price)
+        and (min_rating is None or b.rating >= min_rating)
+    ]
+    matches.sort(key=lambda b: (-b.rating, b.price, b.book_id))
+    return [b.book_id for b in matches[:limit]]
+
+
+def bench(sizes=(1000, 10000, 100000)):
+    rng = random.Random(11)
+    genres = [genre.value for genre in BookGenre]
+    for count in sizes:
+        books, _ = make_catalog(count)
+        index = CatalogRankIndex()
+        started = time.perf_counter()
+        index.rebuild(books)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        queries = []
+        for _ in range(100):
+            low = rng.uniform(4, 30)
+            queries.append({"genre": rng.choice(genres), "min_price": low, "max_price": low + rng.uniform(2, 20)})
+        queries.append({"min_rating": 4.0})
+        queries.append({"genre": genres[0], "min_price": 10.0, "max_price": 10.5})
+
+        print(f"\n{'='*60}\nRecommendation lookups ({count} books, index build {build_ms:.0f} ms)\n{'='*60}")
+        for label, lookup in (("full scan", lambda q: scan(books, **q)), ("rank index", lambda q: index.find(limit=5, **q))):
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                lookup(query)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"   {label:<28} median {timings[len(timings) // 2] * 1000:7.3f} ms   max {timings[-1] * 1000:7.3f} ms")
+
+        mismatches = sum(scan(books, **q) != index.find(limit=5, **q) for q in queries)
+        started = time.perf_counter()
+        for book in books[:1000]:
+            index.set_stock(book.book_id, False)
+        stock_us = (time.perf_counter() - started) * 1000
+        print(f"   stock change                 {stock_us:7.3f} us/book   result mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,97 @@
+"""Microbenchmark: linear catalog scan vs the BM25 inverted index
+
+Builds a synthetic catalog with a Zipf-distributed vocabulary and compares
+the previous substring scan of every book with CatalogSearchIndex.search.
+
+Run from the backend directory:
+    python tests/bench_catalog_search.py [books]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.product_recommendation import Book, BookGenre
+from services.catalog_search import CatalogSearchIndex
+
+
+def make_catalog(count: int):
+    rng = random.Random(7)
+    syllables = ["ka", "lo", "mi", "ra", "ten", "sha", "vor", "el", "dun", "qui", "bar", "nes"]
+    vocabulary = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(30000)})
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    genres = list(BookGenre)
+
+    def words(n):
+        return " ".join(rng.choices(vocabulary, weights, k=n))
+
+    books = [
+        Book(
+            book_id=f"BK{i:07d}",
+            title=words(rng.randint(2, 5)).title(),
+            author=f"{words(1).title()} {words(1).title()}",
+            genre=rng.choice(genres),
+            price=round(rng.uniform(4, 45), 2),
+            rating=round(rng.uniform(3, 5), 1),
+            description=words(rng.randint(20, 60)),
+            isbn="",
+            publication_year=rng.randint(1900, 2024),
+            page_count=rng.randint(80, 900),
+            stock_quantity=rng.randint(0, 20),
+            tags=words(3).split()
+        )
+        for i in range(count)
+    ]
+    return books, vocabulary
+
+
+def linear_search(books, query, max_price=None):
+    """Previous approach: substring checks against every book"""
+    query = query.lower()
+    results = [
+        b for b in books
+        if b.availability and b.stock_quantity > 0 and (max_price is None or b.price <= max_price)
+        and (query in b.title.lower() or query in b.author.lower() or query in b.description.lower())
+    ]
+    results.sort(key=lambda b: (b.rating, -b.price), reverse=True)
+    return results
+
+
+def bench(count: int = 100000):
+    books, vocabulary = make_catalog(count)
+    print(f"\n{'='*60}\nCatalog search ({count} books)\n{'='*60}")
+
+    index = CatalogSearchIndex()
+    start = time.perf_counter()
+    index.rebuild(books)
+    print(f"   index build                  {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    rng = random.Random(3)
+    queries = []
+    for _ in range(50):
+        title_words = rng.choice(books).title.lower().split()
+        queries.append(" ".join(title_words[:2]))
+    queries += [vocabulary[0], vocabulary[1] + " " + vocabulary[2], rng.choice(books).title.lower()[:6]]
+
+    for label, search in (
+        ("linear scan", lambda q: linear_search(books, q, max_price=30)),
+        ("inverted index (top 50)", lambda q: index.search(q, max_price=30, limit=50)),
+    ):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"   {label:<28} median {timings[len(timings) // 2] * 1000:7.2f} ms   max {timings[-1] * 1000:7.2f} ms")
+
+    start = time.perf_counter()
+    for book in books[:1000]:
+        index.upsert(book)
+    print(f"   incremental re-index          {(time.perf_counter() - start) * 1000 / 1000:8.3f} ms/book")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
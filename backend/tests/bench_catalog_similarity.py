@@ -0,0 +1,73 @@
+"""Microbenchmark: similar-book neighbors with BookSimilarityIndex
+
+For growing synthetic catalogs, times the full all-pairs rebuild, an
+incremental update of a few changed books, neighbor lookups and a
+save/load round trip of the memory-mapped files, and reports how many of
+the incrementally maintained neighbor lists match a full rebuild.
+
+Run from the backend directory:
+    python tests/bench_catalog_similarity.py [books ...]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_catalog_search import make_catalog
+from services.catalog_similarity import BookSimilarityIndex
+
+
+def bench(sizes=(1000, 10000)):
+    rng = random.Random(3)
+    for count in sizes:
+        books, _ = make_catalog(count)
+        directory = tempfile.mkdtemp()
+        try:
+            index = BookSimilarityIndex(directory=directory)
+            print(f"\n{'='*60}\nSimilar books ({count} books)\n{'='*60}")
+
+            started = time.perf_counter()
+            index.rebuild(books)
+            print(f"   full rebuild                 {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+            changed = [replace(book, description=rng.choice(books).description) for book in rng.sample(books, 10)]
+            started = time.perf_counter()
+            index.update(changed)
+            print(f"   update 10 changed books      {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+            timings = []
+            for book in rng.sample(books, 200):
+                started = time.perf_counter()
+                index.neighbors(book.book_id, k=5)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"   neighbor lookup              median {timings[len(timings) // 2] * 1000:7.3f} ms")
+
+            started = time.perf_counter()
+            index.save(catalog_version=1)
+            reloaded = BookSimilarityIndex(directory=directory)
+            reloaded.load()
+            print(f"   save + load                  {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+            current = {book.book_id: book for book in books}
+            current.update({book.book_id: book for book in changed})
+            fresh = BookSimilarityIndex()
+            fresh.rebuild(current.values())
+            sampled = rng.sample(list(current), 200)
+            agree = sum(
+                {b for b, _ in index.neighbors(book_id, k=5)} == {b for b, _ in fresh.neighbors(book_id, k=5)}
+                for book_id in sampled
+            )
+            print(f"   top-5 lists matching a full rebuild: {agree}/{len(sampled)}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    bench(tuple(int(arg) for arg in sys.argv[1:]) or (1000, 10000))
@@ -0,0 +1,55 @@
+"""Microbenchmark: co-purchase table refresh, full recount vs incremental
+
+Builds a synthetic order history (Zipf-like book popularity), times the
+full co-occurrence build and then incremental refreshes of small order
+batches, and checks the incremental table matches a full recount.
+
+Run from the backend directory:
+    python tests/bench_co_purchase.py [orders]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.co_purchase import CoPurchaseModel
+
+
+def random_order(rng: random.Random, customers: int, books: int):
+    return f"C{rng.randrange(customers)}", f"BK{int(rng.paretovariate(0.6)) % books:05d}"
+
+
+def bench(count: int = 200000):
+    rng = random.Random(7)
+    customers, books = count // 5, 20000
+    print(f"\n{'='*60}\nCo-purchase table ({count} orders, {customers} customers)\n{'='*60}")
+
+    model = CoPurchaseModel()
+    orders = {}
+    for i in range(count):
+        orders[f"room{i}"] = random_order(rng, customers, books)
+        model.add_order(f"room{i}", *orders[f"room{i}"])
+    started = time.perf_counter()
+    model.refresh()
+    print(f"   full build                   {(time.perf_counter() - started) * 1000:9.1f} ms   ({model.books} books)")
+
+    for size in (10, 100, 1000):
+        for i in range(size):
+            room = f"new{size}-{i}"
+            orders[room] = random_order(rng, customers, books)
+            model.add_order(room, *orders[room])
+        started = time.perf_counter()
+        rows = model.refresh()
+        print(f"   incremental, {size:>4} orders       {(time.perf_counter() - started) * 1000:9.1f} ms   ({len(rows)} rows re-ranked)")
+
+    recount = CoPurchaseModel()
+    for room, (customer, book_id) in orders.items():
+        recount.add_order(room, customer, book_id)
+    recount.refresh()
+    print(f"   incremental table matches a full recount: {model.table() == recount.table()}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,63 @@
+"""Benchmark: render 10k order confirmation emails with the precompiled templates
+
+Run from the backend directory:
+    python tests/bench_email_templates.py [count]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.email_templates import EmailTemplateRegistry
+
+
+def make_orders(count: int):
+    """Build synthetic confirmed orders"""
+    return [
+        {
+            "order_id": f"ORD{i:06d}",
+            "customer_email": f"customer{i}@example.com",
+            "customer_name": f"Customer <{i}>",
+            "book_title": "The Seven Husbands of Evelyn Hugo",
+            "author": "Taylor Jenkins Reid",
+            "quantity": 1 + i % 3,
+            "total_amount": 16.99 * (1 + i % 3),
+            "payment_method": "Credit Card",
+            "delivery_option": "Standard",
+            "delivery_address": f"{i} Main Street, Springfield"
+        }
+        for i in range(count)
+    ]
+
+
+def bench_render(count: int = 10000):
+    """Time cold compile, single renders and batch rendering"""
+    registry = EmailTemplateRegistry()
+    orders = make_orders(count)
+
+    start = time.perf_counter()
+    registry.get("order_confirmed")
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for order in orders:
+        registry.render("order_confirmed", order)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rendered = registry.render_batch("order_confirmed", orders)
+    batch_s = time.perf_counter() - start
+
+    assert len(rendered) == count
+    assert "&lt;0&gt;" in rendered[0].html
+    assert "Customer <0>" in rendered[0].text
+
+    print(f"\n{'='*60}\nEmail template rendering ({count} confirmation emails)\n{'='*60}")
+    print(f"   Compile (once):  {compile_ms:.2f} ms")
+    print(f"   render() loop:   {single_s * 1000:.1f} ms ({count / single_s:,.0f} emails/s)")
+    print(f"   render_batch():  {batch_s * 1000:.1f} ms ({count / batch_s:,.0f} emails/s)")
+
+
+if __name__ == "__main__":
+    bench_render(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
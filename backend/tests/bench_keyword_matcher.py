@@ -0,0 +1,91 @@
+"""Microbenchmark: substring keyword scans vs the compiled keyword matcher
+
+Compares the previous ``any(keyword in text for keyword in ...)`` checks with
+the shared KeywordMatcher for each call site that was migrated.
+
+Run from the backend directory:
+    python tests/bench_keyword_matcher.py [messages]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.keyword_matcher import KeywordMatcher
+from services.sentiment_analysis import SALES_CONTEXT_KEYWORDS, SALES_CONTEXT_MATCHER
+from services.question_generator import TOPIC_KEYWORDS, TOPIC_MATCHER, OBJECTION_TYPE_KEYWORDS, OBJECTION_TYPE_MATCHER
+from core.call_summary_generator import summary_generator
+
+VOCABULARY = (
+    "i am looking for a good mystery novel but the price seems too expensive maybe later "
+    "could you recommend something similar to the author i love thank you that sounds perfect "
+    "what about delivery options i need it soon for a birthday not sure about the genre "
+    "together about button kindle really satisfaction"
+).split()
+
+
+FILLER = (
+    "the a of and to in it is was that with for on as this have from at they be which one "
+    "had were there were when we your can said an each she do how their if will up other "
+    "then them these so some her would make like him into time has look two more write go"
+).split()
+
+
+def make_messages(count: int, keyword_ratio: float = 1.0):
+    """Synthetic lowercased chat messages; keyword_ratio is the share of words from VOCABULARY"""
+    rng = random.Random(42)
+    return [
+        " ".join(rng.choice(VOCABULARY if rng.random() < keyword_ratio else FILLER) for _ in range(rng.randint(5, 40)))
+        for _ in range(count)
+    ]
+
+
+def substring_families(families, text):
+    """Previous approach: one substring scan per keyword"""
+    return {family for family, keywords in families.items() if any(k.rstrip("*") in text for k in keywords)}
+
+
+def timed(label, fn, messages):
+    start = time.perf_counter()
+    for message in messages:
+        fn(message)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<28} {elapsed * 1000:8.1f} ms  ({len(messages) / elapsed:,.0f} msgs/s)")
+    return elapsed
+
+
+def check_boundaries():
+    """Word-boundary behaviour the substring scans got wrong"""
+    matcher = KeywordMatcher({"objection": ["but", "maybe"], "recommendation": ["recommend*"]})
+    assert matcher.families_in("what about that button") == set()
+    assert matcher.families_in("but i am not sure") == {"objection"}
+    assert matcher.families_in("i recommended it") == {"recommendation"}
+    assert TOPIC_MATCHER.families_in("i use a kindle really") == set()
+    assert "non-fiction" in TOPIC_MATCHER.families_in("facts about real people")
+
+
+def bench(count: int = 20000, keyword_ratio: float = 1.0):
+    messages = make_messages(count, keyword_ratio)
+    print(f"\n{'='*60}\nKeyword matching ({count} messages, keyword ratio {keyword_ratio:.0%})\n{'='*60}")
+
+    call_sites = [
+        ("sales context", SALES_CONTEXT_KEYWORDS, SALES_CONTEXT_MATCHER),
+        ("question topics", TOPIC_KEYWORDS, TOPIC_MATCHER),
+        ("objection type", {t.value: k for t, k in OBJECTION_TYPE_KEYWORDS.items()}, OBJECTION_TYPE_MATCHER),
+        ("call summary families", summary_generator.analyzer.matcher.families, summary_generator.analyzer.matcher),
+    ]
+    for name, families, matcher in call_sites:
+        keyword_total = sum(len(k) for k in families.values())
+        print(f"\n{name} ({len(families)} families, {keyword_total} keywords)")
+        old = timed("substring any() scans", lambda m: substring_families(families, m), messages)
+        new = timed("KeywordMatcher.families_in", matcher.families_in, messages)
+        print(f"   speedup: {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    check_boundaries()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bench(count, keyword_ratio=1.0)   # keyword-dense worst case
+    bench(count, keyword_ratio=0.2)   # closer to real conversation text
@@ -0,0 +1,68 @@
+"""Microbenchmark: question-generator context updates over a long call
+
+Replays calls where the client resends the whole conversation history on
+every /questions/generate request, first with the previous update (rescan
+the last 10 messages and append their topics and responses again) and then
+with the generator's incremental update, reporting time per update and the
+size the context grows to.
+
+Run from the backend directory:
+    python tests/bench_question_context.py
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.question_generator import DynamicQuestionGenerator
+
+LINES = [
+    "Customer: I'm after a mystery novel with a great detective",
+    "Agent: Do you have a favorite author?",
+    "Customer: the price matters, nothing too expensive",
+    "Agent: This one is on offer this week.",
+    "Customer: is it fiction or based on a true story?",
+    "Customer: I like business books about investment too",
+]
+
+
+def rescan_update(generator, context, history):
+    """Previous approach: re-read the last 10 messages on every call"""
+    for message in history[-10:]:
+        context.topics_discussed.extend(generator._extract_topics(message))
+        if not message.startswith("Assistant:") and not message.startswith("Agent:"):
+            context.customer_responses.append(message)
+
+
+async def bench(lengths=(50, 200, 1000)):
+    rng = random.Random(9)
+    generator = DynamicQuestionGenerator()
+    for length in lengths:
+        history = [rng.choice(LINES) for _ in range(length)]
+        print(f"\n{'='*60}\nCall of {length} messages, full history resent each turn\n{'='*60}")
+        for label in ("rescan last 10", "incremental"):
+            room_id = f"{label}-{length}"
+            await generator.generate_question(room_id, [])
+            context = generator.conversation_contexts[room_id]
+            if label == "rescan last 10":
+                context.customer_responses = []  # previously an unbounded list
+            started = time.perf_counter()
+            for turn in range(1, length + 1):
+                if label == "rescan last 10":
+                    rescan_update(generator, context, history[:turn])
+                else:
+                    await generator._update_conversation_context(context, history[:turn], None)
+            per_update = (time.perf_counter() - started) / length * 1000
+            print(
+                f"   {label:<16} {per_update:7.3f} ms/update   topics stored {len(context.topics_discussed):6d}"
+                f"   responses stored {len(context.customer_responses):6d}"
+            )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    asyncio.run(bench())
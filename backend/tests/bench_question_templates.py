@@ -0,0 +1,97 @@
+"""Microbenchmark: template question selection, linear filter vs QuestionTemplateIndex
+
+For growing synthetic template libraries (spread over stages, types and
+topics, as a localized library would be), times picking the next question
+over a long call, first with the previous walk over every stage template
+(checking each against every asked question) and then through the
+generator's template index.
+
+Run from the backend directory:
+    python tests/bench_question_templates.py
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.question_generator import (
+    ConversationContext, ConversationStage, DynamicQuestionGenerator, Question, QuestionType
+)
+
+TOPICS = ["price", "genre", "author", "purchase", "general"]
+
+
+def make_templates(count, rng):
+    stages, types = list(ConversationStage), list(QuestionType)
+    return [
+        Question(
+            question_id=f"LOC_{index:06d}",
+            text=f"Localized question {index} about {rng.choice(TOPICS)}?",
+            question_type=rng.choice(types),
+            conversation_stage=rng.choice(stages),
+            context="Synthetic template",
+            expected_response_type="general",
+            objection_handling=rng.random() < 0.2,
+            topic=rng.choice(TOPICS)
+        )
+        for index in range(count)
+    ]
+
+
+def linear_select(templates, context):
+    """Previous approach: filter every stage template against the asked questions"""
+    suitable = []
+    for question in templates.get(context.stage, []):
+        if question.text in context.questions_asked:
+            continue
+        if question.objection_handling and context.objection_level < 0.3:
+            continue
+        if any(similar in question.text.lower() for similar in context.questions_asked):
+            continue
+        suitable.append(question)
+    return random.choice(suitable) if suitable else None
+
+
+def new_context(stage):
+    return ConversationContext(
+        stage=stage, customer_sentiment="neutral", customer_engagement=0.5, purchase_intent=0.5,
+        objection_level=0.4, trust_level=0.5, topics_discussed=[], questions_asked=[],
+        customer_responses=[], current_topic="price", conversation_duration=0.0
+    )
+
+
+def bench(sizes=(100, 1000, 10000, 50000), turns=200):
+    rng = random.Random(3)
+    for count in sizes:
+        generator = DynamicQuestionGenerator()
+        generator.add_question_templates(make_templates(count, rng))
+        print(f"\n{'='*60}\n{len(generator.template_index)} templates, {turns} questions in one call\n{'='*60}")
+        for label in ("linear filter", "template index"):
+            context = new_context(ConversationStage.DISCOVERY)
+            timings = []
+            for _ in range(turns):
+                started = time.perf_counter()
+                if label == "linear filter":
+                    question = linear_select(generator.question_templates, context)
+                else:
+                    question = generator.template_index.select(
+                        context.stage, context.asked_question_ids, allow_objection_handling=True, topic=context.current_topic
+                    )
+                timings.append(time.perf_counter() - started)
+                if question is not None:
+                    context.questions_asked.append(question.text)
+                    context.asked_question_ids.add(question.question_id)
+            timings.sort()
+            repeats = len(context.questions_asked) - len(set(context.questions_asked))
+            print(
+                f"   {label:<16} median {timings[len(timings) // 2] * 1000:8.3f} ms   max {timings[-1] * 1000:8.3f} ms"
+                f"   repeated questions: {repeats}"
+            )
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    bench()
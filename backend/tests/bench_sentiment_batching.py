@@ -0,0 +1,84 @@
+"""Microbenchmark: OpenAI sentiment scoring, one request per message vs batched
+
+Scores bursts of concurrent customer messages (as from many live rooms)
+against the local fake OpenAI server, first with a request per message and
+then through SentimentBatcher, reporting upstream requests, tokens and wall
+time. Also checks that a batch reply cut off part way keeps the complete
+scores and falls back to single requests for the rest.
+
+Run from the backend directory:
+    python tests/bench_sentiment_batching.py
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeOpenAIServer
+from services.llm_gateway import LLMGateway
+from services.sentiment_analysis import SentimentAnalysisEngine
+from services.sentiment_batcher import SentimentBatcher, parse_batch_scores
+
+PHRASES = [
+    "I really like the sound of that one", "that's a bit too expensive for me", "can you tell me more about the author",
+    "I'm not sure I have time to read it", "yes please add it to my order", "do you have anything similar",
+    "my daughter loves fantasy novels", "I need it before the weekend", "hmm, I already read that", "sounds great, thanks",
+]
+
+
+def engine_for(gateway, window):
+    engine = SentimentAnalysisEngine()
+    engine.openai_client = gateway.client_for("sentiment")
+    if window:
+        engine.openai_batcher = SentimentBatcher(engine._score_batch_with_openai, engine._score_with_openai, window=window)
+    return engine
+
+
+async def bench(bursts=(20, 100, 400)):
+    rng = random.Random(5)
+    server = FakeOpenAIServer(port=0, delay=0.15).start()
+    for count in bursts:
+        messages = [f"{rng.choice(PHRASES)} (room {index})" for index in range(count)]
+        print(f"\n{'='*60}\n{count} concurrent messages\n{'='*60}")
+        for label, window in (("request per message", 0), ("batched (50 ms window)", 0.05)):
+            gateway = LLMGateway(api_key="bench", base_url=server.base_url, max_concurrency=8)
+            engine = engine_for(gateway, window)
+            before = server.requests
+            started = time.perf_counter()
+            results = await asyncio.gather(*(engine._analyze_with_openai(message) for message in messages))
+            elapsed = time.perf_counter() - started
+            usage = gateway.stats()["callers"]["sentiment"]
+            scored = sum("error" not in result for result in results)
+            print(
+                f"   {label:<24} {server.requests - before:4d} requests  {usage['prompt_tokens'] + usage['completion_tokens']:6d} tokens"
+                f"  {elapsed:6.2f}s  scored {scored}/{count}"
+            )
+            await gateway.close()
+
+    print(f"\n{'='*60}\nPartial batch reply\n{'='*60}")
+    reply = json.dumps([{"id": index, "sentiment": "positive", "confidence": 0.8} for index in range(5)])
+    truncated = reply[:reply.rfind("{\"id\": 3")]
+    scores = parse_batch_scores("```json\n" + truncated, 5)
+    print(f"   truncated reply kept scores for ids {[index for index, score in enumerate(scores) if score]}")
+
+    async def score_batch(batch):
+        return truncated
+
+    async def score_one(message):
+        return {"sentiment": "neutral", "single": True}
+
+    batcher = SentimentBatcher(score_batch, score_one, window=0.01)
+    results = await asyncio.gather(*(batcher.score(f"message {index}") for index in range(5)))
+    print(f"   single-request fallbacks: {sum(bool(result.get('single')) for result in results)}   stats: {batcher.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    asyncio.run(bench())
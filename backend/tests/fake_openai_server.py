@@ -0,0 +1,122 @@
+"""Local stand-in for the OpenAI chat completions API
+
+Answers POST /v1/chat/completions after a fixed delay with a reply and a
+usage block (a neutral sentiment score by default, or a JSON array of
+scores when the last message is a JSON array of {"id", "text"} utterances,
+as batched sentiment requests send), and reports how many requests it has served (and the
+most it served at once) on GET /stats. Point the backend at it with
+OPENAI_BASE_URL=http://127.0.0.1:8765/v1 and any OPENAI_API_KEY.
+
+Run from the backend directory:
+    python tests/fake_openai_server.py [--port 8765] [--delay 0.2] [--reply '{"recommendations": []}']
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+NEUTRAL_SCORE = {"sentiment": "neutral", "confidence": 0.5, "polarity": 0.0}
+
+
+def default_reply(request: dict) -> str:
+    """A neutral score, or one per utterance for a batched request"""
+    messages = request.get("messages") or [{}]
+    try:
+        utterances = json.loads(messages[-1].get("content", ""))
+    except ValueError:
+        utterances = None
+    if isinstance(utterances, list):
+        return json.dumps([dict(NEUTRAL_SCORE, id=item.get("id")) for item in utterances if isinstance(item, dict)])
+    return json.dumps(NEUTRAL_SCORE)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 8765, delay: float = 0.2, reply: Optional[str] = None):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.delay = delay
+        self.reply = reply
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: dict, status: int = 200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timed out) before the reply
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            server = self.server
+            self._send({"requests": server.requests, "active": server.active, "max_active": server.max_active})
+        else:
+            self._send({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send({"error": {"message": "not found"}}, status=404)
+            return
+        with server._lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+        finally:
+            with server._lock:
+                server.active -= 1
+        reply = server.reply if server.reply is not None else default_reply(request)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request.get("messages", []))
+        completion_tokens = len(reply.split())
+        self._send({
+            "id": f"chatcmpl-fake-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--reply", default=None, help="fixed reply content (default: neutral sentiment scores)")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, args.delay, args.reply)
+    print(f"Fake OpenAI API on {server.base_url}")
+    server.serve_forever()
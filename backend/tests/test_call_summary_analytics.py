@@ -0,0 +1,101 @@
+"""Call summary analytics: in-memory and MongoDB aggregation agree
+
+Stores summaries with messy objections_raised entries (typed objects,
+objects without or with a null type, bare strings, numbers, nulls) and
+checks the in-memory analytics against hand-counted totals. When MongoDB
+is reachable at DATABASE_URL, the $facet aggregation over the same
+summaries must give the same analytics.
+
+Run from the backend directory:
+    python tests/test_call_summary_analytics.py
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db.database as database
+from core.call_summary_rollups import analytics_from_rollup
+from db.database import MongoDBService
+
+logging.disable(logging.WARNING)
+
+SUMMARIES = [
+    {
+        "room_id": "R1", "generated_at": "2025-02-01T09:00:00", "call_outcome": "success",
+        "customer_satisfaction": 0.8, "objection_handling_score": 0.9, "recommendations_made": 2,
+        "objections_raised": [{"type": "price"}, {"type": "price"}, "too expensive", {"details": "no type"}],
+        "improvement_areas": ["closing"], "agent_response_quality": "excellent",
+    },
+    {
+        "room_id": "R2", "generated_at": "2025-02-02T09:00:00", "call_outcome": "no_sale",
+        "customer_satisfaction": 0.4, "objection_handling_score": 0.5, "recommendations_made": 1,
+        "objections_raised": [{"type": None}, 42, None, {"type": "timing"}],
+        "improvement_areas": ["closing", "empathy"], "agent_response_quality": "good",
+    },
+    {
+        "room_id": "R3", "generated_at": "2025-02-03T09:00:00", "call_outcome": "success",
+        "objections_raised": ["shipping"], "improvement_areas": [],
+    },
+]
+
+
+def comparable(rollup):
+    analytics = analytics_from_rollup(rollup)
+    analytics.pop("analysis_date", None)
+    return analytics
+
+
+async def memory_analytics(**filters):
+    service = MongoDBService()
+    service.use_memory = True
+    for summary in SUMMARIES:
+        await service.store_call_summary(summary["room_id"], dict(summary))
+    return comparable(await service.aggregate_call_summary_analytics(**filters))
+
+
+async def check_memory():
+    print("In-memory analytics over mixed objections...")
+    analytics = await memory_analytics()
+    assert analytics["top_objections"] == [
+        {"type": "price", "count": 2}, {"type": "unknown", "count": 2}, {"type": "timing", "count": 1}
+    ], analytics["top_objections"]
+    assert analytics["total_calls"] == 3 and analytics["outcomes_distribution"] == {"success": 2, "no_sale": 1}
+    assert analytics["top_improvement_areas"][0] == {"area": "closing", "count": 2}
+    print("   ✅ non-object entries skipped, untyped and null-typed objects counted as unknown")
+
+
+async def check_mongo():
+    print("MongoDB aggregation matches the in-memory analytics...")
+    service = MongoDBService()
+    service.client = database.AsyncIOMotorClient(os.getenv("DATABASE_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=3000)
+    try:
+        await service.client.admin.command("ping")
+    except Exception as e:
+        print(f"   ⚠️  skipped (MongoDB not reachable: {type(e).__name__})")
+        service.client.close()
+        return
+    service.call_summaries_collection = service.client["call_summary_analytics_test"].call_summaries
+    try:
+        await service.client.drop_database("call_summary_analytics_test")
+        await service.call_summaries_collection.insert_many([dict(summary) for summary in SUMMARIES])
+        for filters in ({}, {"outcome": "success"}, {"date_from": datetime(2025, 2, 2)}):
+            mongo = comparable(await service.aggregate_call_summary_analytics(**filters))
+            assert mongo == await memory_analytics(**filters), (filters, mongo)
+        print("   ✅ same analytics unfiltered, by outcome and by date")
+    finally:
+        await service.client.drop_database("call_summary_analytics_test")
+        service.client.close()
+
+
+async def main():
+    await check_memory()
+    await check_mongo()
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+"""Catalog store and CatalogCache behavior checks
+
+Exercises the in-memory store's change log, the read-through cache
+(thread safety and stale fills racing an invalidation) and, when MongoDB
+is reachable at DATABASE_URL, that changes_since never reports a version
+whose change record is not yet visible, and that an engine too far
+behind the change log reloads the catalog in the background.
+
+Run from the backend directory:
+    python tests/test_catalog_store.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.catalog_store import CatalogCache, CatalogStore, MemoryCatalogStore, MongoCatalogStore
+
+logging.disable(logging.WARNING)
+
+
+def book(book_id, stock=5):
+    return {"book_id": book_id, "title": f"Book {book_id}", "stock_quantity": stock}
+
+
+async def check_memory_change_log():
+    print("Memory store change log...")
+    store = MemoryCatalogStore([book("A"), book("B")])
+    assert await store.changes_since(0) == (0, [])
+    await store.upsert_books([book("C")])
+    await store.set_stock("A", 0)
+    version, changed = await store.changes_since(0)
+    assert version == 2 and changed == ["C", "A"], (version, changed)
+    assert await store.changes_since(2) == (2, [])
+    assert (await store.changes_since(5))[1] is None  # ahead of the store: reload
+    print("   ✅ versions and changed ids")
+
+
+def check_abstract_store():
+    print("Incomplete CatalogStore backends...")
+
+    class Partial(CatalogStore):
+        async def count_books(self):
+            return 0
+
+    try:
+        Partial()
+        raise AssertionError("expected TypeError")
+    except TypeError:
+        print("   ✅ rejected at construction")
+
+
+class SlowStore(MemoryCatalogStore):
+    """Memory store whose reads can be held open while the test invalidates"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def get_books(self, book_ids):
+        documents = self.get_books_blocking(book_ids)
+        self.reading.set()
+        await self.release.wait()
+        return documents
+
+
+async def check_stale_fill():
+    print("Cache fill racing an invalidation...")
+    store = SlowStore([book("A", stock=5)])
+    cache = CatalogCache(store, dict)
+    read = asyncio.create_task(cache.get("A"))
+    await store.reading.wait()
+    # Stock changes while the read holds the old document
+    await store.set_stock("A", 0)
+    cache.invalidate(["A"])
+    store.release.set()
+    assert (await read)["stock_quantity"] == 5  # the caller still gets what it read
+    assert len(cache) == 0 and cache.stats()["stale_fills"] == 1
+    store.reading.clear()
+    fresh = asyncio.create_task(cache.get("A"))
+    await store.reading.wait()
+    assert (await fresh)["stock_quantity"] == 0 and len(cache) == 1
+    print("   ✅ stale document served once, not cached")
+
+
+def check_threaded_cache():
+    print("Cache shared by threads...")
+    store = MemoryCatalogStore([book(f"B{i:04d}") for i in range(2000)])
+    cache = CatalogCache(store, dict, maxsize=100)
+    errors = []
+
+    def reader(seed):
+        try:
+            for i in range(3000):
+                cache.get_many_blocking([f"B{(seed * 7 + i * 13) % 2000:04d}", f"B{i % 150:04d}"])
+        except Exception as e:
+            errors.append(e)
+
+    def invalidator():
+        try:
+            for i in range(3000):
+                cache.invalidate([f"B{i % 150:04d}"] if i % 10 else None)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(6)] + [threading.Thread(target=invalidator)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:3]
+    assert len(cache) <= 100
+    print(f"   ✅ no errors, size {len(cache)}, {cache.stats()}")
+
+
+async def check_mongo_change_log():
+    print("MongoDB changes_since with a change record not yet logged...")
+    store = MongoCatalogStore(os.getenv("DATABASE_URL", "mongodb://localhost:27017"), "catalog_store_test")
+    try:
+        await asyncio.wait_for(store.client.admin.command("ping"), 3)
+    except Exception as e:
+        print(f"   ⚠️  skipped (MongoDB not reachable: {type(e).__name__})")
+        store.client.close()
+        return
+    try:
+        await store.client.drop_database("catalog_store_test")
+        await store.connect()
+        await store.upsert_books([book("A")])
+        # A writer that bumped the version but has not logged its change yet
+        await store.meta_collection.update_one({"_id": "books"}, {"$inc": {"version": 1}})
+        version, changed = await store.changes_since(0)
+        assert version == 1 and changed == ["A"], (version, changed)
+        await store.changes_collection.insert_one({"version": 2, "book_ids": ["B"], "created_at": None})
+        assert await store.changes_since(version) == (2, ["B"])
+        print("   ✅ reports only versions whose changes it read")
+
+        # Concurrent writers: version 4 logged before version 3
+        await store.meta_collection.update_one({"_id": "books"}, {"$inc": {"version": 2}})
+        await store.changes_collection.insert_one({"version": 4, "book_ids": ["D"], "created_at": None})
+        assert await store.changes_since(2) == (2, [])
+        await store.changes_collection.insert_one({"version": 3, "book_ids": ["C"], "created_at": None})
+        assert await store.changes_since(2) == (4, ["C", "D"])
+        await store.changes_collection.delete_many({"version": {"$lte": 2}})
+        assert (await store.changes_since(1))[1] is None
+        print("   ✅ a gap waits for the missing record; only an expired log means reload")
+    finally:
+        await store.client.drop_database("catalog_store_test")
+        await store.disconnect()
+
+
+async def check_background_reload():
+    print("Engine sync when the change log no longer covers its version...")
+    from services.product_recommendation import ProductRecommendationEngine
+
+    store = MemoryCatalogStore([book("A"), book("B")])
+    await store.upsert_books([book("C")])
+    engine = ProductRecommendationEngine(store)
+    engine.catalog_version = 7  # ahead of the store: changes_since says reload
+    await engine.sync_catalog(force=True)
+    assert engine.catalog_version == 7 and engine._catalog_reload is not None
+    await engine._catalog_reload
+    assert engine.catalog_version == 1 and engine.catalog_loaded
+    print("   ✅ full reload scheduled in the background, not run inline")
+
+
+async def main():
+    await check_memory_change_log()
+    await check_background_reload()
+    check_abstract_store()
+    await check_stale_fill()
+    check_threaded_cache()
+    await check_mongo_change_log()
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""Co-purchase model checks: incremental refreshes against a full recount
+
+Feeds CoPurchaseModel a small hand-checked history, then a long random
+stream of added, re-assigned and cancelled orders refreshed in rounds, and
+checks after every round that the incrementally maintained table equals
+one recounted from scratch over the surviving orders. Also checks that
+refresh returns every row that changed, that save/load round-trips, and
+that CoPurchaseJob's incremental refresh (over the in-memory database
+service) drops the pairs of an old order rejected long after it was placed.
+
+Run from the backend directory:
+    python tests/test_co_purchase.py
+"""
+import asyncio
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.co_purchase_job import CoPurchaseJob
+from db.database import db_service
+from services.co_purchase import CoPurchaseModel
+
+logging.disable(logging.WARNING)
+
+
+def recount(orders, k):
+    model = CoPurchaseModel(k=k)
+    for room_id, (customer, book_id) in orders.items():
+        model.add_order(room_id, customer, book_id)
+    model.refresh()
+    return model.table()
+
+
+def also_bought_ids(model, book_id):
+    return [row["book_id"] for row in model.also_bought(book_id)]
+
+
+def check_small_history():
+    print("Hand-checked baskets...")
+    model = CoPurchaseModel(k=3)
+    history = [("a", "X"), ("a", "Y"), ("b", "X"), ("b", "Y"), ("b", "Z"), ("c", "Z"), ("c", "W")]
+    for index, (customer, book_id) in enumerate(history):
+        model.add_order(f"r{index}", customer, book_id)
+    model.refresh()
+    # X and Y share both their buyers; Z shares one of its two
+    assert also_bought_ids(model, "X")[0] == "Y" and set(also_bought_ids(model, "X")) == {"Y", "Z"}
+    assert also_bought_ids(model, "W") == ["Z"]
+    changed = model.refresh()
+    assert changed == {}, changed  # nothing happened since
+    model.remove_order("r4")  # b no longer bought Z
+    changed = model.refresh()
+    assert also_bought_ids(model, "X") == ["Y"] and "Z" in changed and "X" in changed
+    print("   ✅ neighbours, empty refresh, cancellation")
+
+
+def check_incremental_matches_recount(rounds=25, k=5):
+    print(f"Random order stream, {rounds} refresh rounds...")
+    rng = random.Random(11)
+    model = CoPurchaseModel(k=k)
+    orders = {}
+    previous = {}
+    for _ in range(rounds):
+        for _ in range(150):
+            room_id = f"room{rng.randrange(1500)}"
+            if room_id in orders and rng.random() < 0.3:
+                del orders[room_id]
+                model.remove_order(room_id)
+            else:
+                # Re-adding a room replaces its order (customer or book changed)
+                orders[room_id] = (f"c{rng.randrange(200)}", f"b{int(rng.paretovariate(1.2)) % 120}")
+                model.add_order(room_id, *orders[room_id])
+        changed = model.refresh()
+        table = model.table()
+        assert table == recount(orders, k)
+        # Every row that differs from the previous round was reported
+        moved = {book_id for book_id in set(table) | set(previous) if table.get(book_id) != previous.get(book_id)}
+        assert moved <= set(changed), moved - set(changed)
+        previous = table
+    print(f"   ✅ equal to a full recount after every round ({len(orders)} orders, {len(previous)} books)")
+    return model, previous
+
+
+def check_save_load(model, table):
+    print("Save and load...")
+    directory = tempfile.mkdtemp()
+    try:
+        model.save(directory)
+        loaded = CoPurchaseModel(k=model.k)
+        assert loaded.load(directory) and loaded.table() == table
+        loaded.add_order("late-room", "c1", "b1")
+        loaded.refresh()
+        assert loaded.has_order("late-room")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("   ✅ same table after a reload, and it keeps refreshing incrementally")
+
+
+class FakeCatalogStore:
+    """Keeps the co-purchase rows the job writes"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def upsert_co_purchases(self, rows, replace=False):
+        if replace:
+            self.rows = {}
+        for book_id, also_bought in rows.items():
+            if also_bought:
+                self.rows[book_id] = also_bought
+            else:
+                self.rows.pop(book_id, None)
+        return len(rows)
+
+
+async def check_job_picks_up_late_rejection():
+    print("Job: incremental refresh after an old order is rejected...")
+    db_service.use_memory = True
+    long_ago = datetime.utcnow() - timedelta(days=90)
+    orders = [("R-old", "a", "X"), ("R2", "a", "Y"), ("R3", "b", "X"), ("R4", "b", "Z"), ("R5", "c", "Q"), ("R-new", "d", "W")]
+    for room_id, customer, title in orders:
+        order = {"order_id": f"O-{room_id}", "customer_id": customer, "book_title": title, "order_status": "confirmed"}
+        if room_id == "R-new":
+            order["order_date"] = datetime.utcnow()
+        elif room_id != "R5":  # R5 has no order_date at all
+            order["order_date"] = long_ago
+        await db_service.store_order(room_id, order)
+    store = FakeCatalogStore()
+    job = CoPurchaseJob(db_service, store, lambda title: SimpleNamespace(book_id=title))
+    assert (await job.run())["mode"] == "full"
+    assert {row["book_id"] for row in store.rows["X"]} == {"Y", "Z"}
+    # As if the orders were written when placed and that refresh ran yesterday
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    for room_id, order in db_service._memory_orders.items():
+        order["updated_at"] = yesterday if room_id == "R-new" else long_ago
+    db_service._memory_job_checkpoints["co_purchase_model"]["last_updated_at"] = yesterday
+
+    # Rejected three months after it was placed, then a newer order arrives
+    await db_service.bulk_update_order_status([{"room_id": "R-old", "order_id": "O-R-old", "status": "rejected"}])
+    await db_service.store_order("R6", {"order_id": "O-R6", "customer_id": "c", "book_title": "X", "order_status": "confirmed", "order_date": datetime.utcnow()})
+    progress = await job.run()
+    assert progress["mode"] == "incremental" and progress["scanned"] == 3, progress
+    assert {row["book_id"] for row in store.rows["X"]} == {"Z", "Q"}, store.rows["X"]
+    assert "Y" not in store.rows, store.rows
+    print("   ✅ only orders written since the last refresh re-read; the rejected order's pairs are gone")
+
+
+def main():
+    check_small_history()
+    model, table = check_incremental_matches_recount()
+    check_save_load(model, table)
+    asyncio.run(check_job_picks_up_late_rejection())
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
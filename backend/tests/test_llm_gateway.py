@@ -0,0 +1,78 @@
+"""Shared LLM gateway against the local fake OpenAI server
+
+Starts tests/fake_openai_server.py in-process and checks that identical
+concurrent prompts share one upstream request, that the concurrency limit
+holds, that slow calls time out, and that tokens are counted per caller.
+
+Run from the backend directory:
+    python tests/test_llm_gateway.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeOpenAIServer
+from services.llm_gateway import LLMGateway
+
+
+def messages(text):
+    return [{"role": "system", "content": "You are a sales assistant."}, {"role": "user", "content": text}]
+
+
+async def main():
+    server = FakeOpenAIServer(port=0, delay=0.3).start()
+    gateway = LLMGateway(api_key="test-key", base_url=server.base_url, max_concurrency=3, timeout=5.0)
+    sentiment, questions = gateway.client_for("sentiment"), gateway.client_for("questions")
+
+    print("20 identical prompts at once...")
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(
+        sentiment.chat.completions.create(model="gpt-3.5-turbo", messages=messages("I love this book"), max_tokens=50)
+        for _ in range(20)
+    ))
+    print(f"   {time.perf_counter() - started:.2f}s, upstream requests: {server.requests}")
+    assert server.requests == 1, server.requests
+    assert all(json.loads(r.choices[0].message.content)["sentiment"] == "neutral" for r in responses)
+
+    print("12 different prompts with a concurrency limit of 3...")
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        questions.chat.completions.create(model="gpt-3.5-turbo", messages=messages(f"question {i}"), max_tokens=50)
+        for i in range(12)
+    ))
+    print(f"   {time.perf_counter() - started:.2f}s, most at once upstream: {server.max_active}")
+    assert server.requests == 13 and server.max_active <= 3
+
+    print("A call slower than its timeout...")
+    try:
+        await questions.chat.completions.create(model="gpt-3.5-turbo", messages=messages("slow"), timeout=0.1)
+        raise AssertionError("expected a timeout")
+    except Exception as e:
+        print(f"   raised {type(e).__name__}")
+
+    print("The same prompt at once with a short and a long timeout...")
+    short, long = await asyncio.gather(
+        questions.chat.completions.create(model="gpt-3.5-turbo", messages=messages("shared"), timeout=0.1),
+        questions.chat.completions.create(model="gpt-3.5-turbo", messages=messages("shared"), timeout=10),
+        return_exceptions=True
+    )
+    print(f"   short: {type(short).__name__}, long: {type(long).__name__}")
+    assert isinstance(short, Exception) and not isinstance(long, Exception)
+
+    stats = gateway.stats()
+    print(json.dumps(stats, indent=2))
+    assert stats["callers"]["sentiment"]["calls"] == 20 and stats["callers"]["sentiment"]["shared"] == 19
+    assert stats["callers"]["sentiment"]["requests"] == 1 and stats["callers"]["sentiment"]["prompt_tokens"] > 0
+    assert stats["callers"]["questions"]["timeouts"] == 2
+    await gateway.close()
+    server.shutdown()
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""Notification outbox behavior checks
+
+Drives OutboxWorker against the in-memory database service: messages are
+queued with the order that caused them, claimed under a lease (and
+reclaimed once it expires, with the stale claim's results ignored), retried with exponential backoff, given up
+after max_attempts, and dropped some time after delivery. When MongoDB is
+reachable at DATABASE_URL as a replica set, also checks that a failed
+outbox insert rolls back the order written with it.
+
+Run from the backend directory:
+    python tests/test_notification_outbox.py
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db.database as database
+from core.notification_outbox import OutboxWorker
+from db.database import MongoDBService
+
+
+def memory_service():
+    service = MongoDBService()
+    service.use_memory = True
+    return service
+
+
+def message(key):
+    return {"idempotency_key": key, "kind": "order_confirmation", "recipient": "reader@example.com", "subject": "Order", "body": "Thanks"}
+
+
+class Sender:
+    """Records deliveries; keys in `failing` get an error back"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.delivered = []
+
+    def __call__(self, batch):
+        results = {}
+        for item in batch:
+            key = item["idempotency_key"]
+            results[key] = "SMTP unavailable" if key in self.failing else None
+            if key not in self.failing:
+                self.delivered.append(key)
+        return results
+
+
+async def check_enqueue_with_order():
+    print("Messages queued with the order write...")
+    service = memory_service()
+    await service.store_order("R1", {"order_id": "O1", "order_status": "pending"}, outbox_messages=[message("order-pending:O1")])
+    await service.store_order("R1", {"order_id": "O1", "order_status": "pending"}, outbox_messages=[message("order-pending:O1")])
+    assert (await service.get_order("R1"))["order_id"] == "O1"
+    assert await service.get_outbox_stats() == {"pending": 1}  # the repeated key is ignored
+    print("   ✅ one pending message per idempotency key")
+
+
+async def check_claim_lease():
+    print("Claim leases...")
+    service = memory_service()
+    await service.enqueue_notifications([message(f"k{i}") for i in range(3)])
+    first = await service.claim_outbox_batch("worker-a", limit=2, lease_seconds=60)
+    second = await service.claim_outbox_batch("worker-b", limit=10, lease_seconds=60)
+    assert len(first) == 2 and [m["idempotency_key"] for m in second] == ["k2"]
+    assert await service.claim_outbox_batch("worker-c") == []
+    print("   ✅ claimed messages are not handed out twice")
+
+    # A worker that died mid-batch: its lease runs out and the messages come back
+    service = memory_service()
+    await service.enqueue_notifications([message("k0")])
+    await service.claim_outbox_batch("worker-a", lease_seconds=0)
+    reclaimed = await service.claim_outbox_batch("worker-b", lease_seconds=60)
+    assert [m["idempotency_key"] for m in reclaimed] == ["k0"] and reclaimed[0]["claimed_by"].startswith("worker-b:")
+    print("   ✅ expired lease is reclaimed")
+
+    # The first worker was only slow: its late results must not overwrite the new claim
+    service = memory_service()
+    await service.enqueue_notifications([message("k0")])
+    late = await service.claim_outbox_batch("worker-a", lease_seconds=0)
+    current = await service.claim_outbox_batch("worker-b", lease_seconds=60)
+    assert await service.record_outbox_results({"k0": {"status": "failed", "last_error": "late"}}, late[0]["claimed_by"]) == 0
+    record = service._memory_outbox["k0"]
+    assert record["status"] == "sending" and record["attempts"] == 0 and record["claimed_by"] == current[0]["claimed_by"]
+    assert await service.record_outbox_results({"k0": {"status": "sent", "sent_at": datetime.utcnow(), "last_error": None}}, current[0]["claimed_by"]) == 1
+    assert record["status"] == "sent" and record["attempts"] == 1
+    print("   ✅ results from a lost lease are dropped, the current claim's results apply")
+
+
+async def check_backoff_and_give_up():
+    print("Backoff and max_attempts...")
+    service = memory_service()
+    sender = Sender(failing={"bad"})
+    worker = OutboxWorker(service, sender, max_attempts=3, retry_base_seconds=30, retry_max_seconds=100)
+    await service.enqueue_notifications([message("good"), message("bad")])
+
+    before = datetime.utcnow()
+    assert await worker.run_once() == 2
+    record = service._memory_outbox["bad"]
+    assert sender.delivered == ["good"] and service._memory_outbox["good"]["status"] == "sent"
+    assert record["status"] == "pending" and record["attempts"] == 1 and record["last_error"] == "SMTP unavailable"
+    assert timedelta(seconds=59) <= record["next_attempt_at"] - before <= timedelta(seconds=61)  # 30 * 2**1
+    assert await worker.run_once() == 0  # not due yet
+    print("   ✅ failed message waits 60s after the first failure")
+
+    record["next_attempt_at"] = datetime.utcnow()
+    await worker.run_once()
+    assert record["attempts"] == 2 and record["next_attempt_at"] - datetime.utcnow() > timedelta(seconds=99)  # capped at 100
+    record["next_attempt_at"] = datetime.utcnow()
+    await worker.run_once()
+    assert record["status"] == "failed" and record["attempts"] == 3
+    record["next_attempt_at"] = datetime.utcnow()
+    assert await worker.run_once() == 0
+    print("   ✅ delay capped, given up after 3 attempts")
+
+
+async def check_prune_delivered():
+    print("Delivered messages are pruned...")
+    service = memory_service()
+    worker = OutboxWorker(service, Sender(failing={"bad"}), max_attempts=1)
+    retention = database.OUTBOX_SENT_RETENTION
+    database.OUTBOX_SENT_RETENTION = timedelta(0)
+    try:
+        await service.enqueue_notifications([message(f"k{i}") for i in range(100)] + [message("bad")])
+        while await worker.run_once():
+            pass
+    finally:
+        database.OUTBOX_SENT_RETENTION = retention
+    assert list(service._memory_outbox) == ["bad"] and not service._memory_outbox_sent
+    print("   ✅ only the failed message is kept")
+
+    service = memory_service()
+    worker = OutboxWorker(service, Sender())
+    await service.enqueue_notifications([message("k0")])
+    await worker.run_once()
+    await service.enqueue_notifications([message("k0")])
+    assert await service.claim_outbox_batch("worker-a") == []
+    print("   ✅ within the retention period a repeated key is still not resent")
+
+
+async def check_mongo_rollback():
+    print("MongoDB: a failed outbox insert rolls back the order...")
+    service = MongoDBService()
+    service.client = database.AsyncIOMotorClient(os.getenv("DATABASE_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=3000)
+    try:
+        hello = await service.client.admin.command("hello")
+    except Exception as e:
+        print(f"   ⚠️  skipped (MongoDB not reachable: {type(e).__name__})")
+        service.client.close()
+        return
+    if not hello.get("setName"):
+        print("   ⚠️  skipped (standalone MongoDB has no transactions)")
+        service.client.close()
+        return
+    service.db = service.client["notification_outbox_test"]
+    service.orders_collection = service.db.orders
+    service.outbox_collection = service.db.notification_outbox
+    service.supports_transactions = True
+    try:
+        await service.client.drop_database("notification_outbox_test")
+        await service.outbox_collection.create_index("idempotency_key", unique=True)
+        await service.orders_collection.insert_one({"room_id": "R1"})  # collections exist before the transaction
+        try:
+            # A "$"-prefixed field name makes the outbox write fail inside the transaction
+            await service.store_order("R2", {"order_id": "O2"}, outbox_messages=[{**message("k"), "$bad": 1}])
+            raise AssertionError("expected the outbox insert to fail")
+        except AssertionError:
+            raise
+        except Exception:
+            pass
+        assert await service.get_order("R2") is None
+        print("   ✅ order not written")
+    finally:
+        await service.client.drop_database("notification_outbox_test")
+        service.client.close()
+
+
+async def main():
+    await check_enqueue_with_order()
+    await check_claim_lease()
+    await check_backoff_and_give_up()
+    await check_prune_delivered()
+    await check_mongo_rollback()
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""Order listing pagination and filter checks
+
+Pages through /orders/all and /orders/user/{id} in-process (FastAPI
+TestClient over the in-memory database service) and checks that following
+next_cursor returns every matching order exactly once, in the same order
+as the unpaged listing: ties on order_date, undated orders and drafts
+included. Also checks each filter against a plain Python filter, the
+/orders/count totals, field selection and malformed cursors. When MongoDB
+is reachable at DATABASE_URL, the same pages are compared against it.
+
+Run from the backend directory:
+    python tests/test_order_listing.py
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import db.database as database
+from db.database import MongoDBService, db_service
+from main import app
+
+logging.disable(logging.WARNING)
+
+START = datetime(2025, 3, 1)
+
+
+def make_orders(count=60):
+    rng = random.Random(5)
+    orders = []
+    for index in range(count):
+        order = {
+            "order_id": f"O{index:03d}",
+            "customer_id": f"C{index % 4}",
+            "customer_name": f"Customer {index % 4}",
+            "book_title": "Book",
+            "order_status": rng.choice(["pending", "confirmed", "rejected", "draft"]),
+            "payment_method": rng.choice(["card", "cash"]),
+        }
+        if index % 9:  # every ninth order has no date
+            # Few distinct days, so many orders tie on order_date
+            order["order_date"] = START + timedelta(days=rng.randint(0, 5))
+        orders.append((f"R{index:03d}", order))
+    return orders
+
+
+def expected(orders, status=None, payment_method=None, customer=None, date_from=None, date_to=None):
+    """Plain reimplementation of the listing rules: newest first, undated last, drafts hidden"""
+    matching = []
+    for room_id, order in orders:
+        if (order["order_status"] != status) if status else order["order_status"] == "draft":
+            continue
+        if payment_method and order["payment_method"] != payment_method:
+            continue
+        if customer and customer not in (order["customer_id"], order["customer_name"]):
+            continue
+        order_date = order.get("order_date")
+        if (date_from or date_to) and order_date is None:
+            continue
+        if (date_from and order_date < date_from) or (date_to and order_date >= date_to):
+            continue
+        matching.append((order_date is not None, order_date or datetime.min, room_id))
+    return [room_id for *_, room_id in sorted(matching, reverse=True)]
+
+
+def page_through(client, path, limit, **params):
+    room_ids, cursor, pages = [], None, 0
+    while True:
+        query = {**params, "limit": limit}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get(path, params=query)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert len(body["orders"]) <= limit
+        room_ids.extend(body["orders"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return room_ids, pages
+
+
+def check_api(client, orders):
+    print("Cursor round trip...")
+    everything = client.get("/orders/all").json()
+    assert everything["next_cursor"] is None and list(everything["orders"]) == expected(orders)
+    for limit in (1, 7, 50, 500):
+        room_ids, pages = page_through(client, "/orders/all", limit)
+        assert room_ids == expected(orders), limit
+        assert pages == max(1, -(-len(room_ids) // limit)), (limit, pages)
+    print(f"   ✅ {len(expected(orders))} orders, same sequence unpaged and at page sizes 1/7/50/500")
+
+    print("Filters...")
+    cases = [
+        {"status": "confirmed"},
+        {"status": "draft"},
+        {"payment_method": "cash"},
+        {"date_from": START + timedelta(days=2), "date_to": START + timedelta(days=4)},
+        {"status": "pending", "payment_method": "card", "date_from": START + timedelta(days=1)},
+    ]
+    for filters in cases:
+        params = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in filters.items()}
+        room_ids, _ = page_through(client, "/orders/all", 4, **params)
+        assert room_ids == expected(orders, **filters), filters
+        assert client.get("/orders/count", params=params).json()["total_orders"] == len(room_ids), filters
+    for customer in ("C1", "Customer 2"):
+        room_ids, _ = page_through(client, f"/orders/user/{customer}", 3)
+        assert room_ids == expected(orders, customer=customer), customer
+    print(f"   ✅ {len(cases)} filter combinations and 2 customers match, counts agree")
+
+    print("Fields and malformed cursors...")
+    body = client.get("/orders/all", params={"limit": 2, "fields": "order_id,order_status"}).json()
+    assert all(set(order) == {"order_id", "order_status"} for order in body["orders"].values())
+    assert client.get("/orders/all", params={"fields": "password"}).status_code == 400
+    assert client.get("/orders/all", params={"limit": 2, "cursor": "not-a-cursor"}).status_code == 400
+    print("   ✅ projection applied, unknown fields and bad cursors are 400s")
+
+
+async def check_mongo(orders):
+    print("MongoDB pages match the in-memory listing...")
+    service = MongoDBService()
+    service.client = database.AsyncIOMotorClient(os.getenv("DATABASE_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=3000)
+    try:
+        await service.client.admin.command("ping")
+    except Exception as e:
+        print(f"   ⚠️  skipped (MongoDB not reachable: {type(e).__name__})")
+        service.client.close()
+        return
+    service.orders_collection = service.client["order_listing_test"].orders
+    try:
+        await service.client.drop_database("order_listing_test")
+        await service.orders_collection.insert_many([{**order, "room_id": room_id} for room_id, order in orders])
+        for filters in ({}, {"status": "confirmed"}, {"payment_method": "cash", "date_from": START + timedelta(days=1)}):
+            room_ids, cursor = [], None
+            while True:
+                page, cursor = await service.list_orders(filters, limit=5, cursor=cursor)
+                room_ids.extend(order["room_id"] for order in page)
+                if not cursor:
+                    break
+            assert room_ids == expected(orders, **filters), filters
+        print("   ✅ same sequences")
+    finally:
+        await service.client.drop_database("order_listing_test")
+        service.client.close()
+
+
+def main():
+    orders = make_orders()
+    # Not entered as a context manager: startup would try to reach MongoDB
+    client = TestClient(app)
+    db_service.use_memory = True
+    for room_id, order in orders:
+        asyncio.run(db_service.store_order(room_id, dict(order)))
+    check_api(client, orders)
+    asyncio.run(check_mongo(orders))
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
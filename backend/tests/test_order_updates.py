@@ -0,0 +1,70 @@
+"""Order writes and optimistic versioning checks
+
+Runs the admin update-status endpoint in-process (FastAPI TestClient over
+the in-memory database service) and checks that store_order replaces the
+order while bumping its version, that a stale expected_version gets a 409,
+that an unknown room or order id gets a 404, and that field-level updates
+leave other fields alone.
+
+Run from the backend directory:
+    python tests/test_order_updates.py
+"""
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from db.database import db_service
+from main import app
+
+logging.disable(logging.WARNING)
+
+
+def update_status(client, room_id, order_id, status, expected_version=None):
+    body = {"room_id": room_id, "order_id": order_id, "status": status}
+    if expected_version is not None:
+        body["expected_version"] = expected_version
+    return client.post("/api/admin/orders/update-status", json=body)
+
+
+def main():
+    # Not entered as a context manager: startup would try to reach MongoDB
+    client = TestClient(app)
+    db_service.use_memory = True
+
+    print("store_order replaces the order and bumps its version...")
+    asyncio.run(db_service.store_order("R1", {"order_id": "O1", "order_status": "pending", "gift_note": "Happy birthday"}))
+    asyncio.run(db_service.store_order("R1", {"order_id": "O1", "order_status": "pending", "version": 99}))
+    order = asyncio.run(db_service.get_order("R1"))
+    assert "gift_note" not in order and order["version"] == 2, order
+    print("   ✅ dropped field gone, version 2 (caller's version ignored)")
+
+    print("Status updates with expected_version...")
+    response = update_status(client, "R1", "O1", "confirmed", expected_version=2)
+    assert response.status_code == 200 and response.json()["version"] == 3, response.text
+    response = update_status(client, "R1", "O1", "rejected", expected_version=2)
+    assert response.status_code == 409, response.text
+    assert asyncio.run(db_service.get_order("R1"))["order_status"] == "confirmed"
+    print("   ✅ current version applied, stale version 409 and not applied")
+
+    print("Orders that do not exist...")
+    assert update_status(client, "R1", "O-other", "confirmed", expected_version=3).status_code == 404
+    assert update_status(client, "R-missing", "O1", "confirmed", expected_version=0).status_code == 404
+    assert update_status(client, "R-missing", "O1", "confirmed").status_code == 404
+    print("   ✅ 404 for another order id and for a missing room")
+
+    print("Field-level updates...")
+    order = asyncio.run(db_service.update_order_fields("R1", inc_fields={"reminders_sent": 1}))
+    assert order["reminders_sent"] == 1 and order["order_status"] == "confirmed" and order["version"] == 4
+    assert asyncio.run(db_service.update_order_fields("R1", set_fields={"note": "x"}, expected_version=3)) is None
+    print("   ✅ inc-only update keeps the other fields, stale update returns None")
+
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Recommendation result cache checks
+
+Unit checks of RecommendationCache (LRU bound, time-to-live, per-customer
+invalidation) and, through ProductRecommendationEngine with a fake OpenAI
+client, that a repeated request is served from the cache, that a profile
+update drops only that customer's lists, and that a stock change drops
+every list.
+
+Run from the backend directory:
+    python tests/test_recommendation_cache.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.product_recommendation import ProductRecommendationEngine
+from services.recommendation_cache import RecommendationCache, context_fingerprint
+
+logging.disable(logging.WARNING)
+
+
+class FakeOpenAI:
+    """Counts chat completion calls and always recommends the same book"""
+
+    def __init__(self, book_id):
+        self.calls = 0
+        self.book_id = book_id
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **params):
+        self.calls += 1
+        content = json.dumps({"recommendations": [{"book_id": self.book_id, "confidence_score": 0.95, "reason": "Fits the conversation"}]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def check_cache_unit():
+    print("RecommendationCache...")
+    cache = RecommendationCache(maxsize=3, ttl=60)
+    for index in range(4):
+        cache.put(("C1" if index % 2 else "C2", index), "C1" if index % 2 else "C2", [index])
+    assert len(cache) == 3 and cache.get(("C2", 0)) is None  # oldest evicted
+    generation = cache.generation
+    cache.invalidate_customer("C1")
+    assert len(cache) == 1 and cache.get(("C2", 2)) == [2] and cache.generation == generation + 1
+    print("   ✅ LRU bound and per-customer invalidation")
+
+    cache = RecommendationCache(ttl=0.05)
+    cache.put("key", "C1", [1])
+    assert cache.get("key") == [1]
+    time.sleep(0.06)
+    assert cache.get("key") is None and cache.stats()["expired"] == 1 and len(cache) == 0
+    assert context_fingerprint("I like History!") == context_fingerprint("i like   history")
+    print("   ✅ entries expire; context fingerprint ignores case, punctuation and spacing")
+
+
+async def check_engine_invalidation():
+    print("Engine: cache hits and invalidation...")
+    engine = ProductRecommendationEngine()
+    engine.openai_client = FakeOpenAI("BK006")
+
+    async def recommend(customer_id, context="I like history books"):
+        return [r.book.book_id for r in await engine.get_recommendations(customer_id, context, 5)]
+
+    first = await recommend("CUST001")
+    assert await recommend("CUST001", "i like HISTORY books!") == first
+    await recommend("CUST002")
+    assert engine.openai_client.calls == 2  # one per customer, the repeat was a hit
+    print("   ✅ repeated request served from the cache")
+
+    await engine.update_customer_profile("CUST001", {"book_id": "BK005", "price": 14.99, "rating": 5})
+    await recommend("CUST002")
+    assert engine.openai_client.calls == 2  # the other customer's list survives
+    await recommend("CUST001")
+    assert engine.openai_client.calls == 3
+    print("   ✅ profile update drops only that customer's lists")
+
+    await engine.update_stock("BK006", 0)
+    assert len(engine.recommendation_cache) == 0
+    await recommend("CUST002")
+    assert engine.openai_client.calls == 4
+    print("   ✅ stock change drops every list")
+
+
+async def main():
+    check_cache_unit()
+    await check_engine_invalidation()
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
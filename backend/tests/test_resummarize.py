@@ -0,0 +1,58 @@
+"""Re-summarization job checks: summaries keep their identity and day bucket
+
+Stores a call summary dated in the past over the in-memory database
+service, runs ResummarizeJob over it and checks that the rebuilt summary
+keeps its summary_id and generated_at, so the rebuilt rollups still count
+the call in its original day rather than today's.
+
+Run from the backend directory:
+    python tests/test_resummarize.py
+"""
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.resummarize import ResummarizeJob
+from db.database import db_service
+
+logging.disable(logging.WARNING)
+
+GENERATED_AT = "2025-01-05T10:30:00"
+
+
+async def main():
+    db_service.use_memory = True
+    room_id = "room-resummarize"
+    for index, (role, message) in enumerate([
+        ("assistant", "Hello, this is the bookshop calling about your order."),
+        ("user", "Hi, yes, I'd like to confirm it please."),
+        ("assistant", "Great, your order is confirmed."),
+    ]):
+        await db_service.store_transcript(room_id, {"id": f"t{index}", "role": role, "message": message, "timestamp": 1000 + index})
+    await db_service.store_call_summary(room_id, {
+        "summary_id": "CS-20250105-ABCD1234",
+        "generated_at": GENERATED_AT,
+        "call_outcome": "order_confirmed",
+        "total_messages": 3,
+        "manual_notes": "called back",
+    })
+    assert "day:2025-01-05" in db_service._memory_call_summary_rollups
+
+    print("Re-summarizing a stored call...")
+    progress = await ResummarizeJob(db_service, workers=1, restart=True).run()
+    assert progress["processed"] == 1 and progress["failed"] == 0, progress
+    summary = db_service._memory_call_summaries[room_id]
+    assert summary["summary_id"] == "CS-20250105-ABCD1234" and summary["generated_at"] == GENERATED_AT, summary
+    assert summary["manual_notes"] == "called back" and summary["total_messages"] == 3
+    print("   ✅ summary_id and generated_at kept, content regenerated")
+
+    assert sorted(db_service._memory_call_summary_rollups) == ["all", "day:2025-01-05"], list(db_service._memory_call_summary_rollups)
+    print("   ✅ rebuilt rollups keep the call in its original day bucket")
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""Sentiment batching checks: lenient reply parsing and single-message fallback
+
+Feeds parse_batch_scores well-formed, wrapped, fenced, truncated and
+invalid replies, then drives SentimentBatcher with fake scoring callables
+to check that utterances a batch reply did not cover (cut off, bad label,
+unknown id) are scored singly, that duplicates share one score, and that
+a failed batch request gives every caller an error result without
+retrying each utterance.
+
+Run from the backend directory:
+    python tests/test_sentiment_batcher.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sentiment_batcher import SentimentBatcher, parse_batch_scores
+
+logging.disable(logging.WARNING)
+
+
+def score(index, sentiment="positive"):
+    return {"id": index, "sentiment": sentiment, "confidence": 0.8}
+
+
+def labels(scores):
+    return [s["sentiment"] if s else None for s in scores]
+
+
+def check_parsing():
+    print("Parsing batch replies...")
+    array = json.dumps([score(0), score(1, "negative"), score(2, "neutral")])
+    assert labels(parse_batch_scores(array, 3)) == ["positive", "negative", "neutral"]
+    assert "id" not in parse_batch_scores(array, 3)[0]
+    assert labels(parse_batch_scores(json.dumps({"scores": json.loads(array)}), 3)) == ["positive", "negative", "neutral"]
+    assert labels(parse_batch_scores(f"Here you go:\n```json\n{array}\n```", 3)) == ["positive", "negative", "neutral"]
+    print("   ✅ bare array, wrapped in an object, inside prose and a code fence")
+
+    truncated = array[:array.index('"neutral"')]  # cut off inside the third object
+    assert labels(parse_batch_scores(truncated, 3)) == ["positive", "negative", None]
+    mixed = json.dumps([score(0, "ecstatic"), score(7), score(True), {"sentiment": "neutral"}, score(1, "very_negative")])
+    assert labels(parse_batch_scores(mixed, 2)) == [None, "very_negative"]
+    assert parse_batch_scores("", 2) == [None, None] and parse_batch_scores("not json", 1) == [None]
+    print("   ✅ truncated reply keeps complete scores; bad labels, ids and empty replies are skipped")
+
+
+class FakeScorer:
+    """Batch and single scoring callables with canned replies"""
+
+    def __init__(self, reply_for_batch):
+        self.reply_for_batch = reply_for_batch
+        self.batches = []
+        self.singles = []
+
+    async def score_batch(self, messages):
+        self.batches.append(list(messages))
+        return self.reply_for_batch(messages)
+
+    async def score_one(self, message):
+        self.singles.append(message)
+        return {"sentiment": "neutral", "confidence": 0.5, "single": True}
+
+
+async def check_fallback():
+    print("Batcher fallback...")
+
+    def truncated_reply(messages):
+        # Complete scores for the first two utterances only, then cut off
+        reply = json.dumps([score(index) for index in range(len(messages))])
+        return reply[:reply.index('{"id": 2')] + '{"id": 2, "sentim'
+
+    scorer = FakeScorer(truncated_reply)
+    batcher = SentimentBatcher(scorer.score_batch, scorer.score_one, window=0.01, max_batch=10)
+    messages = ["love it", "great", "too pricey", "maybe later", "love it"]
+    results = await asyncio.gather(*(batcher.score(message) for message in messages))
+    assert scorer.batches == [["love it", "great", "too pricey", "maybe later"]]  # the duplicate is sent once
+    assert sorted(scorer.singles) == ["maybe later", "too pricey"]
+    assert [r.get("single", False) for r in results] == [False, False, True, True, False]
+    assert results[0] == results[4]
+    assert batcher.stats()["fallbacks"] == 2 and batcher.stats()["batches"] == 1
+    print("   ✅ uncovered utterances scored singly, duplicates share the batch score")
+
+    scorer = FakeScorer(lambda messages: json.dumps([score(0), score(1, "furious")]))
+    batcher = SentimentBatcher(scorer.score_batch, scorer.score_one, window=0.01)
+    results = await asyncio.gather(batcher.score("fine"), batcher.score("awful"))
+    assert scorer.singles == ["awful"] and results[0]["sentiment"] == "positive"
+    print("   ✅ a score with an unknown label falls back too")
+
+    def failing(messages):
+        raise TimeoutError("upstream timed out")
+
+    scorer = FakeScorer(failing)
+    batcher = SentimentBatcher(scorer.score_batch, scorer.score_one, window=0.01)
+    results = await asyncio.gather(*(batcher.score(f"message {i}") for i in range(4)))
+    assert all(r == {"error": "upstream timed out"} for r in results)
+    assert scorer.singles == [] and batcher.stats()["failed_batches"] == 1
+    print("   ✅ failed batch request: error results, no per-utterance retries")
+
+    scorer = FakeScorer(lambda messages: "[]")
+    batcher = SentimentBatcher(scorer.score_batch, scorer.score_one, window=0.01, max_batch=3)
+    await asyncio.gather(*(batcher.score(f"m{i}") for i in range(7)))
+    assert [len(batch) for batch in scorer.batches] == [3, 3] and len(scorer.singles) == 7
+    print("   ✅ batches capped at max_batch (a lone leftover goes straight to single scoring)")
+
+
+async def main():
+    check_parsing()
+    await check_fallback()
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+"""
+Email Template Rendering
+------------------------
+Loads notification templates from ``templaets/emails`` once, compiles them into
+literal/placeholder segments and renders text + HTML variants from a small
+context dict. Rendering a batch reuses the compiled segments, so bulk status
+updates only pay for string joins.
+
+Template files:
+    <name>.txt   first line ``Subject: ...``, blank line, plain text body
+    <name>.html  optional HTML body
+
+Placeholders: ``{{ field }}``, ``{{ field|default:N/A }}``, ``{{ field|money }}``.
+Values are HTML-escaped in the HTML variant only.
+"""
+
+import html
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templaets", "emails")
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*(?:\|\s*([a-z_]+)(?::([^}]*))?)?\s*\}\}")
+
+
+def _format_money(value: Any) -> str:
+    """Format a numeric amount with two decimals"""
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return "0.00"
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    """Rendered subject and bodies for one notification"""
+    subject: str
+    text: str
+    html: Optional[str] = None
+
+
+class CompiledTemplate:
+    """A template pre-split into literal strings and placeholder getters"""
+
+    def __init__(self, source: str, escape: bool = False):
+        self.source = source
+        self.escape = escape
+        self._segments: List[Any] = []  # str literals or (field, filter, arg) tuples
+        self._compile()
+
+    def _compile(self):
+        position = 0
+        for match in _PLACEHOLDER.finditer(self.source):
+            if match.start() > position:
+                self._segments.append(self.source[position:match.start()])
+            field, filter_name, arg = match.group(1), match.group(2), match.group(3)
+            if filter_name not in (None, "default", "money"):
+                raise ValueError(f"Unknown template filter: {filter_name}")
+            self._segments.append((field, filter_name, arg.strip() if arg is not None else ""))
+            position = match.end()
+        if position < len(self.source):
+            self._segments.append(self.source[position:])
+
+    @property
+    def fields(self) -> List[str]:
+        """Context fields referenced by this template"""
+        return [segment[0] for segment in self._segments if isinstance(segment, tuple)]
+
+    def render(self, context: Dict[str, Any]) -> str:
+        """Render the template with the given context"""
+        escape = self.escape
+        parts = []
+        append = parts.append
+        for segment in self._segments:
+            if isinstance(segment, str):
+                append(segment)
+                continue
+            field, filter_name, arg = segment
+            value = context.get(field)
+            if filter_name == "money":
+                value = _format_money(value)
+            elif filter_name == "default" and (value is None or value == ""):
+                value = arg
+            elif value is None:
+                value = ""
+            value = str(value)
+            append(html.escape(value) if escape else value)
+        return "".join(parts)
+
+
+@dataclass
+class EmailTemplate:
+    """Compiled subject, text and optional HTML variants of one email"""
+    name: str
+    subject: CompiledTemplate
+    text: CompiledTemplate
+    html: Optional[CompiledTemplate] = None
+
+    def render(self, context: Dict[str, Any]) -> RenderedEmail:
+        """Render all variants of the email"""
+        return RenderedEmail(
+            subject=self.subject.render(context),
+            text=self.text.render(context),
+            html=self.html.render(context) if self.html else None
+        )
+
+
+class EmailTemplateRegistry:
+    """Loads and caches compiled email templates by name"""
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._templates: Dict[str, EmailTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, name: str) -> EmailTemplate:
+        text_path = os.path.join(self.template_dir, f"{name}.txt")
+        html_path = os.path.join(self.template_dir, f"{name}.html")
+        if not os.path.exists(text_path):
+            raise KeyError(f"Email template not found: {name}")
+
+        with open(text_path, encoding="utf-8") as f:
+            header, _, body = f.read().partition("\n\n")
+        if not header.startswith("Subject:"):
+            raise ValueError(f"Email template {name} must start with a 'Subject:' line")
+
+        html_template = None
+        if os.path.exists(html_path):
+            with open(html_path, encoding="utf-8") as f:
+                html_template = CompiledTemplate(f.read(), escape=True)
+
+        logger.info(f"Compiled email template: {name}")
+        return EmailTemplate(
+            name=name,
+            subject=CompiledTemplate(header[len("Subject:"):].strip()),
+            text=CompiledTemplate(body),
+            html=html_template
+        )
+
+    def get(self, name: str) -> EmailTemplate:
+        """Return a compiled template, loading it on first use"""
+        template = self._templates.get(name)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(name)
+                if template is None:
+                    template = self._load(name)
+                    self._templates[name] = template
+        return template
+
+    def preload(self, names: Optional[Iterable[str]] = None):
+        """Compile templates up front (all templates in the directory by default)"""
+        if names is None:
+            names = sorted({os.path.splitext(f)[0] for f in os.listdir(self.template_dir) if f.endswith(".txt")})
+        for name in names:
+            self.get(name)
+
+    def clear(self):
+        """Drop compiled templates so they are reloaded from disk"""
+        with self._lock:
+            self._templates.clear()
+
+    def render(self, name: str, context: Dict[str, Any]) -> RenderedEmail:
+        """Render one email"""
+        return self.get(name).render(context)
+
+    def render_batch(self, name: str, contexts: Iterable[Dict[str, Any]]) -> List[RenderedEmail]:
+        """Render the same template for many contexts"""
+        template = self.get(name)
+        return [template.render(context) for context in contexts]
+
+
+# Global registry instance
+email_templates = EmailTemplateRegistry()
@@ -0,0 +1,129 @@
+"""
+Multi-Pattern Keyword Matcher
+-----------------------------
+Matches many keyword families against a text in one pass, replacing repeated
+``any(keyword in text for keyword in ...)`` scans whose cost grows with the
+number of keywords.
+
+All keywords of a matcher are compiled into one regular-expression automaton
+that visits each text position once (an overlapping lookahead yields the
+longest keyword starting there); shorter keywords starting at the same
+position are recovered from a prefix table, so overlapping keywords such as
+"not sure" and "sure" are all reported.
+
+Keyword syntax:
+    "price"        whole word/phrase ("price", not "priceless")
+    "recommend*"   word prefix ("recommend", "recommended", "recommendation")
+
+With ``word_boundaries=False`` every keyword is a plain substring, matching
+the ``keyword in text`` checks it replaces. Keywords are lowercased when the
+matcher is built; callers pass text that is already lowercased.
+
+Matchers are meant to be built once at import time and shared.
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    """One keyword occurrence in a text"""
+    keyword: str
+    families: Tuple[str, ...]
+    start: int
+    end: int  # exclusive
+
+
+class KeywordMatcher:
+    """Compiled matcher for a set of keyword families"""
+
+    def __init__(self, families: Dict[str, Iterable[str]], word_boundaries: bool = True):
+        self.word_boundaries = word_boundaries
+        self.families: Dict[str, List[str]] = {}
+        # keyword text -> [(keyword as written, families, is_prefix)]
+        self._table: Dict[str, List[Tuple[str, Tuple[str, ...], bool]]] = {}
+        owners: Dict[Tuple[str, bool], List[str]] = {}
+        for family, keywords in families.items():
+            self.families[family] = []
+            for keyword in keywords:
+                keyword = keyword.lower()
+                is_prefix = keyword.endswith("*")
+                text = keyword.rstrip("*")
+                if not text:
+                    continue
+                self.families[family].append(keyword)
+                family_list = owners.setdefault((text, is_prefix), [])
+                if family not in family_list:
+                    family_list.append(family)
+
+        for (text, is_prefix), family_list in owners.items():
+            keyword = text + "*" if is_prefix else text
+            self._table.setdefault(text, []).append((keyword, tuple(family_list), is_prefix))
+
+        # For each keyword text, every keyword text that is a prefix of it (itself
+        # included): all keywords that can start where the scanner found `text`
+        self._chains: Dict[str, List[Tuple[int, List[Tuple[str, Tuple[str, ...], bool]]]]] = {
+            text: [(len(other), self._table[other]) for other in self._table if text.startswith(other)]
+            for text in self._table
+        }
+        alternatives = "|".join(re.escape(text) for text in sorted(self._table, key=len, reverse=True))
+        if not alternatives:
+            self._scanner = None
+        elif word_boundaries:
+            self._scanner = re.compile(rf"(?<!\w)(?=({alternatives}))")
+        else:
+            self._scanner = re.compile(rf"(?=({alternatives}))")
+
+    def _scan(self, text: str):
+        """Yield (keyword, families, start, end) for every occurrence in `text`"""
+        if self._scanner is None:
+            return
+        chains = self._chains
+        check_boundaries = self.word_boundaries
+        length = len(text)
+        for hit in self._scanner.finditer(text):
+            start = hit.start()
+            for size, entries in chains[hit.group(1)]:
+                end = start + size
+                whole_word = end >= length or not (_is_word_char(text[end]) and _is_word_char(text[end - 1]))
+                for keyword, owners, is_prefix in entries:
+                    if check_boundaries and not is_prefix and not whole_word:
+                        continue
+                    yield keyword, owners, start, end
+
+    def finditer(self, text: str) -> List[KeywordMatch]:
+        """All keyword occurrences in `text`, ordered by start position"""
+        return [KeywordMatch(*occurrence) for occurrence in self._scan(text)]
+
+    def families_in(self, text: str) -> Set[str]:
+        """Families with at least one keyword occurring in `text`"""
+        found: Set[str] = set()
+        for _, owners, _, _ in self._scan(text):
+            found.update(owners)
+        return found
+
+    def keywords_by_family(self, text: str) -> Dict[str, Set[str]]:
+        """Distinct keywords found in `text`, grouped by family"""
+        found: Dict[str, Set[str]] = {}
+        for keyword, owners, _, _ in self._scan(text):
+            for family in owners:
+                found.setdefault(family, set()).add(keyword)
+        return found
+
+    def count(self, text: str) -> Counter:
+        """Keyword occurrences in `text` per family"""
+        counts: Counter = Counter()
+        for _, owners, _, _ in self._scan(text):
+            counts.update(owners)
+        return counts
+
+    def distinct_count(self, text: str) -> Dict[str, int]:
+        """Number of distinct keywords found in `text` per family"""
+        return {family: len(keywords) for family, keywords in self.keywords_by_family(text).items()}